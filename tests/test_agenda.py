@@ -1,5 +1,31 @@
 #!/usr/bin/env python3
 
+import io
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from Zorgmode.mock_sublime import (
+    Region as TextViewRegion,
+    View as TextView,
+)
+from Zorgmode.zorg_agenda import (
+    Agenda,
+    AgendaEntry,
+    AgendaMetaInfoStore,
+    AgendaTagIndex,
+
+    headline_text_hash,
+)
+from Zorgmode import zorg_agenda_cli
+from Zorgmode.zorg_agenda_cli import main as agenda_cli_main
+from Zorgmode.zorg_view_parse import parse_org_document_new
+from Zorgmode.zorgmode import (
+    AgendaRegistry,
+
+    agenda_meta_info_find_point,
+    find_closest_headline_by_hash,
+)
 from zorgtest import (
     set_cursor_position,
     get_active_view,
@@ -38,3 +64,316 @@ class TestAgenda(ZorgTestCase):
 
         self.assertEqual(get_active_view().id(), original_file_view.id())
         self.assertEqual(get_active_view_cursor_position(), (3, 1))
+
+    def test_priority_agenda(self):
+        set_active_view_text(
+            "* TODO Low priority\n"  # 1
+            "* TODO [#C] Lowest priority\n"  # 2
+            "* TODO [#A] High priority\n"  # 3
+            "* DONE [#A] Done task\n"  # 4
+            "* TODO [#A] Another high priority\n")  # 5
+        original_file_view = get_active_view()
+        original_file_view.run_command("zorg_todo_list", {
+            "show_in": "new_tab",
+            "zorg_agenda_files": ["/dev/sublimetext_view/{}".format(original_file_view.id())],
+            "limit": 3,
+        })
+
+        agenda_view = get_active_view()
+        self.assertEqual(
+            get_active_view_text(),
+            "#+BEGIN_AGENDA\n"  # 1
+            "  TODO:    TODO [#A] High priority\n"  # 2
+            "  TODO:    TODO [#A] Another high priority\n"  # 3
+            "  TODO:    TODO Low priority\n"  # 4
+            "#+END_AGENDA\n"  # 5
+        )
+        set_cursor_position(agenda_view, 3, 1)
+        agenda_view.run_command("zorg_agenda_goto")
+
+        self.assertEqual(get_active_view().id(), original_file_view.id())
+        self.assertEqual(get_active_view_cursor_position(), (5, 1))
+
+    def test_calendar_agenda(self):
+        set_active_view_text(
+            "* TODO Write report\n"  # 1
+            "  DEADLINE: <2020-03-04 Wed>\n"  # 2
+            "* TODO Water flowers\n"  # 3
+            "  SCHEDULED: <2020-02-25 Tue +1w>\n"  # 4
+            "* Meeting <2020-03-03 Tue 10:00>\n"  # 5
+            "* Vacation <2020-04-01 Wed>\n")  # 6
+        original_file_view = get_active_view()
+        original_file_view.run_command("zorg_calendar_agenda", {
+            "show_in": "new_tab",
+            "zorg_agenda_files": ["/dev/sublimetext_view/{}".format(original_file_view.id())],
+            "start": "2020-03-02",
+            "span": 3,
+        })
+
+        agenda_view = get_active_view()
+        self.assertEqual(
+            get_active_view_text(),
+            "#+BEGIN_AGENDA\n"  # 1
+            "2020-03-02 Monday\n"  # 2
+            "2020-03-03 Tuesday\n"  # 3
+            "  Scheduled: TODO Water flowers\n"  # 4
+            "  Event:     Meeting <2020-03-03 Tue 10:00>\n"  # 5
+            "2020-03-04 Wednesday\n"  # 6
+            "  Deadline:  TODO Write report\n"  # 7
+            "#+END_AGENDA\n"  # 8
+        )
+        set_cursor_position(agenda_view, 7, 1)
+        agenda_view.run_command("zorg_agenda_goto")
+
+        self.assertEqual(get_active_view().id(), original_file_view.id())
+        self.assertEqual(get_active_view_cursor_position(), (1, 1))
+
+    def test_tags_agenda(self):
+        set_active_view_text(
+            "* TODO Work project :work:\n"  # 1
+            "** TODO Write report\n"  # 2
+            "** TODO Learn Haskell :someday:\n"  # 3
+            "* TODO Buy milk :home:\n")  # 4
+        original_file_view = get_active_view()
+        original_file_view.run_command("zorg_tags_agenda", {
+            "match": "+work-someday",
+            "show_in": "new_tab",
+            "zorg_agenda_files": ["/dev/sublimetext_view/{}".format(original_file_view.id())],
+        })
+
+        agenda_view = get_active_view()
+        self.assertEqual(
+            get_active_view_text(),
+            "#+BEGIN_AGENDA\n"  # 1
+            "  Match:   TODO Work project :work:\n"  # 2
+            "  Match:   TODO Write report\n"  # 3
+            "#+END_AGENDA\n"  # 4
+        )
+        set_cursor_position(agenda_view, 3, 1)
+        agenda_view.run_command("zorg_agenda_goto")
+
+        self.assertEqual(get_active_view().id(), original_file_view.id())
+        self.assertEqual(get_active_view_cursor_position(), (2, 1))
+
+
+class TestAgendaMetaInfoStore(TestCase):
+    def test_store(self):
+        store = AgendaMetaInfoStore()
+        self.assertEqual(store.add("/a.org", None, 10, 1, headline_text_hash("* TODO a")), 0)
+        self.assertEqual(store.add(None, 42, 20, 2, headline_text_hash("* TODO b")), 1)
+        self.assertEqual(store.add("/a.org", None, 30, 3, -1), 2)
+        self.assertEqual(len(store), 3)
+
+        self.assertEqual(
+            store.get(0),
+            Agenda.AgendaItemMetaInfo("/a.org", None, 10, 1, headline_text_hash("* TODO a")))
+        self.assertEqual(
+            store.get(1),
+            Agenda.AgendaItemMetaInfo(None, 42, 20, 2, headline_text_hash("* TODO b")))
+        self.assertEqual(store.get(2), Agenda.AgendaItemMetaInfo("/a.org", None, 30, 3, -1))
+
+    def test_agenda_lines(self):
+        agenda = Agenda()
+        agenda.add_warning("some warning")
+        agenda.add_entry(AgendaEntry(
+            file_name="/a.org", view_id=None, offset=15, line_index_0=1,
+            keyword="TODO", priority=None, text="* TODO a", text_hash=headline_text_hash("* TODO a")))
+        with self.assertRaises(RuntimeError):
+            agenda.get_line_meta_info(0)
+
+        text = agenda.finalize()
+        self.assertEqual(len(text.splitlines()), 4)
+        self.assertIsNone(agenda.get_line_meta_info(0))
+        self.assertIsNone(agenda.get_line_meta_info(1))
+        self.assertEqual(
+            agenda.get_line_meta_info(2),
+            Agenda.AgendaItemMetaInfo("/a.org", None, 15, 1, headline_text_hash("* TODO a")))
+        self.assertIsNone(agenda.get_line_meta_info(3))
+        self.assertIsNone(agenda.get_line_meta_info(4))
+
+
+class ViewWithId(object):
+    def __init__(self, view_id):
+        self._view_id = view_id
+
+    def id(self):
+        return self._view_id
+
+
+class TestAgendaRegistry(TestCase):
+    def test_lru_eviction(self):
+        registry = AgendaRegistry(max_size=2)
+        view_list = [ViewWithId(i) for i in range(3)]
+        agenda_list = [Agenda() for _ in range(3)]
+        registry.save_agenda(view_list[0], agenda_list[0])
+        registry.save_agenda(view_list[1], agenda_list[1])
+        # lookup makes agenda the most recently used one
+        self.assertIs(registry.get_agenda(view_list[0]), agenda_list[0])
+        registry.save_agenda(view_list[2], agenda_list[2])
+
+        self.assertIs(registry.get_agenda(view_list[0]), agenda_list[0])
+        self.assertIsNone(registry.get_agenda(view_list[1]))
+        self.assertIs(registry.get_agenda(view_list[2]), agenda_list[2])
+        self.assertEqual(registry.get_stats(), {"size": 2, "max_size": 2, "evictions": 1, "closed": 0})
+
+    def test_close(self):
+        registry = AgendaRegistry(max_size=2)
+        view = ViewWithId(1)
+        registry.save_agenda(view, Agenda())
+        registry.save_agenda(view, Agenda())
+        registry.on_view_closed(view.id())
+        registry.on_view_closed(view.id())
+        self.assertIsNone(registry.get_agenda(view))
+        self.assertEqual(registry.get_stats(), {"size": 0, "max_size": 2, "evictions": 0, "closed": 1})
+
+
+class TestAgendaTagIndex(TestCase):
+    def make_index(self):
+        tag_index = AgendaTagIndex()
+        for file_name, text in [
+            ("/c.org", "* C1 :work:\n* C2 :home:\n* C3 :work:\n"),
+            ("/a.org", "* A1 :work:\n* A2 :work:\n"),
+            ("/b.org", "* B1 :work:\n"),
+        ]:
+            view = TextView(text, file_name)
+            tag_index.update_file(file_name, 1, parse_org_document_new(view, TextViewRegion(0, view.size())))
+        return tag_index
+
+    def query_text(self, match_str, file_key_list=None):
+        agenda = Agenda(caption="Match")
+        for entry in self.make_index().query(match_str, file_key_list):
+            agenda.add_entry(entry)
+        return [entry.text for entry in agenda.take_entries()]
+
+    def test_files_order(self):
+        self.assertEqual(
+            self.query_text("work", ["/b.org", "/c.org", "/a.org"]),
+            ["B1 :work:", "C1 :work:", "C3 :work:", "A1 :work:", "A2 :work:"])
+        self.assertEqual(
+            self.query_text("work|home"),
+            ["A1 :work:", "A2 :work:", "B1 :work:", "C1 :work:", "C2 :home:", "C3 :work:"])
+
+
+class TestAgendaGotoSearch(TestCase):
+    def test_headline_after_line_of_stars(self):
+        text = (
+            "text\n"
+            "*\n"
+            "* TODO Task\n"
+            "**\n"
+            "* TODO Task\n")
+        self.assertEqual(
+            find_closest_headline_by_hash(text, 100, 10, 14, headline_text_hash("* TODO Task")),
+            (100 + len("text\n*\n* TODO Task\n**\n"), 0))
+        self.assertEqual(
+            find_closest_headline_by_hash(text, 100, 10, 11, headline_text_hash("* TODO Task")),
+            (100 + len("text\n*\n"), 1))
+
+
+class TestAgendaGotoPoint(ZorgTestCase):
+    def make_meta_info(self, offset, line_index_0, text):
+        return Agenda.AgendaItemMetaInfo(None, self.view.id(), offset, line_index_0, headline_text_hash(text))
+
+    def test_recorded_position(self):
+        set_active_view_text(
+            "* TODO First\n"
+            "* TODO Second\n")
+        self.assertEqual(agenda_meta_info_find_point(self.view, self.make_meta_info(13, 1, "* TODO Second")), 13)
+        # offset is stale, but line is the same
+        self.assertEqual(agenda_meta_info_find_point(self.view, self.make_meta_info(3, 1, "* TODO Second")), 13)
+        self.assertIsNone(agenda_meta_info_find_point(self.view, self.make_meta_info(13, 1, "* TODO Third")))
+
+    def test_moved_headline(self):
+        set_active_view_text(
+            "* TODO Task\n"
+            + "text\n" * 100
+            + "* TODO Task\n"
+            + "text\n" * 3
+            + "* TODO Other\n")
+        # headline closest to the recorded line is chosen
+        self.assertEqual(
+            agenda_meta_info_find_point(self.view, self.make_meta_info(20, 99, "* TODO Task")),
+            len("* TODO Task\n" + "text\n" * 100))
+        self.assertEqual(
+            agenda_meta_info_find_point(self.view, self.make_meta_info(20, 30, "* TODO Task")),
+            0)
+        self.assertEqual(
+            agenda_meta_info_find_point(self.view, self.make_meta_info(20, 5000, "* TODO Other")),
+            len("* TODO Task\n" + "text\n" * 100 + "* TODO Task\n" + "text\n" * 3))
+
+
+class BrokenPipeOutput(io.StringIO):
+    def write(self, text):
+        raise BrokenPipeError()
+
+
+class TestAgendaCli(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_list = []
+        for name, text in [
+            ("a.org", "* TODO Low priority\n* TODO [#A] High priority in a\n"),
+            ("b.org", "* TODO [#A] High priority in b\n* DONE [#A] Done\n"),
+        ]:
+            file_name = os.path.join(self.tmp_dir.name, name)
+            with open(file_name, "w", encoding="utf-8") as outf:
+                outf.write(text)
+            self.file_list.append(file_name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_main(self, argv, stdout=None):
+        stdout = stdout or io.StringIO()
+        with mock.patch("sys.stdout", stdout), mock.patch("sys.stderr", io.StringIO()):
+            exit_code = agenda_cli_main(argv)
+        return exit_code, stdout.getvalue()
+
+    def test_priority_order(self):
+        exit_code, output = self.run_main(["--jobs", "1"] + self.file_list)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(
+            output,
+            "#+BEGIN_AGENDA\n"
+            "  TODO:    TODO [#A] High priority in a\n"
+            "  TODO:    TODO [#A] High priority in b\n"
+            "  TODO:    TODO Low priority\n"
+            "#+END_AGENDA\n")
+
+    def test_limit(self):
+        exit_code, output = self.run_main(["--jobs", "1", "--limit", "1"] + self.file_list)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(
+            output,
+            "#+BEGIN_AGENDA\n"
+            "  TODO:    TODO [#A] High priority in a\n"
+            "#+END_AGENDA\n")
+
+    def test_files_loaded_in_any_order(self):
+        # directories can't be read
+        unreadable_list = [os.path.join(self.tmp_dir.name, name) for name in ("c.org", "d.org")]
+        for file_name in unreadable_list:
+            os.mkdir(file_name)
+        file_list = self.file_list + unreadable_list
+        loaded_list = [zorg_agenda_cli._load_file(file_name) for file_name in file_list]
+        with mock.patch.object(zorg_agenda_cli, "iter_loaded_files", lambda *args: reversed(loaded_list)):
+            exit_code, output = self.run_main(file_list)
+        self.assertEqual(exit_code, 1)
+        line_list = output.splitlines()
+        self.assertIn("c.org", line_list[1])
+        self.assertIn("d.org", line_list[2])
+        self.assertEqual(line_list[3:], [
+            "  TODO:    TODO [#A] High priority in a",
+            "  TODO:    TODO [#A] High priority in b",
+            "  TODO:    TODO Low priority",
+            "#+END_AGENDA",
+        ])
+
+    def test_negative_limit(self):
+        with self.assertRaises(SystemExit) as cm:
+            self.run_main(["--limit", "-1"] + self.file_list)
+        self.assertEqual(cm.exception.code, 2)
+
+    def test_broken_pipe(self):
+        exit_code, _ = self.run_main(["--jobs", "1"] + self.file_list, stdout=BrokenPipeOutput())
+        self.assertEqual(exit_code, 1)
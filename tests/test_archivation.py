@@ -69,3 +69,62 @@ class TestArchivation(ZorgTestCase):
             "** Header 2\n"
             "* Header 3\n"
         )
+
+    def test_archive_matching(self):
+        with tempfile.NamedTemporaryFile() as tmpf:
+            set_active_view_text(
+                "#+ARCHIVE:{tempfile}\n"
+                "* DONE Header 1\n"
+                "** DONE Header 2\n"
+                "* TODO Header 3\n"
+                "*** DONE Header 4\n"
+                "#+BEGIN_SRC\n"
+                "#+END_SRC\n"
+                "* Header 5 :old:\n"
+                "** TODO Header 6\n".format(tempfile=tmpf.name))
+            self.view.run_command("zorg_archive_matching")
+
+            self.assertEqual(
+                get_active_view_text(),
+                "#+ARCHIVE:{tempfile}\n"
+                "* TODO Header 3\n"
+                "* Header 5 :old:\n"
+                "** TODO Header 6\n".format(tempfile=tmpf.name))
+            self.assertEqual(
+                tmpf.read().decode('utf-8'),
+                ("\n* DONE Header 1\n"
+                 "** DONE Header 2\n"
+                 "\n* DONE Header 4\n"
+                 "#+BEGIN_SRC\n"
+                 "#+END_SRC\n"))
+
+            self.view.run_command("zorg_archive_matching", {"keyword": None, "tag": "old"})
+            self.assertEqual(
+                get_active_view_text(),
+                "#+ARCHIVE:{tempfile}\n"
+                "* TODO Header 3\n".format(tempfile=tmpf.name))
+            self.assertEqual(
+                tmpf.read().decode('utf-8'),
+                ("\n* Header 5 :old:\n"
+                 "** TODO Header 6\n"))
+
+    def test_archivation_keeps_source_blocks(self):
+        with tempfile.NamedTemporaryFile() as tmpf:
+            set_active_view_text(
+                "#+ARCHIVE:{tempfile}\n"
+                "* Header 1\n"
+                "** Header 2\n"
+                "#+BEGIN_SRC\n"
+                "** not a headline\n"
+                "#+END_SRC\n"
+                "**** Header 3\n".format(tempfile=tmpf.name))
+            set_active_view_cursor_position(3, 2)
+            self.view.run_command("zorg_move_to_archive")
+
+            self.assertEqual(
+                tmpf.read().decode('utf-8'),
+                ("\n* Header 2\n"
+                 "#+BEGIN_SRC\n"
+                 "** not a headline\n"
+                 "#+END_SRC\n"
+                 "*** Header 3\n"))
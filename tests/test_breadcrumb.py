@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+from unittest import mock
+
+import sublime
+from Zorgmode import zorgmode
+from zorgtest import (
+    set_active_view_cursor_position,
+    set_active_view_text,
+    ZorgTestCase,
+)
+
+
+class TestBreadcrumb(ZorgTestCase):
+    TEXT = (
+        "* Header 1\n"
+        "** Header 2\n"
+        "text\n"
+        "* Header 3\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.view.set_syntax_file("Packages/Zorgmode/Zorgmode.sublime-syntax")
+        self.now = 0.0
+        self.timeout_list = []
+
+    def on_selection_modified(self, listener, now):
+        self.now = now
+        with mock.patch.object(zorgmode.time, "perf_counter", lambda: self.now), \
+                mock.patch.object(sublime, "set_timeout", lambda f, delay: self.timeout_list.append(f)):
+            listener.on_selection_modified(self.view)
+
+    def get_breadcrumb(self):
+        return self.view.get_status(zorgmode.BREADCRUMB_STATUS_KEY)
+
+    def test_update_after_delay(self):
+        set_active_view_text(self.TEXT)
+        listener = zorgmode.ZorgBreadcrumbListener()
+        set_active_view_cursor_position(3, 1)
+        self.on_selection_modified(listener, 0.0)
+        set_active_view_cursor_position(4, 1)
+        self.on_selection_modified(listener, 0.1)
+        self.assertEqual(self.get_breadcrumb(), "")
+
+        # only the latest scheduled update is applied
+        self.timeout_list[0]()
+        self.assertEqual(self.get_breadcrumb(), "")
+        self.timeout_list[1]()
+        self.assertEqual(self.get_breadcrumb(), "Header 3")
+
+    def test_update_while_cursor_moves(self):
+        set_active_view_text(self.TEXT)
+        listener = zorgmode.ZorgBreadcrumbListener()
+        set_active_view_cursor_position(1, 1)
+        self.on_selection_modified(listener, 0.0)
+        set_active_view_cursor_position(2, 1)
+        self.on_selection_modified(listener, 0.2)
+        self.assertEqual(self.get_breadcrumb(), "")
+
+        set_active_view_cursor_position(3, 1)
+        self.on_selection_modified(listener, zorgmode.BREADCRUMB_MAX_WAIT_MS / 1000)
+        self.assertEqual(self.get_breadcrumb(), "Header 1 / Header 2")
+
+        # pending updates are dropped, next update is delayed again
+        for f in self.timeout_list:
+            f()
+        set_active_view_cursor_position(4, 1)
+        self.on_selection_modified(listener, 0.6)
+        self.assertEqual(self.get_breadcrumb(), "Header 1 / Header 2")
+        self.timeout_list[-1]()
+        self.assertEqual(self.get_breadcrumb(), "Header 3")
+
+    def test_index_is_reused(self):
+        set_active_view_text(self.TEXT)
+        listener = zorgmode.ZorgBreadcrumbListener()
+        with mock.patch.object(
+                zorgmode, "view_get_headline_position_index",
+                wraps=zorgmode.view_get_headline_position_index) as get_index:
+            set_active_view_cursor_position(3, 1)
+            self.on_selection_modified(listener, 0.0)
+            self.timeout_list[-1]()
+            set_active_view_cursor_position(4, 1)
+            self.on_selection_modified(listener, 1.0)
+            self.timeout_list[-1]()
+            self.assertEqual(get_index.call_count, 1)
+
+            set_active_view_text("text\n")
+            self.on_selection_modified(listener, 2.0)
+            self.timeout_list[-1]()
+            self.assertEqual(get_index.call_count, 2)
+        self.assertEqual(self.get_breadcrumb(), "Header 3")
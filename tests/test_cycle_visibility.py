@@ -1,6 +1,13 @@
 # -*- coding: utf-8 -*-
 
+from unittest import mock
+
 import sublime
+from Zorgmode import zorgmode
+from Zorgmode.zorgmode import (
+    view_get_fold_anchors,
+    view_restore_fold_anchors,
+)
 from zorgtest import (
     set_active_view_text,
     get_active_view_text,
@@ -55,6 +62,91 @@ class TestMoveHeader(ZorgTestCase):
         self.view.run_command('zorg_cycle_all')
         self.assertEqual(self.view.folded_regions(), [])
 
+    def test_flat_document(self):
+        set_active_view_text(
+            "* Caption{\n"
+            "some text}\n"
+            "* Caption 2{\n"
+            "more text}\n"
+            "* Caption 3{\n"
+            "even more text\n}"
+        )
+        set_active_view_cursor_position(1, 2)
+        self.view.run_command('zorg_cycle_all')
+        self.assert_proper_folding()
+
+        self.view.run_command('zorg_cycle_all')
+        self.assertEqual(self.view.folded_regions(), [])
+
+        self.view.run_command('zorg_cycle_all')
+        self.assert_proper_folding()
+
+    def test_folds_changed_between_cycles(self):
+        set_active_view_text(
+            "* Caption{\n"
+            "some text\n"
+            "** Other caption\n"
+            "more text}\n"
+            "* Caption 2{\n"
+            "even more text\n}"
+        )
+        set_active_view_cursor_position(1, 2)
+        self.view.run_command('zorg_cycle_all')
+        self.assert_proper_folding()
+
+        # same number of folds as in overview, but different ones
+        first_fold = self.view.folded_regions()[0]
+        self.view.unfold(first_fold)
+        self.view.fold(sublime.Region(first_fold.a, first_fold.a + len("\nsome text")))
+        self.view.run_command('zorg_cycle_all')
+        self.assert_proper_folding()
+
+    def test_cycle_subtree_skips_src_block(self):
+        set_active_view_text(
+            "* Caption{\n"
+            "#+BEGIN_SRC\n"
+            "* not a headline\n"
+            "#+END_SRC\n"
+            "text}\n"
+            "* Caption 2\n"
+        )
+        set_active_view_cursor_position(1, 1)
+        self.view.run_command('zorg_cycle')
+        self.assert_proper_folding()
+
+        self.view.run_command('zorg_cycle')
+        self.assertEqual(self.view.folded_regions(), [])
+
+    def test_cycle_subtree_children(self):
+        set_active_view_text(
+            "* Caption\n"
+            "text\n"
+            "** Caption 2{\n"
+            "*** Caption 3\n"
+            "more text}\n"
+            "** Caption 4{\n"
+            "even more text}\n"
+            "* Caption 5\n"
+        )
+        set_active_view_cursor_position(1, 1)
+        self.view.run_command('zorg_cycle', {"mode": "cycle"})
+        self.view.run_command('zorg_cycle', {"mode": "cycle"})
+        self.assert_proper_folding()
+
+    def test_cycle_last_headline_without_newline(self):
+        set_active_view_text(
+            "* Caption{\n"
+            "text}\n"
+            "* Caption 2"
+        )
+        set_active_view_cursor_position(3, 1)
+        self.view.run_command('zorg_cycle')
+        self.assertEqual(self.view.folded_regions(), [])
+
+        set_active_view_cursor_position(1, 1)
+        self.view.run_command('zorg_cycle')
+        self.assert_proper_folding()
+
     def assert_proper_folding(self):
         expected_folding = []
 
@@ -75,3 +167,88 @@ class TestMoveHeader(ZorgTestCase):
 
         actual_folding = self.view.folded_regions()
         self.assertEqual(expected_folding, actual_folding)
+
+
+class TestFoldState(ZorgTestCase):
+    TEXT = (
+        "* Caption\n"
+        "#+BEGIN_SRC\n"
+        "* not a headline\n"
+        "** not a headline either\n"
+        "#+END_SRC\n"
+        "text\n"
+        "** Caption 2\n"
+        "more text\n"
+        "* Caption 3\n"
+        "even more text\n"
+    )
+
+    def test_restore_subtree_fold(self):
+        set_active_view_text(self.TEXT)
+        set_active_view_cursor_position(1, 1)
+        self.view.run_command('zorg_cycle')
+        self.assert_round_trip()
+
+    def test_restore_overview_folds(self):
+        set_active_view_text(self.TEXT)
+        set_active_view_cursor_position(1, 1)
+        self.view.run_command('zorg_cycle_all')
+        self.assert_round_trip()
+
+    def test_moved_headline(self):
+        set_active_view_text(self.TEXT)
+        set_active_view_cursor_position(1, 1)
+        self.view.run_command('zorg_cycle')
+        folded_regions = self.view.folded_regions()
+        anchor_list = self.view_get_anchors_and_unfold()
+
+        self.view.sel().clear()
+        self.view.sel().add(sublime.Region(0))
+        self.view.run_command('insert', {'characters': 'new line\n'})
+        self.assertEqual(view_restore_fold_anchors(self.view, anchor_list), 1)
+        self.assertEqual(
+            self.view.folded_regions(),
+            [sublime.Region(r.a + len('new line\n'), r.b + len('new line\n')) for r in folded_regions])
+
+    def test_large_document(self):
+        settings = sublime.load_settings("Zorgmode.sublime-settings")
+        old_threshold = settings.get("zorg_partial_parse_threshold")
+        settings.set("zorg_partial_parse_threshold", 1)
+        try:
+            set_active_view_text("".join(
+                "* Caption {}\n** Child\ntext\n".format(i)
+                for i in range(300)))
+            for line in (1, 301, 601):
+                set_active_view_cursor_position(line, 1)
+                self.view.run_command('zorg_cycle')
+            folded_regions = self.view.folded_regions()
+            self.assertEqual(len(folded_regions), 3)
+            anchor_list = self.view_get_anchors_and_unfold()
+
+            # folds of a freshly loaded view are restored from trees parsed around their headlines
+            zorgmode.ORG_DOCUMENT_CACHE.on_view_closed(self.view.id())
+            with mock.patch.object(sublime, "set_timeout_async"), mock.patch.object(
+                    zorgmode, "parse_org_document_new", wraps=zorgmode.parse_org_document_new) as parse:
+                self.assertEqual(view_restore_fold_anchors(self.view, anchor_list), 3)
+            self.assertEqual(self.view.folded_regions(), folded_regions)
+            for (_, region), _ in parse.call_args_list:
+                self.assertLess(region.size(), self.view.size())
+        finally:
+            if old_threshold is None:
+                settings.erase("zorg_partial_parse_threshold")
+            else:
+                settings.set("zorg_partial_parse_threshold", old_threshold)
+
+    def assert_round_trip(self):
+        folded_regions = self.view.folded_regions()
+        self.assertTrue(folded_regions)
+        anchor_list = self.view_get_anchors_and_unfold()
+        self.assertEqual(len(anchor_list), len(folded_regions))
+        self.assertEqual(view_restore_fold_anchors(self.view, anchor_list), len(folded_regions))
+        self.assertEqual(self.view.folded_regions(), folded_regions)
+
+    def view_get_anchors_and_unfold(self):
+        anchor_list = view_get_fold_anchors(self.view)
+        self.view.unfold(sublime.Region(0, self.view.size()))
+        self.assertEqual(self.view.folded_regions(), [])
+        return anchor_list
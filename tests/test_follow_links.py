@@ -1,6 +1,24 @@
 # -*- coding: utf-8 -*-
 
+import os
+import tempfile
+import time
+from unittest import TestCase, mock
+
 import sublime
+from Zorgmode.zorg_heading_index import (
+    WorkspaceHeadingIndex,
+
+    find_heading,
+    scan_headings,
+)
+from Zorgmode.zorg_links import find_links_in_string
+from Zorgmode.zorgmode import (
+    ZorgLinkHoverListener,
+
+    get_file_link_position,
+    save_cache,
+)
 from zorgtest import (
     get_active_view_cursor_position,
     set_active_view_cursor_position,
@@ -72,3 +90,214 @@ class TestFollowTextLink(ZorgTestCase):
         set_active_view_cursor_position(2, 12)
         self.view.run_command("zorg_follow_link")
         self.assertEqual(get_active_view_cursor_position(), (1, 1))
+
+    def test_link_abbreviation_chain(self):
+        set_active_view_text(
+            "* Header 1\n"
+            "some text [[h:1]]\n"
+            "#+LINK: h hdr:%s\n"
+            "#+LINK: hdr Header %s\n")
+        #    ^0   ^5   ^10
+
+        set_active_view_cursor_position(2, 12)
+        self.view.run_command("zorg_follow_link")
+        self.assertEqual(get_active_view_cursor_position(), (1, 1))
+
+    def test_follow_link_duplicate_headers(self):
+        set_active_view_text(
+            "some text [[Header 1]]\n"
+            "* Header 1\n"
+            "* header 1\n"
+            "* Header 1\n")
+        set_active_view_cursor_position(1, 12)
+        self.view.run_command("zorg_follow_link")
+        self.assertEqual(get_active_view_cursor_position(), (2, 1))
+
+    def test_follow_link_ignore_case(self):
+        set_active_view_text(
+            "some text [[header 2]]\n"
+            "* Header 1\n"
+            "* Header 2\n")
+        set_active_view_cursor_position(1, 12)
+        self.view.run_command("zorg_follow_link")
+        self.assertEqual(get_active_view_cursor_position(), (3, 1))
+
+
+class TestLinkNavigation(ZorgTestCase):
+    TEXT = (
+        "#+LINK: gh https://github.com/%s\n"
+        "* Header 1\n"
+        "see [[gh:dim-an/Zorgmode][Zorgmode]]\n"
+        "#  ^0   ^5   ^10\n"
+        "and https://example.com too [[Header 1]]\n"
+        "#   ^4                      ^28\n"
+    )
+
+    def test_next_prev_link(self):
+        set_active_view_text(self.TEXT)
+        set_active_view_cursor_position(2, 1)
+        self.view.run_command("zorg_next_link")
+        self.assertEqual(get_active_view_cursor_position(), (3, 5))
+        self.view.run_command("zorg_next_link")
+        self.assertEqual(get_active_view_cursor_position(), (5, 5))
+        self.view.run_command("zorg_next_link")
+        self.assertEqual(get_active_view_cursor_position(), (5, 29))
+        self.view.run_command("zorg_next_link")
+        self.assertEqual(get_active_view_cursor_position(), (5, 29))
+
+        self.view.run_command("zorg_prev_link")
+        self.assertEqual(get_active_view_cursor_position(), (5, 5))
+        self.view.run_command("zorg_prev_link")
+        self.assertEqual(get_active_view_cursor_position(), (3, 5))
+        # url of the link abbreviation is a link too
+        self.view.run_command("zorg_prev_link")
+        self.assertEqual(get_active_view_cursor_position(), (1, 12))
+        self.view.run_command("zorg_prev_link")
+        self.assertEqual(get_active_view_cursor_position(), (1, 12))
+
+    def test_list_links(self):
+        set_active_view_text(self.TEXT)
+        with mock.patch.object(sublime.Window, "show_quick_panel") as show_quick_panel:
+            self.view.run_command("zorg_list_links")
+        (item_list, on_done), _ = show_quick_panel.call_args
+        self.assertEqual(item_list, [
+            ["https://github.com/%s", "1: https://github.com/%s"],
+            ["Zorgmode", "3: gh:dim-an/Zorgmode"],
+            ["https://example.com", "5: https://example.com"],
+            ["Header 1", "5: Header 1"],
+        ])
+        on_done(3)
+        self.assertEqual(get_active_view_cursor_position(), (5, 29))
+
+    def test_hover(self):
+        self.view.set_syntax_file("Packages/Zorgmode/Zorgmode.sublime-syntax")
+        set_active_view_text(self.TEXT)
+        # abbreviations are expanded only when the document is parsed
+        self.view.run_command("zorg_next_link")
+        listener = ZorgLinkHoverListener()
+        with mock.patch.object(sublime.View, "show_popup") as show_popup:
+            listener.on_hover(self.view, self.view.text_point(2, 10), sublime.HOVER_TEXT)
+            listener.on_hover(self.view, self.view.text_point(4, 10), sublime.HOVER_TEXT)
+            listener.on_hover(self.view, self.view.text_point(1, 4), sublime.HOVER_TEXT)
+        self.assertEqual(
+            [args[0] for args, _ in show_popup.call_args_list],
+            ["https://github.com/dim-an/Zorgmode"])
+
+
+class TestLinkScan(TestCase):
+    def test_links(self):
+        self.assertEqual(
+            [(link.reference, link.text) for link in find_links_in_string(
+                "[[Header 1]] [[https://example.com][text]] https://example.org/page.\n"
+                "[[not closed\n"
+                "on this line]] [[a][b]c]]\n")],
+            [
+                ("Header 1", None),
+                ("https://example.com", "text"),
+                ("https://example.org/page", "https://example.org/page"),
+                ("a", "b]c"),
+            ])
+
+    def test_long_unclosed_line(self):
+        # every `[[' of the line has no closing brackets, scan must not restart from each of them
+        text = "[[" * 100000 + " https://example.com\n" + "[[a]x" * 20000 + "\n[[Header 1]]\n"
+        start = time.perf_counter()
+        link_list = find_links_in_string(text)
+        self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertEqual([link.reference for link in link_list], ["https://example.com", "Header 1"])
+
+
+HEADING_TEXT = (
+    "* Header 1\n"
+    ":PROPERTIES:\n"
+    ":CUSTOM_ID: first\n"
+    ":END:\n"
+    "#+BEGIN_SRC\n"
+    "* not a header\n"
+    ":CUSTOM_ID: not_an_id\n"
+    "#+END_SRC\n"
+    "** Header 2\n"
+    "SCHEDULED: <2020-01-01 Wed>\n"
+    ":PROPERTIES:\n"
+    ":CUSTOM_ID: second\n"
+    ":END:\n"
+    "* header 3\n"
+    "some text\n"
+    ":PROPERTIES:\n"
+    ":CUSTOM_ID: not_in_drawer\n"
+    ":END:\n"
+)
+
+
+class TestHeadingIndex(TestCase):
+    def test_scan_headings(self):
+        self.assertEqual(
+            [(h.path, h.line_index_0, h.custom_id) for h in scan_headings(HEADING_TEXT)],
+            [
+                (("Header 1",), 0, "first"),
+                (("Header 1", "Header 2"), 8, "second"),
+                (("header 3",), 13, None),
+            ])
+
+    def test_scan_headings_unterminated_block(self):
+        self.assertEqual(
+            [h.path for h in scan_headings("* Header 1\n#+BEGIN_EXAMPLE\n* Header 2\n")],
+            [("Header 1",)])
+
+    def test_find_heading(self):
+        heading_list = scan_headings(HEADING_TEXT)
+        self.assertEqual(find_heading(heading_list, "#second").path, ("Header 1", "Header 2"))
+        self.assertIsNone(find_heading(heading_list, "#not_an_id"))
+        self.assertIsNone(find_heading(heading_list, "#not_in_drawer"))
+        self.assertEqual(find_heading(heading_list, "*Header 2").line_index_0, 8)
+        self.assertEqual(find_heading(heading_list, "Header 3").line_index_0, 13)
+        self.assertIsNone(find_heading(heading_list, "not a header"))
+
+    def test_workspace_index_mtime(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "notes.org")
+            cache_file = os.path.join(tmp_dir, "cache", "headings.json")
+            with open(file_name, "w", encoding="utf-8") as outf:
+                outf.write("* Header 1\n")
+            os.utime(file_name, (1000000, 1000000))
+
+            heading_index = WorkspaceHeadingIndex(cache_file)
+            self.assertEqual([h.path for h in heading_index.get_headings(file_name)], [("Header 1",)])
+            heading_index.save()
+
+            # file with the same mtime is not read again
+            with open(file_name, "w", encoding="utf-8") as outf:
+                outf.write("* Header 2\n")
+            os.utime(file_name, (1000000, 1000000))
+            heading_index = WorkspaceHeadingIndex(cache_file)
+            self.assertEqual([h.path for h in heading_index.get_headings(file_name)], [("Header 1",)])
+
+            os.utime(file_name, (2000000, 2000000))
+            self.assertEqual([h.path for h in heading_index.get_headings(file_name)], [("Header 2",)])
+
+    def test_save_error(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            not_dir = os.path.join(tmp_dir, "cache")
+            with open(not_dir, "w", encoding="utf-8") as outf:
+                outf.write("")
+            heading_index = WorkspaceHeadingIndex(os.path.join(not_dir, "headings.json"))
+            heading_index.update_text(os.path.join(tmp_dir, "notes.org"), 1000000, "* Header 1\n")
+            with mock.patch.object(sublime, "status_message") as status_message:
+                save_cache(heading_index)
+            self.assertTrue(status_message.call_args[0][0].startswith("Cannot save Zorgmode cache: "))
+
+
+class TestFileLinkPosition(ZorgTestCase):
+    def test_file_link_position(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "notes.org")
+            with open(file_name, "w", encoding="utf-8") as outf:
+                outf.write(HEADING_TEXT)
+
+            self.assertEqual(get_file_link_position(self.view, "file:" + file_name), (file_name, None))
+            self.assertEqual(get_file_link_position(self.view, "file:" + file_name + "::42"), (file_name, 42))
+            self.assertEqual(get_file_link_position(self.view, "file:" + file_name + "::#second"), (file_name, 9))
+            self.assertEqual(
+                get_file_link_position(self.view, "file:" + file_name + "::*header 3"), (file_name, 14))
+            self.assertEqual(
+                get_file_link_position(self.view, "file:" + file_name + "::#not_an_id"), (file_name, None))
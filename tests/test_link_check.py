@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from Zorgmode.zorg_link_check import (
+    LinkCheckCache,
+
+    check_links,
+    format_broken_link,
+    main as link_check_main,
+)
+
+
+class TestLinkCheck(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmp_dir.name, "cache", "link-check.json")
+        self.main_file = self.write_file(
+            "main.org",
+            "#+LINK: other file:other.org::\n"
+            "* Header 1\n"
+            "[[Header 1]] [[Header 2]] https://example.com\n"
+            "[[file:other.org::#target]] [[other:*Missing]]\n"
+            "[[file:missing.org]] [[file:other.org::3]]\n")
+        self.other_file = self.write_file(
+            "other.org",
+            "* Target\n"
+            ":PROPERTIES:\n"
+            ":CUSTOM_ID: target\n"
+            ":END:\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_file(self, name, text, mtime=1000000):
+        file_name = os.path.join(self.tmp_dir.name, name)
+        with open(file_name, "w", encoding="utf-8") as outf:
+            outf.write(text)
+        os.utime(file_name, (mtime, mtime))
+        return file_name
+
+    def test_broken_links(self):
+        broken_list, error_list, rescanned = check_links(
+            [self.main_file, self.other_file], LinkCheckCache())
+        self.assertEqual(error_list, [])
+        self.assertEqual(rescanned, 2)
+        self.assertEqual(
+            [(b.line_index_0, b.reference) for b in broken_list],
+            [(2, "Header 2"), (3, "other:*Missing"), (4, "file:missing.org")])
+        self.assertEqual(
+            format_broken_link(broken_list[0]),
+            "{}:3: [[Header 2]]: heading is not found".format(self.main_file))
+
+    def test_rescan_count(self):
+        file_list = [self.main_file, self.other_file]
+        cache = LinkCheckCache(self.cache_file)
+        self.assertEqual(check_links(file_list, cache)[2], 2)
+        cache.save()
+
+        cache = LinkCheckCache(self.cache_file)
+        self.assertEqual(check_links(file_list, cache)[2], 0)
+
+        # heading of other file is renamed, link to it becomes broken
+        self.write_file("other.org", "* Target\n", mtime=2000000)
+        broken_list, _, rescanned = check_links(file_list, cache)
+        self.assertEqual(rescanned, 1)
+        self.assertIn("file:other.org::#target", [b.reference for b in broken_list])
+
+    def run_main(self, argv):
+        stdout = io.StringIO()
+        with mock.patch("sys.stdout", stdout), mock.patch("sys.stderr", io.StringIO()) as stderr:
+            exit_code = link_check_main(["--jobs", "1", "--cache", self.cache_file] + argv)
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    def test_cli_exit_code(self):
+        exit_code, output, summary = self.run_main([self.main_file, self.other_file])
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(len(output.splitlines()), 3)
+        self.assertEqual(summary, "3 broken links in 2 files, 2 files rescanned\n")
+
+        exit_code, output, summary = self.run_main([self.other_file])
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(output, "")
+        self.assertEqual(summary, "0 broken links in 1 files, 0 files rescanned\n")
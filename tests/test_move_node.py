@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from unittest import mock
+
 import sublime
+from Zorgmode import zorgmode
 from zorgtest import (
     get_active_view_text,
     get_active_view_cursor_position,
@@ -225,6 +228,148 @@ class TestMoveHeader(ZorgTestCase):
         actual_folding = self.view.folded_regions()
         self.assertEqual(expected_folding, actual_folding)
 
+    def test_move_keeps_folds(self):
+        set_active_view_text(
+            "* Caption 1\n"
+            "text 1\n"
+            "* Caption 2\n"
+            "text 2\n"
+            "* Caption 3\n"
+            "text 3")
+        set_active_view_cursor_position(3, 1)
+        self.view.run_command('zorg_cycle')
+        set_active_view_cursor_position(1, 1)
+        self.view.run_command('zorg_cycle')
+        set_active_view_cursor_position(5, 1)
+        self.view.run_command('zorg_cycle')
+
+        self.view.run_command('zorg_move_node_up')
+        self.assertEqual(
+            get_active_view_text(),
+            "* Caption 1\n"
+            "text 1\n"
+            "* Caption 3\n"
+            "text 3\n"
+            "* Caption 2\n"
+            "text 2")
+        self.assertEqual(get_active_view_cursor_position(), (3, 1))
+        self.assertEqual(
+            [self.view.substr(r) for r in self.view.folded_regions()],
+            ["\ntext 1", "\ntext 3", "\ntext 2"])
+
+    def test_move_node_by_count_and_target(self):
+        set_active_view_text(
+            "* A\n"
+            "* B\n"
+            "** B1\n"
+            "* C\n"
+            "* D\n")
+        set_active_view_cursor_position(1, 3)
+        self.view.run_command('zorg_move_node', {"count": 2})
+        self.assertEqual(
+            get_active_view_text(),
+            "* B\n"
+            "** B1\n"
+            "* C\n"
+            "* A\n"
+            "* D\n")
+        self.assertEqual(get_active_view_cursor_position(), (4, 3))
+
+        self.view.run_command('zorg_move_node', {"to": "top"})
+        self.assertEqual(
+            get_active_view_text(),
+            "* A\n"
+            "* B\n"
+            "** B1\n"
+            "* C\n"
+            "* D\n")
+        self.assertEqual(get_active_view_cursor_position(), (1, 3))
+
+        set_active_view_cursor_position(2, 1)
+        self.view.run_command('zorg_move_node', {"after": "D"})
+        self.assertEqual(
+            get_active_view_text(),
+            "* A\n"
+            "* C\n"
+            "* D\n"
+            "* B\n"
+            "** B1\n")
+        self.assertEqual(get_active_view_cursor_position(), (4, 1))
+
+        self.view.run_command('zorg_move_node', {"count": -10})
+        self.assertEqual(
+            get_active_view_text(),
+            "* B\n"
+            "** B1\n"
+            "* A\n"
+            "* C\n"
+            "* D\n")
+        self.assertEqual(get_active_view_cursor_position(), (1, 1))
+
+    def test_move_node_in_large_document(self):
+        # document is parsed partially around the cursor, but the node must pass all its siblings
+        settings = sublime.load_settings("Zorgmode.sublime-settings")
+        old_threshold = settings.get("zorg_partial_parse_threshold")
+        settings.set("zorg_partial_parse_threshold", 1)
+        try:
+            set_active_view_text("".join("* Caption {}\n".format(i) for i in range(300)))
+            set_active_view_cursor_position(1, 3)
+            self.view.run_command('zorg_move_node', {"to": "bottom"})
+            line_list = get_active_view_text().split("\n")
+            self.assertEqual(line_list[0], "* Caption 1")
+            self.assertEqual(line_list[299], "* Caption 0")
+            self.assertEqual(get_active_view_cursor_position(), (300, 3))
+
+            self.view.run_command('zorg_move_node', {"after": "Caption 150"})
+            line_list = get_active_view_text().split("\n")
+            self.assertEqual(line_list[149:152], ["* Caption 150", "* Caption 0", "* Caption 151"])
+
+            self.view.run_command('zorg_move_node', {"count": -1000})
+            self.assertEqual(get_active_view_text().split("\n")[0], "* Caption 0")
+        finally:
+            if old_threshold is None:
+                settings.erase("zorg_partial_parse_threshold")
+            else:
+                settings.set("zorg_partial_parse_threshold", old_threshold)
+
+
+class TestPartialParseRegion(ZorgTestCase):
+    TEXT = (
+        "* A\n"
+        "text\n"
+        "* B\n"
+        "#+BEGIN_SRC\n"
+        "#+END_EXAMPLE\n"
+        "* not a headline\n"
+        "#+END_SRC\n"
+        "* C\n"
+        "#+BEGIN_EXAMPLE\n"
+        "* not a headline\n"
+        "text\n"
+        "#+END_EXAMPLE\n"
+        "* D\n"
+        "* E\n"
+        "* F\n")
+
+    def get_partial_parse_lines(self, line):
+        point = self.view.text_point(line - 1, 0)
+        with mock.patch.object(self.view, "visible_region", return_value=sublime.Region(point, point)):
+            region = zorgmode.get_partial_parse_region(self.view, point)
+        return self.view.substr(self.view.line(region.a)), self.view.substr(self.view.line(region.b))
+
+    def test_block_lines_are_skipped(self):
+        set_active_view_text(self.TEXT)
+        # sections around the point and one more section on each side
+        self.assertEqual(self.get_partial_parse_lines(11), ("* B", "* E"))
+        self.assertEqual(self.get_partial_parse_lines(6), ("* A", "* D"))
+        self.assertEqual(self.get_partial_parse_lines(13), ("* C", "* F"))
+        # lines crossing chunk borders are scanned whole
+        with mock.patch.object(zorgmode, "PARTIAL_PARSE_SCAN_CHUNK", 8):
+            self.assertEqual(self.get_partial_parse_lines(11), ("* B", "* E"))
+            self.assertEqual(self.get_partial_parse_lines(10), ("* B", "* E"))
+            self.assertEqual(self.get_partial_parse_lines(6), ("* A", "* D"))
+
+
 class TestMoveListEntry(ZorgTestCase):
     def setUp(self):
         self.view = sublime.active_window().new_file()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from zorgtest import (
+    get_active_view_text,
+    get_active_view_cursor_position,
+    set_active_view_cursor_position,
+    set_active_view_text,
+    ZorgTestCase,
+)
+
+
+class TestPromoteSubtree(ZorgTestCase):
+    def test_promote_and_demote(self):
+        set_active_view_text(
+            "* Header 1\n"
+            "** Header 2\n"
+            "#+BEGIN_SRC\n"
+            "** not a headline\n"
+            "#+END_SRC\n"
+            "**** Header 3\n"
+            "** Header 4\n")
+        set_active_view_cursor_position(2, 4)
+        self.view.run_command("zorg_promote_subtree")
+        self.assertEqual(
+            get_active_view_text(),
+            "* Header 1\n"
+            "* Header 2\n"
+            "#+BEGIN_SRC\n"
+            "** not a headline\n"
+            "#+END_SRC\n"
+            "*** Header 3\n"
+            "** Header 4\n")
+        self.assertEqual(get_active_view_cursor_position(), (2, 3))
+
+        self.view.run_command("zorg_promote_subtree")
+        self.assertEqual(get_active_view_text().split("\n")[1], "* Header 2")
+
+        self.view.run_command("zorg_demote_subtree")
+        self.view.run_command("zorg_demote_subtree")
+        self.assertEqual(
+            get_active_view_text(),
+            "* Header 1\n"
+            "*** Header 2\n"
+            "#+BEGIN_SRC\n"
+            "** not a headline\n"
+            "#+END_SRC\n"
+            "***** Header 3\n"
+            "**** Header 4\n")
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+from unittest import TestCase
+
+from Zorgmode.zorg_search import (
+    SearchIndex,
+    SearchIndexUnavailable,
+)
+
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        try:
+            self.index = SearchIndex(os.path.join(self.tmp_dir.name, "cache", "search.sqlite"))
+        except SearchIndexUnavailable as e:
+            self.tmp_dir.cleanup()
+            self.skipTest(str(e))
+        self.file_name = os.path.join(self.tmp_dir.name, "notes.org")
+        self.write_file(
+            "intro text\n"
+            "* Header 1\n"
+            "first section about gardening\n"
+            "** Header 2\n"
+            "100% of flowers_and_trees\n")
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+    def write_file(self, text, mtime=1000000):
+        with open(self.file_name, "w", encoding="utf-8") as outf:
+            outf.write(text)
+        os.utime(self.file_name, (mtime, mtime))
+
+    def search(self, query):
+        return [(r.line_index_0, r.heading) for r in self.index.search(query)]
+
+    def test_fts_search(self):
+        self.assertEqual(self.index.update_files([self.file_name]), [])
+        self.assertEqual(self.search("garden"), [(1, "Header 1")])
+        self.assertEqual(self.search("FLOWERS"), [(3, "Header 1 / Header 2")])
+        self.assertEqual(self.search("intro"), [(0, "")])
+        self.assertEqual(self.search("missing"), [])
+        self.assertEqual(self.search("  "), [])
+
+    def test_short_query_fallback(self):
+        self.index.update_files([self.file_name])
+        self.assertEqual(self.search("% "), [(3, "Header 1 / Header 2")])
+        self.assertEqual(self.search("s_"), [(3, "Header 1 / Header 2")])
+        self.assertEqual(self.search("1"), [(1, "Header 1"), (3, "Header 1 / Header 2")])
+        self.assertEqual(self.search("zz"), [])
+
+    def test_reindex_modified_file(self):
+        self.index.update_files([self.file_name])
+        self.write_file("* Header 3\nabout cooking\n")
+        # mtime is the same, file is not read again
+        self.index.update_files([self.file_name])
+        self.assertEqual(self.search("cooking"), [])
+
+        os.utime(self.file_name, (2000000, 2000000))
+        self.index.update_files([self.file_name])
+        self.assertEqual(self.search("cooking"), [(0, "Header 3")])
+        self.assertEqual(self.search("garden"), [])
+
+        self.assertTrue(self.index.is_up_to_date(self.file_name, 2000000))
+        self.assertFalse(self.index.is_up_to_date(self.file_name, 1000000))
+
+        self.index.update_files([])
+        self.assertFalse(self.index.has_file(self.file_name))
+        self.assertEqual(self.search("cooking"), [])
@@ -107,3 +107,85 @@ class TestToggleCheckbox(ZorgTestCase):
             " - [] not a checkbox 4\n"
             " - [ ] will not be toggled\n"
         )
+
+    def test_statistics_cookies(self):
+        set_active_view_text(
+            "* Tasks [/]\n"
+            " - [ ] first [%]\n"
+            "   - [ ] first 1\n"
+            "   - [X] first 2\n"
+            " - [X] second\n"
+            "* Other [0/0]\n")
+
+        set_active_view_cursor_position(3, 1)
+        self.view.run_command('zorg_toggle_checkbox')
+        self.assertEqual(
+            get_active_view_text(),
+            "* Tasks [1/2]\n"
+            " - [ ] first [100%]\n"
+            "   - [X] first 1\n"
+            "   - [X] first 2\n"
+            " - [X] second\n"
+            "* Other [0/0]\n")
+
+        set_active_view_cursor_position(2, 1)
+        self.view.run_command('zorg_toggle_checkbox')
+        self.assertEqual(
+            get_active_view_text(),
+            "* Tasks [2/2]\n"
+            " - [X] first [100%]\n"
+            "   - [X] first 1\n"
+            "   - [X] first 2\n"
+            " - [X] second\n"
+            "* Other [0/0]\n")
+
+        view = get_active_view()
+        view.sel().clear()
+        view.sel().add(sublime.Region(view.text_point(2, 0), view.text_point(4, 0)))
+        self.view.run_command('zorg_toggle_checkbox')
+        self.assertEqual(
+            get_active_view_text(),
+            "* Tasks [2/2]\n"
+            " - [X] first [0%]\n"
+            "   - [ ] first 1\n"
+            "   - [ ] first 2\n"
+            " - [X] second\n"
+            "* Other [0/0]\n")
+
+    def test_statistics_cookie_of_selected_parent(self):
+        set_active_view_text(
+            "* Tasks [/]\n"
+            " - [ ] parent [/]\n"
+            "   - [ ] child 1\n"
+            "   - [ ] child 2\n"
+            " - [ ] other\n")
+
+        view = get_active_view()
+        view.sel().clear()
+        view.sel().add(sublime.Region(view.text_point(1, 0), view.text_point(4, 0)))
+        self.view.run_command('zorg_toggle_checkbox')
+        self.assertEqual(
+            get_active_view_text(),
+            "* Tasks [1/2]\n"
+            " - [X] parent [2/2]\n"
+            "   - [X] child 1\n"
+            "   - [X] child 2\n"
+            " - [ ] other\n")
+
+    def test_selection_in_large_document(self):
+        # document is parsed partially around the cursor, but selection covers all of it
+        settings = sublime.load_settings("Zorgmode.sublime-settings")
+        old_threshold = settings.get("zorg_partial_parse_threshold")
+        settings.set("zorg_partial_parse_threshold", 1)
+        try:
+            set_active_view_text("".join("* Caption {}\n - [ ] checkbox\n".format(i) for i in range(300)))
+            view = get_active_view()
+            view.sel().clear()
+            view.sel().add(sublime.Region(0, view.size()))
+            self.view.run_command('zorg_toggle_checkbox')
+            self.assertEqual(get_active_view_text().count("[X]"), 300)
+        finally:
+            if old_threshold is None:
+                settings.erase("zorg_partial_parse_threshold")
+            else:
+                settings.set("zorg_partial_parse_threshold", old_threshold)
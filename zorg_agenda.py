@@ -0,0 +1,671 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import array
+import bisect
+import calendar
+import collections
+import datetime
+import glob
+import hashlib
+import heapq
+import json
+import os
+import re
+
+# NOTE: this module doesn't import sublime module so agenda can be built outside of the editor (see zorg_agenda_cli)
+try:
+    from .mock_sublime import (
+        View as TextView,
+        Region as TextViewRegion,
+    )
+    from .zorg_view_parse import (
+        HEADLINE_RE,
+        OrgControlLine,
+        OrgHeadline,
+        OrgSection,
+        iter_tree_depth_first,
+        org_control_line_get_key_value,
+        org_headline_get_tag_list,
+        parse_org_document_new,
+    )
+except (ImportError, SystemError):
+    # loaded as top level module
+    from mock_sublime import (
+        View as TextView,
+        Region as TextViewRegion,
+    )
+    from zorg_view_parse import (
+        HEADLINE_RE,
+        OrgControlLine,
+        OrgHeadline,
+        OrgSection,
+        iter_tree_depth_first,
+        org_control_line_get_key_value,
+        org_headline_get_tag_list,
+        parse_org_document_new,
+    )
+
+ZORG_AGENDA_FILES = "zorg_agenda_files"
+
+AGENDA_BEGIN_LINE = "#+BEGIN_AGENDA"
+AGENDA_END_LINE = "#+END_AGENDA"
+
+TODO_HEADLINE_RE = re.compile(r"^[*]+\s(TODO\s.*)$")
+
+# Headlines without priority cookie are treated as [#B] like in Emacs org-mode.
+DEFAULT_PRIORITY = "B"
+
+# OrgTimestamp kinds shown in calendar agenda in the order they are shown within a day
+DATE_ITEM_KIND_LIST = ["deadline", "scheduled", "timestamp"]
+DATE_ITEM_KIND_CAPTION = {
+    "deadline": "Deadline",
+    "scheduled": "Scheduled",
+    "timestamp": "Event",
+}
+
+AgendaDateItem = collections.namedtuple("AgendaDateItem", ["date", "kind", "entry"])
+
+AgendaEntry = collections.namedtuple("AgendaEntry", [
+    "file_name",
+    "view_id",
+    "offset",
+    "line_index_0",
+    "keyword",
+    "priority",
+    "text",
+    "text_hash",
+])
+
+
+def headline_text_hash(text):
+    # 64-bit digest of a headline line (without line ending), fits into array.array("q")
+    digest = hashlib.md5(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little", signed=True)
+
+
+def format_agenda_item_line(caption, text):
+    return "  " + (caption + ":").ljust(9) + text
+
+
+def format_agenda_todo_line(text):
+    return format_agenda_item_line("TODO", text)
+
+
+def format_agenda_warning_line(msg):
+    return "#+WARNING: " + msg
+
+
+def format_agenda_date_line(date):
+    return "{} {}".format(date.isoformat(), calendar.day_name[date.weekday()])
+
+
+def format_agenda_date_item_line(kind, text):
+    return "  {}{}".format((DATE_ITEM_KIND_CAPTION[kind] + ":").ljust(11), text)
+
+
+def agenda_entry_from_headline(headline: OrgHeadline) -> AgendaEntry:
+    view = headline.view
+    region = headline.region
+    original_text = view.substr(region).rstrip("\n")
+    _, stripped_text = original_text.split(None, 1)
+    m = HEADLINE_RE.match(original_text)
+    row, _ = view.rowcol(region.a)
+    return AgendaEntry(
+        file_name=view.file_name(),
+        view_id=view.id(),
+        offset=region.a,
+        line_index_0=row,
+        keyword=m.group(2) if m is not None else None,
+        priority=m.group(3).upper() if m is not None and m.group(3) is not None else None,
+        text=stripped_text,
+        text_hash=headline_text_hash(original_text),
+    )
+
+
+def iter_todo_headlines(org_root):
+    for headline in iter_tree_depth_first(org_root):
+        if not isinstance(headline, OrgHeadline):
+            continue
+        text = headline.text().rstrip('\n')
+        if TODO_HEADLINE_RE.match(text):
+            yield headline
+
+
+def load_text_view(file_name):
+    with open(file_name, encoding="utf-8") as inf:
+        text = inf.read()
+    return TextView(text, file_name)
+
+
+def save_json_file(file_name, data):
+    """
+    Write json to temporary file and rename it over file_name, so partially written file is never read.
+    """
+    file_dir = os.path.dirname(file_name)
+    if file_dir and not os.path.isdir(file_dir):
+        os.makedirs(file_dir)
+    tmp_file = file_name + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as outf:
+        json.dump(data, outf)
+    os.replace(tmp_file, file_name)
+
+
+def load_todo_entries(file_name):
+    """
+    Read and parse file from disk, return list of AgendaEntry for its TODO headlines.
+    """
+    file_view = load_text_view(file_name)
+    if "TODO" not in file_view.text:
+        # cheap check that saves parsing of files without any TODO
+        return []
+    org_root = parse_org_document_new(file_view, TextViewRegion(0, file_view.size()))
+    return [agenda_entry_from_headline(h) for h in iter_todo_headlines(org_root)]
+
+
+class AgendaMetaInfoStore(object):
+    """
+    Column store for agenda item meta information.
+
+    File names are interned and numeric fields are kept in array.array columns,
+    headline text itself is not stored, only its 64-bit hash.
+    """
+    NO_VALUE = -1
+
+    def __init__(self):
+        self._file_name_list = []
+        self._file_name_index = {}
+        self._file_index = array.array("l")
+        self._view_id = array.array("l")
+        self._offset = array.array("l")
+        self._line_index_0 = array.array("l")
+        self._text_hash = array.array("q")
+
+    def __len__(self):
+        return len(self._offset)
+
+    def _intern_file_name(self, file_name):
+        if file_name is None:
+            return self.NO_VALUE
+        idx = self._file_name_index.get(file_name)
+        if idx is None:
+            idx = len(self._file_name_list)
+            self._file_name_list.append(file_name)
+            self._file_name_index[file_name] = idx
+        return idx
+
+    def add(self, file_name, view_id, offset, line_index_0, text_hash):
+        self._file_index.append(self._intern_file_name(file_name))
+        self._view_id.append(self.NO_VALUE if view_id is None else view_id)
+        self._offset.append(offset)
+        self._line_index_0.append(line_index_0)
+        self._text_hash.append(text_hash)
+        return len(self._offset) - 1
+
+    def get(self, idx):
+        file_index = self._file_index[idx]
+        view_id = self._view_id[idx]
+        return AgendaBase.AgendaItemMetaInfo(
+            file_name=None if file_index == self.NO_VALUE else self._file_name_list[file_index],
+            view_id=None if view_id == self.NO_VALUE else view_id,
+            offset=self._offset[idx],
+            line_index_0=self._line_index_0[idx],
+            text_hash=self._text_hash[idx],
+        )
+
+
+class AgendaBase(object):
+    AgendaLine = collections.namedtuple("AgendaLine", ["text", "meta_index"])
+    AgendaItemMetaInfo = collections.namedtuple("AgendaItemMetaInfo", [
+        "file_name",
+        "view_id",
+        "offset",
+        "line_index_0",
+        "text_hash",
+    ])
+
+    def __init__(self):
+        self._warnings = []
+        self._file_order = {}
+        self._meta_info_store = AgendaMetaInfoStore()
+        # meta info index for each line of finalized agenda, NO_VALUE for lines without meta info
+        self._final_line_meta_index = None
+
+    @staticmethod
+    def _check_line(text):
+        if "\n" in text:
+            raise ValueError("It's not a single line")
+
+    def get_line_meta_info(self, line_index_0: int) -> AgendaItemMetaInfo:
+        if self._final_line_meta_index is None:
+            raise RuntimeError("Agenda lines are not known before finalize() is called")
+        if not 0 <= line_index_0 < len(self._final_line_meta_index):
+            return None
+        meta_index = self._final_line_meta_index[line_index_0]
+        if meta_index == AgendaMetaInfoStore.NO_VALUE:
+            return None
+        return self._meta_info_store.get(meta_index)
+
+    def add_warning(self, msg):
+        self._check_line(msg)
+        self._warnings.append(self.AgendaLine(format_agenda_warning_line(msg), AgendaMetaInfoStore.NO_VALUE))
+
+    def add_file(self, file_name, view_id=None):
+        """
+        Fix position of the file in agenda order, files that are not added are ordered by their first entry.
+        """
+        return self._file_order.setdefault((file_name, view_id), len(self._file_order))
+
+    def _entry_order_key(self, entry: AgendaEntry):
+        file_order = self.add_file(entry.file_name, entry.view_id)
+        priority = entry.priority or DEFAULT_PRIORITY
+        return ord(priority), file_order, entry.offset
+
+    def _make_line(self, text, entry=None):
+        if entry is None:
+            return self.AgendaLine(text, AgendaMetaInfoStore.NO_VALUE)
+        meta_index = self._meta_info_store.add(
+            file_name=entry.file_name,
+            view_id=entry.view_id,
+            offset=entry.offset,
+            line_index_0=entry.line_index_0,
+            text_hash=entry.text_hash,
+        )
+        return self.AgendaLine(text, meta_index)
+
+    def _iter_body_lines(self):
+        raise NotImplementedError
+
+    def finalize(self):
+        final_lines = []
+        final_lines.append(self._make_line(AGENDA_BEGIN_LINE))
+        final_lines += self._warnings
+        final_lines += self._iter_body_lines()
+        final_lines.append(self._make_line(AGENDA_END_LINE))
+
+        # Text of the agenda lives in the agenda view, we only keep meta info indexes.
+        self._final_line_meta_index = array.array("l", (line.meta_index for line in final_lines))
+        self._warnings = None
+        self._file_order = None
+        return "\n".join(line.text for line in final_lines) + "\n"
+
+
+class Agenda(AgendaBase):
+    """
+    TODO agenda ordered by priority cookie, then by position of the file in agenda file list,
+    then by position in the file.
+
+    If `limit' is set only `limit' entries with the highest priority are kept,
+    they are selected with a bounded heap so memory doesn't depend on the number of added entries.
+
+    `caption' is shown before each entry.
+    """
+
+    def __init__(self, limit=None, caption="TODO"):
+        super(Agenda, self).__init__()
+        if limit is not None and limit < 0:
+            raise ValueError("Agenda limit must be nonnegative")
+        self._limit = limit
+        self._caption = caption
+        # when limit is set `_todos' is a heap where the entry with the lowest priority is on top
+        self._todos = []
+
+    def add_todo_item(self, headline_node):
+        self.add_entry(agenda_entry_from_headline(headline_node))
+
+    def add_entry(self, entry: AgendaEntry):
+        self._check_line(entry.text)
+        key = self._entry_order_key(entry)
+        if self._limit is None:
+            self._todos.append((key, entry))
+            return
+
+        # Keys consist of ints, negating them turns heapq min-heap into max-heap.
+        heap_item = (tuple(-k for k in key), entry)
+        if len(self._todos) < self._limit:
+            heapq.heappush(self._todos, heap_item)
+        elif self._todos and heap_item[0] > self._todos[0][0]:
+            heapq.heapreplace(self._todos, heap_item)
+
+    def take_entries(self):
+        """
+        Return sorted list of kept entries, agenda doesn't keep them after that.
+        """
+        if self._limit is None:
+            todos = self._todos
+            todos.sort(key=lambda item: item[0])
+        else:
+            todos = sorted(self._todos, reverse=True, key=lambda item: item[0])
+        self._todos = None
+        return [entry for _, entry in todos]
+
+    def _iter_body_lines(self):
+        for entry in self.take_entries():
+            yield self._make_line(format_agenda_item_line(self._caption, entry.text), entry)
+
+
+class CalendarAgenda(AgendaBase):
+    """
+    Agenda of deadlines, scheduled items and active timestamps for days from `first_date' to `last_date'.
+    """
+
+    def __init__(self, first_date, last_date):
+        super(CalendarAgenda, self).__init__()
+        if first_date > last_date:
+            raise ValueError("Calendar agenda must contain at least one day")
+        self.first_date = first_date
+        self.last_date = last_date
+        self._items = []
+
+    def add_date_index(self, date_index):
+        for item in date_index.query(self.first_date, self.last_date):
+            self._check_line(item.entry.text)
+            key = (item.date, DATE_ITEM_KIND_LIST.index(item.kind)) + self._entry_order_key(item.entry)
+            self._items.append((key, item))
+
+    def _iter_body_lines(self):
+        self._items.sort(key=lambda key_item: key_item[0])
+        item_iter = iter(self._items)
+        key_item = next(item_iter, None)
+        for ordinal in range(self.first_date.toordinal(), self.last_date.toordinal() + 1):
+            date = datetime.date.fromordinal(ordinal)
+            yield self._make_line(format_agenda_date_line(date))
+            while key_item is not None and key_item[1].date == date:
+                item = key_item[1]
+                yield self._make_line(format_agenda_date_item_line(item.kind, item.entry.text), item.entry)
+                key_item = next(item_iter, None)
+        self._items = None
+
+
+def add_months(date, months):
+    month_index = date.year * 12 + date.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    day = min(date.day, calendar.monthrange(year, month)[1])
+    return datetime.date(year, month, day)
+
+
+def iter_repeated_dates(date, repeater, first_date, last_date):
+    """
+    Dates of repeated timestamp within [first_date, last_date].
+    """
+    value, unit = repeater
+    if value <= 0:
+        if first_date <= date <= last_date:
+            yield date
+        return
+
+    if unit in ("d", "w"):
+        step = value * (7 if unit == "w" else 1)
+        ordinal = date.toordinal()
+        first_ordinal = first_date.toordinal()
+        if ordinal < first_ordinal:
+            ordinal += (first_ordinal - ordinal + step - 1) // step * step
+        while ordinal <= last_date.toordinal():
+            yield datetime.date.fromordinal(ordinal)
+            ordinal += step
+    elif unit in ("m", "y"):
+        step = value * (12 if unit == "y" else 1)
+        month_distance = (first_date.year - date.year) * 12 + first_date.month - date.month
+        count = max(0, month_distance // step)
+        while True:
+            cur = add_months(date, count * step)
+            if cur > last_date:
+                break
+            if cur >= first_date:
+                yield cur
+            count += 1
+
+
+class AgendaDateIndex(object):
+    """
+    Index date -> AgendaDateItem.
+
+    Dates of plain timestamps are kept as sorted array of ordinal days so range query is a bisect.
+    Timestamps with repeaters are kept aside and expanded only inside the requested range.
+    """
+
+    def __init__(self):
+        self._ordinal_list = array.array("l")
+        self._item_list = []
+        self._unsorted_item_list = []
+        self._repeating_list = []
+
+    def __len__(self):
+        return len(self._item_list) + len(self._unsorted_item_list) + len(self._repeating_list)
+
+    def add(self, timestamp, entry):
+        if timestamp.kind not in DATE_ITEM_KIND_CAPTION:
+            return
+        if timestamp.repeater is not None:
+            self._repeating_list.append((timestamp, entry))
+        else:
+            self._unsorted_item_list.append(AgendaDateItem(timestamp.date, timestamp.kind, entry))
+
+    def add_org_root(self, org_root):
+        for headline in iter_tree_depth_first(org_root):
+            if not isinstance(headline, OrgHeadline) or not headline.timestamps:
+                continue
+            entry = agenda_entry_from_headline(headline)
+            for timestamp in headline.timestamps:
+                self.add(timestamp, entry)
+
+    def _sort(self):
+        if not self._unsorted_item_list:
+            return
+        item_list = self._item_list + self._unsorted_item_list
+        item_list.sort(key=lambda item: item.date)
+        self._item_list = item_list
+        self._unsorted_item_list = []
+        self._ordinal_list = array.array("l", (item.date.toordinal() for item in item_list))
+
+    def query(self, first_date, last_date):
+        self._sort()
+        begin = bisect.bisect_left(self._ordinal_list, first_date.toordinal())
+        end = bisect.bisect_right(self._ordinal_list, last_date.toordinal())
+        for idx in range(begin, end):
+            yield self._item_list[idx]
+
+        for timestamp, entry in self._repeating_list:
+            if timestamp.date > last_date:
+                continue
+            for date in iter_repeated_dates(timestamp.date, timestamp.repeater, first_date, last_date):
+                yield AgendaDateItem(date, timestamp.kind, entry)
+
+
+TAG_MATCH_TERM_RE = re.compile(r"([-+&]?)([a-zA-Z0-9_@#]+)")
+
+
+def parse_tag_match(match_str):
+    """
+    Parse org-mode tag match string like `+work-someday|home' into list of alternatives,
+    each alternative is a tuple (required_tag_list, excluded_tag_list).
+    """
+    alternative_list = []
+    for alternative in match_str.split("|"):
+        alternative = alternative.replace(" ", "")
+        required = []
+        excluded = []
+        pos = 0
+        while pos < len(alternative):
+            m = TAG_MATCH_TERM_RE.match(alternative, pos)
+            if m is None:
+                raise ValueError("Bad tag match `{}' at position {}".format(match_str, pos))
+            if m.group(1) == "-":
+                excluded.append(m.group(2))
+            else:
+                required.append(m.group(2))
+            pos = m.end()
+        if not required and not excluded:
+            raise ValueError("Empty alternative in tag match `{}'".format(match_str))
+        alternative_list.append((required, excluded))
+    return alternative_list
+
+
+def iter_headline_tag_sets(org_root):
+    """
+    Yield (headline, tag set) for every headline, tags of parent sections and #+FILETAGS are inherited.
+    """
+    file_tags = set()
+    for item in iter_tree_depth_first(org_root):
+        if isinstance(item, OrgControlLine):
+            key, value = org_control_line_get_key_value(item)
+            if key == "FILETAGS":
+                file_tags.update(t for t in value.strip().strip(":").split(":") if t)
+
+    stack = [(section, frozenset(file_tags)) for section in reversed(org_root.children)]
+    while stack:
+        section, inherited = stack.pop()
+        tags = inherited
+        if isinstance(section, OrgSection) and section.level > 0:
+            headline = section.children[0]
+            own_tags = org_headline_get_tag_list(headline)
+            if own_tags:
+                tags = inherited.union(own_tags)
+            yield headline, tags
+        for child in reversed(section.children):
+            if isinstance(child, OrgSection):
+                stack.append((child, tags))
+
+
+class AgendaTagIndex(object):
+    """
+    Inverted index tag -> set of (file key, headline offset) over agenda files.
+
+    Postings of a file are replaced when the file is updated, other files are not touched.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._all_headlines = set()
+        self._file_version = {}
+        self._file_tags = {}
+        self._file_entries = {}
+
+    def __len__(self):
+        return len(self._all_headlines)
+
+    def get_file_version(self, file_key):
+        return self._file_version.get(file_key)
+
+    def file_keys(self):
+        return list(self._file_version)
+
+    def remove_file(self, file_key):
+        if file_key not in self._file_version:
+            return
+        del self._file_version[file_key]
+        for tag, offset_list in self._file_tags.pop(file_key).items():
+            posting = self._postings[tag]
+            posting.difference_update((file_key, offset) for offset in offset_list)
+            if not posting:
+                del self._postings[tag]
+        self._all_headlines.difference_update(
+            (file_key, offset) for offset in self._file_entries.pop(file_key)
+        )
+
+    def update_file(self, file_key, version, org_root):
+        self.remove_file(file_key)
+        file_tags = {}
+        file_entries = {}
+        for headline, tags in iter_headline_tag_sets(org_root):
+            entry = agenda_entry_from_headline(headline)
+            file_entries[entry.offset] = entry
+            self._all_headlines.add((file_key, entry.offset))
+            for tag in tags:
+                file_tags.setdefault(tag, []).append(entry.offset)
+                self._postings.setdefault(tag, set()).add((file_key, entry.offset))
+        self._file_version[file_key] = version
+        self._file_tags[file_key] = file_tags
+        self._file_entries[file_key] = file_entries
+
+    def query(self, match_str, file_key_list=None):
+        """
+        Return list of AgendaEntry for headlines matching org-mode tag match string.
+
+        Entries are ordered by position of their file in file_key_list (by file key if it is not given),
+        then by position in the file.
+        """
+        result = set()
+        for required, excluded in parse_tag_match(match_str):
+            # start from the shortest posting list
+            posting_list = sorted((self._postings.get(tag, set()) for tag in required), key=len)
+            if posting_list:
+                matched = posting_list[0].intersection(*posting_list[1:])
+            else:
+                matched = self._all_headlines
+            if excluded:
+                matched = matched.difference(*(self._postings.get(tag, ()) for tag in excluded))
+            result.update(matched)
+        if file_key_list is None:
+            file_key_list = sorted(self._file_version)
+        file_rank = {file_key: i for i, file_key in enumerate(file_key_list)}
+        result = sorted(result, key=lambda item: (file_rank.get(item[0], len(file_rank)), item))
+        return [self._file_entries[file_key][offset] for file_key, offset in result]
+
+
+class AgendaFileIndexCache(object):
+    """
+    Per file indexes that are rebuilt only when version of the file changes.
+
+    Version is any comparable value, e.g. mtime of the file on disk or change count of the open view.
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def get(self, file_key, version):
+        cached = self._cache.get(file_key)
+        if cached is None or version is None or cached[0] != version:
+            return None
+        return cached[1]
+
+    def put(self, file_key, version, index):
+        if version is None:
+            return
+        self._cache[file_key] = (version, index)
+
+    def discard(self, file_key):
+        self._cache.pop(file_key, None)
+
+
+class AgendaWarningCollector(object):
+    """
+    Stand-in for agenda output when only warnings of expand_file_list are needed.
+    """
+
+    def __init__(self):
+        self.warnings = []
+
+    def add_warning(self, msg):
+        self.warnings.append(msg)
+
+
+def expand_file_list(file_list, agenda_output):
+    result = []
+    unique = set()
+    for file_name in file_list:
+        file_name = os.path.expanduser(file_name)
+        if not os.path.isabs(file_name):
+            agenda_output.add_warning(
+                "Path `{file_name} in `{settings}' is not absolute."
+                .format(
+                    file_name=file_name,
+                    settings=ZORG_AGENDA_FILES
+                )
+            )
+            continue
+
+        match_found = False
+        for match_file_name in glob.iglob(file_name):
+            if match_file_name not in unique:
+                result.append(match_file_name)
+                unique.add(match_file_name)
+            match_found = True
+
+        if not match_found:
+            agenda_output.add_warning(
+                "Cannot find `{file_name}' from `{setting}'"
+                .format(file_name=file_name, setting=ZORG_AGENDA_FILES)
+            )
+    return result
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Build Zorgmode TODO agenda outside of Sublime Text.
+
+    python -m zorg_agenda_cli '~/org/*.org' ~/work/TODO.org
+    python -m zorg_agenda_cli --format json --jobs 8 '~/org/projects/*.org'
+    python -m zorg_agenda_cli --limit 20 '~/org/*.org'
+
+Files are parsed by parallel workers, entries are printed in the same order as in Sublime Text agenda:
+by priority, then by position of the file in the file list, then by position in the file.
+With --limit only the entries with the highest priority are kept.
+
+Output is not streamed: entries can be sorted only after all files are parsed, so the whole agenda
+is printed at once.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+
+try:
+    from .zorg_agenda import (
+        AGENDA_BEGIN_LINE,
+        AGENDA_END_LINE,
+        Agenda,
+        AgendaWarningCollector,
+
+        expand_file_list,
+        format_agenda_todo_line,
+        format_agenda_warning_line,
+        load_todo_entries,
+    )
+except (ImportError, SystemError):
+    # loaded as top level module
+    from zorg_agenda import (
+        AGENDA_BEGIN_LINE,
+        AGENDA_END_LINE,
+        Agenda,
+        AgendaWarningCollector,
+
+        expand_file_list,
+        format_agenda_todo_line,
+        format_agenda_warning_line,
+        load_todo_entries,
+    )
+
+WORKER_CHUNK_SIZE = 16
+
+
+def _load_file(file_name):
+    try:
+        return file_name, load_todo_entries(file_name), None
+    except Exception as e:
+        return file_name, [], str(e)
+
+
+def iter_loaded_files(file_list, jobs):
+    """
+    Yield (file_name, entry list, error) for every file, with parallel workers in order of completion.
+    """
+    if jobs <= 1 or len(file_list) <= 1:
+        for file_name in file_list:
+            yield _load_file(file_name)
+        return
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for result in pool.imap_unordered(_load_file, file_list, WORKER_CHUNK_SIZE):
+            yield result
+    finally:
+        pool.terminate()
+
+
+class AgendaTextWriter(object):
+    def __init__(self, outf):
+        self._outf = outf
+
+    def begin(self, warnings):
+        self._outf.write(AGENDA_BEGIN_LINE + "\n")
+        for msg in warnings:
+            self.warning(msg)
+
+    def warning(self, msg):
+        self._outf.write(format_agenda_warning_line(msg) + "\n")
+
+    def entry(self, entry):
+        self._outf.write(format_agenda_todo_line(entry.text) + "\n")
+
+    def end(self):
+        self._outf.write(AGENDA_END_LINE + "\n")
+
+
+class AgendaJsonWriter(object):
+    def __init__(self, outf):
+        self._outf = outf
+
+    def begin(self, warnings):
+        for msg in warnings:
+            self.warning(msg)
+
+    def warning(self, msg):
+        sys.stderr.write("warning: {}\n".format(msg))
+
+    def entry(self, entry):
+        record = {
+            "file": entry.file_name,
+            "line": entry.line_index_0 + 1,
+            "keyword": entry.keyword,
+            "text": entry.text,
+        }
+        self._outf.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def end(self):
+        pass
+
+
+def non_negative_int(value):
+    result = int(value)
+    if result < 0:
+        raise argparse.ArgumentTypeError("must be nonnegative: {}".format(value))
+    return result
+
+
+def _silence_stdout():
+    # interpreter flushes stdout at exit, closed pipe would raise there again
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, fd)
+    os.close(devnull)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m zorg_agenda_cli",
+        description="Print TODO agenda for org files.")
+    parser.add_argument(
+        "file_list", metavar="FILE", nargs="+",
+        help="org file or glob, same as entries of `zorg_agenda_files' setting")
+    parser.add_argument(
+        "--format", choices=["agenda", "json"], default="agenda",
+        help="`agenda' prints #+BEGIN_AGENDA block, `json' prints one JSON object per line")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+        help="number of parallel workers (default: number of CPUs)")
+    parser.add_argument(
+        "--limit", type=non_negative_int, default=None,
+        help="print only LIMIT entries with the highest priority")
+    args = parser.parse_args(argv)
+
+    warning_collector = AgendaWarningCollector()
+    file_list = [
+        os.path.abspath(os.path.expanduser(f))
+        for f in args.file_list
+    ]
+    file_list = expand_file_list(file_list, warning_collector)
+
+    writer_cls = {
+        "agenda": AgendaTextWriter,
+        "json": AgendaJsonWriter,
+    }[args.format]
+    writer = writer_cls(sys.stdout)
+
+    agenda = Agenda(limit=args.limit)
+    # files are loaded in any order, agenda order and order of errors follow the file list
+    for file_name in file_list:
+        agenda.add_file(file_name)
+    error_list = []
+    for file_name, entry_list, error in iter_loaded_files(file_list, args.jobs):
+        if error is not None:
+            error_list.append((agenda.add_file(file_name), file_name, error))
+            continue
+        for entry in entry_list:
+            agenda.add_entry(entry)
+
+    has_errors = bool(warning_collector.warnings or error_list)
+    try:
+        writer.begin(warning_collector.warnings)
+        for _, file_name, error in sorted(error_list):
+            writer.warning(
+                "Error occurred while reading file `{file_name}': {error}"
+                .format(file_name=file_name, error=error)
+            )
+        for entry in agenda.take_entries():
+            writer.entry(entry)
+        writer.end()
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # reader of the output exited early, e.g. `head'
+        _silence_stdout()
+        return 1
+    return 1 if has_errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
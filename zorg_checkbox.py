@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import re
+
+# NOTE: this module doesn't import sublime module
+try:
+    from .zorg_view_parse import (
+        OrgListEntry,
+        OrgSection,
+
+        iter_tree_depth_first,
+        org_list_entry_get_tick_position,
+    )
+except (ImportError, SystemError):
+    # loaded as top level module
+    from zorg_view_parse import (
+        OrgListEntry,
+        OrgSection,
+
+        iter_tree_depth_first,
+        org_list_entry_get_tick_position,
+    )
+
+# [2/5], [/], [40%], [%]
+STATISTICS_COOKIE_RE = re.compile(r"\[(?:(\d*)/(\d*)|(\d*)%)\]")
+CHECKED_TICK_SET = frozenset("Xx")
+
+
+class CheckboxIndex(object):
+    """
+    Checkbox list items of the document ordered by position of their ticks.
+    """
+
+    def __init__(self, org_root):
+        self._entry_list = [
+            node for node in iter_tree_depth_first(org_root)
+            if isinstance(node, OrgListEntry) and node.tick_offset is not None
+        ]
+        self._entry_list.sort(key=org_list_entry_get_tick_position)
+        self._tick_list = [org_list_entry_get_tick_position(entry) for entry in self._entry_list]
+
+    def find_in_regions(self, region_list):
+        """
+        Return checkbox items with ticks inside of any region (region end included) in document order.
+        """
+        index_set = set()
+        for region in region_list:
+            begin = bisect.bisect_left(self._tick_list, min(region.a, region.b))
+            end = bisect.bisect_right(self._tick_list, max(region.a, region.b))
+            index_set.update(range(begin, end))
+        return [self._entry_list[i] for i in sorted(index_set)]
+
+
+def format_statistics_cookie(match, done, total):
+    if match.group(3) is not None:
+        percent = done * 100 // total if total else 0
+        return "[{}%]".format(percent)
+    return "[{}/{}]".format(done, total)
+
+
+def get_statistics_cookie_changes(view, toggled_entry_list, new_tick):
+    """
+    Return list of (region, text) that update statistics cookies after ticks of toggled items are set to new_tick.
+
+    Cookie of a list item counts its direct checkbox children, cookie of a headline counts checkbox items
+    of the lists in the text of its section. Only items and headlines above the toggled items are visited.
+    """
+    toggled_entry_set = set(toggled_entry_list)
+    owner_list = []
+    visited = set()
+    for entry in toggled_entry_list:
+        owner = entry.parent.parent
+        while owner is not None and owner not in visited:
+            visited.add(owner)
+            owner_list.append(owner)
+            if isinstance(owner, OrgListEntry):
+                owner = owner.parent.parent
+            else:
+                break
+
+    result = []
+    for owner in owner_list:
+        if isinstance(owner, OrgSection):
+            if owner.level == 0:
+                continue
+            line_node = owner.children[0]
+        elif isinstance(owner, OrgListEntry):
+            line_node = owner
+        else:
+            continue
+        line_region = _get_first_line_region(line_node)
+        line = view.substr(line_region)
+        if "[" not in line:
+            continue
+        match_list = list(STATISTICS_COOKIE_RE.finditer(line))
+        if not match_list:
+            continue
+
+        done = 0
+        total = 0
+        for child_list in owner.children:
+            for child in child_list.children:
+                if not isinstance(child, OrgListEntry) or child.tick_offset is None:
+                    continue
+                total += 1
+                if child in toggled_entry_set:
+                    tick = new_tick
+                else:
+                    tick_position = org_list_entry_get_tick_position(child)
+                    tick = view.substr(type(line_region)(tick_position, tick_position + 1))
+                if tick in CHECKED_TICK_SET:
+                    done += 1
+
+        for m in match_list:
+            text = format_statistics_cookie(m, done, total)
+            if text != m.group(0):
+                region = type(line_region)(line_region.a + m.start(), line_region.a + m.end())
+                result.append((region, text))
+    return result
+
+
+def _get_first_line_region(node):
+    region_cls = type(node.region)
+    # text of list item ends before its sublists
+    end = node.children[0].region.a if node.children else node.region.b
+    text = node.view.substr(region_cls(node.region.a, end))
+    line_end = text.find("\n")
+    if line_end != -1:
+        end = node.region.a + line_end
+    return region_cls(node.region.a, end)
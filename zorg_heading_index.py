@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import collections
+import json
+import os
+import re
+import threading
+
+# NOTE: this module doesn't import sublime module
+try:
+    from .zorg_agenda import load_text_view, save_json_file
+    from .zorg_view_parse import (
+        PLANNING_LINE_RE,
+
+        iter_headline_paths,
+        org_headline_line_get_text,
+    )
+except (ImportError, SystemError):
+    # loaded as top level module
+    from zorg_agenda import load_text_view, save_json_file
+    from zorg_view_parse import (
+        PLANNING_LINE_RE,
+
+        iter_headline_paths,
+        org_headline_line_get_text,
+    )
+
+HEADING_PATH_SEPARATOR = " / "
+
+# path is a tuple of headline titles from the top level headline
+HeadingRecord = collections.namedtuple("HeadingRecord", "path,offset,line_index_0,custom_id")
+
+HEADING_SCAN_RE = re.compile(
+    r"^(?:"
+    r"(?P<stars>[*]+)[ \t].*"
+    r"|[ \t]*\#\+(?P<block>BEGIN|END)_(?P<block_type>SRC|EXAMPLE)\b.*"
+    r"|[ \t]*:(?P<drawer>PROPERTIES|END):[ \t]*"
+    r"|[ \t]*:CUSTOM_ID:[ \t]*(?P<custom_id>\S+)[ \t]*"
+    r")$",
+    re.MULTILINE | re.IGNORECASE
+)
+
+
+def scan_headings(text):
+    """
+    Return HeadingRecord list of all headlines of the text.
+
+    Text is scanned with one regular expression instead of being parsed. Lines of source and example blocks
+    are skipped, custom id is taken from :CUSTOM_ID: property of the drawer right after headline.
+    """
+    result = []
+    stack = []  # (level, title)
+    line_index_0 = 0
+    prev_offset = 0
+    block_type = None  # type of the block scan is inside of
+    in_drawer = False  # scan is inside of the properties drawer of the last headline
+    for m in HEADING_SCAN_RE.finditer(text):
+        offset = m.start()
+        line_index_0 += text.count("\n", prev_offset, offset)
+        prev_offset = offset
+        if block_type is not None:
+            # block keywords are case sensitive as in parser
+            if m.group("block") == "END" and m.group("block_type") == block_type:
+                block_type = None
+            continue
+        if m.group("block") is not None:
+            if m.group("block") == "BEGIN" and m.group("block_type").isupper():
+                block_type = m.group("block_type")
+                in_drawer = False
+            continue
+        if m.group("drawer") is not None:
+            in_drawer = (
+                m.group("drawer").upper() == "PROPERTIES"
+                and bool(result)
+                and _is_drawer_after_headline(text, result[-1], offset, line_index_0)
+            )
+            continue
+        if m.group("custom_id") is not None:
+            if in_drawer and result[-1].custom_id is None:
+                result[-1] = result[-1]._replace(custom_id=m.group("custom_id"))
+            continue
+        in_drawer = False
+        title = org_headline_line_get_text(m.group(0))
+        if title is None:
+            continue
+        level = len(m.group("stars"))
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, title))
+        result.append(HeadingRecord(tuple(t for _, t in stack), offset, line_index_0, None))
+    return result
+
+
+def _is_drawer_after_headline(text, heading, offset, line_index_0):
+    if line_index_0 == heading.line_index_0 + 1:
+        return True
+    if line_index_0 != heading.line_index_0 + 2:
+        return False
+    # planning line might be between headline and drawer
+    prev_line_begin = text.rfind("\n", 0, offset - 1) + 1
+    return PLANNING_LINE_RE.match(text[prev_line_begin:offset - 1]) is not None
+
+
+def build_outline(org_root):
+    """
+    Return list of (outline path string, headline offset) for all headlines of the tree in document order.
+    """
+    return [
+        (HEADING_PATH_SEPARATOR.join(path), headline.region.a)
+        for headline, path in iter_headline_paths(org_root)
+    ]
+
+
+class HeadlinePositionIndex(object):
+    """
+    Finds chain of headlines containing given point.
+
+    Headline starts are kept in sorted list together with index of parent headline,
+    lookup is a bisect followed by a walk to the top level headline.
+    """
+
+    def __init__(self, org_root):
+        # tree might be parsed only around the cursor
+        self._region = org_root.region
+        self._start_list = []
+        self._parent_list = []
+        self._title_list = []
+        self._headline_list = []
+        stack = []
+        for headline, path in iter_headline_paths(org_root):
+            depth = len(path)
+            del stack[depth - 1:]
+            self._parent_list.append(stack[-1] if stack else -1)
+            stack.append(len(self._start_list))
+            self._start_list.append(headline.region.a)
+            self._title_list.append(path[-1])
+            self._headline_list.append(headline)
+
+    def __len__(self):
+        return len(self._start_list)
+
+    def covers(self, point):
+        return self._region is not None and self._region.a <= point <= self._region.b
+
+    def find_headline_starting_at(self, point):
+        idx = bisect.bisect_left(self._start_list, point)
+        if idx < len(self._start_list) and self._start_list[idx] == point:
+            return self._headline_list[idx]
+        return None
+
+    def find_path(self, point):
+        """
+        Return tuple of titles of headlines containing point, from the top level headline.
+        """
+        idx = bisect.bisect_right(self._start_list, point) - 1
+        path = []
+        while idx >= 0:
+            path.append(self._title_list[idx])
+            idx = self._parent_list[idx]
+        path.reverse()
+        return tuple(path)
+
+
+def find_heading(heading_list, search_option):
+    """
+    Find heading matching search option of `file:' link.
+
+    `#id' matches custom id, `*Title' and plain text match headline title, first exactly then
+    case insensitively. First heading in document order wins.
+    """
+    if search_option.startswith("#"):
+        custom_id = search_option[1:]
+        for heading in heading_list:
+            if heading.custom_id == custom_id:
+                return heading
+        return None
+
+    if search_option.startswith("*"):
+        search_option = search_option[1:]
+    title = search_option.strip()
+    for heading in heading_list:
+        if heading.path[-1] == title:
+            return heading
+    folded = title.casefold()
+    for heading in heading_list:
+        if heading.path[-1].casefold() == folded:
+            return heading
+    return None
+
+
+class WorkspaceHeadingIndex(object):
+    """
+    Headings of org files persisted in json file.
+
+    Entry of a file is valid while its mtime stays the same, so following a link to a heading
+    of a closed file reads only the index. Index is shared by the main thread and async jobs,
+    all access to the entries goes through the lock.
+    """
+    VERSION = 1
+
+    def __init__(self, cache_file=None):
+        self._cache_file = cache_file
+        self._files = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._files is not None:
+            return
+        self._files = {}
+        if self._cache_file is None or not os.path.exists(self._cache_file):
+            return
+        try:
+            with open(self._cache_file, encoding="utf-8") as inf:
+                data = json.load(inf)
+        except (IOError, OSError, ValueError):
+            # broken cache is rebuilt from scratch
+            return
+        if data.get("version") == self.VERSION:
+            self._files = data.get("files", {})
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or self._cache_file is None:
+                return
+            save_json_file(self._cache_file, {"version": self.VERSION, "files": self._files})
+            self._dirty = False
+
+    def update_text(self, file_name, mtime, text):
+        entry = {
+            "mtime": mtime,
+            "headings": [list(heading) for heading in scan_headings(text)],
+        }
+        with self._lock:
+            self._load()
+            self._files[file_name] = entry
+            self._dirty = True
+        return entry
+
+    def get_headings(self, file_name):
+        """
+        Return HeadingRecord list of the file, file is rescanned only if it was modified.
+        """
+        mtime = os.path.getmtime(file_name)
+        with self._lock:
+            self._load()
+            entry = self._files.get(file_name)
+        if entry is None or entry["mtime"] != mtime:
+            entry = self.update_text(file_name, mtime, load_text_view(file_name).text)
+        return [
+            HeadingRecord(tuple(path), offset, line_index_0, custom_id)
+            for path, offset, line_index_0, custom_id in entry["headings"]
+        ]
+
+    def find(self, file_name, search_option):
+        return find_heading(self.get_headings(file_name), search_option)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Find broken internal and `file:' links in org files.
+
+    python -m zorg_link_check '~/org/*.org' ~/work/TODO.org
+    python -m zorg_link_check --jobs 8 --cache /tmp/link-check.json '~/org/**/*.org'
+
+Every line of the report looks like `file:line: [[link]]: reason'.
+Files are scanned by parallel workers, scan results are cached by file mtime
+so reruns read only modified files.
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import re
+import sys
+
+# NOTE: this module doesn't import sublime module
+try:
+    from .zorg_agenda import (
+        AgendaWarningCollector,
+
+        expand_file_list,
+        load_text_view,
+        save_json_file,
+    )
+    from .zorg_heading_index import (
+        HeadingRecord,
+
+        find_heading,
+        scan_headings,
+    )
+    from .zorg_links import (
+        LinkAbbrevs,
+        LinkExpansionError,
+
+        iter_links_in_string,
+    )
+except (ImportError, SystemError):
+    # loaded as top level module
+    from zorg_agenda import (
+        AgendaWarningCollector,
+
+        expand_file_list,
+        load_text_view,
+        save_json_file,
+    )
+    from zorg_heading_index import (
+        HeadingRecord,
+
+        find_heading,
+        scan_headings,
+    )
+    from zorg_links import (
+        LinkAbbrevs,
+        LinkExpansionError,
+
+        iter_links_in_string,
+    )
+
+LINK_LINE_RE = re.compile(r"^#\+LINK:[ \t]*(\S+)[ \t]+(.*?)[ \t]*$", re.MULTILINE)
+
+# links with these schemes point outside of the workspace and are not checked
+EXTERNAL_SCHEME_SET = frozenset(["http", "https", "ftp", "mailto", "news", "doi"])
+FILE_SCHEME_SET = frozenset(["file", "file+sys"])
+
+WORKER_CHUNK_SIZE = 16
+
+BrokenLink = collections.namedtuple("BrokenLink", "file_name,line_index_0,reference,reason")
+
+
+def format_broken_link(broken_link):
+    return "{}:{}: [[{}]]: {}".format(
+        broken_link.file_name, broken_link.line_index_0 + 1, broken_link.reference, broken_link.reason)
+
+
+def scan_file(file_name):
+    """
+    Read file and extract everything that link check needs, result is json serializable.
+    """
+    mtime = os.path.getmtime(file_name)
+    text = load_text_view(file_name).text
+    link_list = []
+    line_index_0 = 0
+    prev_offset = 0
+    for link in iter_links_in_string(text):
+        line_index_0 += text.count("\n", prev_offset, link.start)
+        prev_offset = link.start
+        link_list.append([line_index_0, link.reference])
+    return {
+        "mtime": mtime,
+        "headings": [list(heading) for heading in scan_headings(text)],
+        "links": link_list,
+        "abbrevs": [list(m.groups()) for m in LINK_LINE_RE.finditer(text)],
+    }
+
+
+def _scan_file_safe(file_name):
+    try:
+        return file_name, scan_file(file_name), None
+    except Exception as e:
+        return file_name, None, str(e)
+
+
+def _iter_scanned_files(file_list, jobs):
+    if jobs <= 1 or len(file_list) <= 1:
+        for file_name in file_list:
+            yield _scan_file_safe(file_name)
+        return
+
+    pool = multiprocessing.Pool(min(jobs, len(file_list)))
+    try:
+        for result in pool.imap_unordered(_scan_file_safe, file_list, WORKER_CHUNK_SIZE):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def _records_to_headings(records):
+    return [
+        HeadingRecord(tuple(path), offset, line_index_0, custom_id)
+        for path, offset, line_index_0, custom_id in records
+    ]
+
+
+class LinkCheckCache(object):
+    """
+    Scan results of files keyed by file name, entry is valid while file mtime stays the same.
+    """
+    VERSION = 1
+
+    def __init__(self, cache_file=None):
+        self._cache_file = cache_file
+        self._files = {}
+        self._dirty = False
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file, encoding="utf-8") as inf:
+                    data = json.load(inf)
+            except (IOError, OSError, ValueError):
+                # broken cache is rebuilt from scratch
+                data = {}
+            if data.get("version") == self.VERSION:
+                self._files = data.get("files", {})
+
+    def get(self, file_name, mtime):
+        entry = self._files.get(file_name)
+        if entry is None or entry["mtime"] != mtime:
+            return None
+        return entry
+
+    def put(self, file_name, entry):
+        self._files[file_name] = entry
+        self._dirty = True
+
+    def retain(self, file_list):
+        file_set = set(file_list)
+        for file_name in list(self._files):
+            if file_name not in file_set:
+                del self._files[file_name]
+                self._dirty = True
+
+    def save(self):
+        if not self._dirty or self._cache_file is None:
+            return
+        save_json_file(self._cache_file, {"version": self.VERSION, "files": self._files})
+        self._dirty = False
+
+
+class LinkChecker(object):
+    """
+    Resolves links of scanned files against their headings and the filesystem.
+
+    Headings of files that are linked but not checked are read on demand by `get_headings'.
+    """
+
+    def __init__(self, scanned_files, settings_rule_list=(), get_headings=None):
+        self._headings = {
+            file_name: _records_to_headings(entry["headings"])
+            for file_name, entry in scanned_files.items()
+        }
+        self._settings_rule_list = list(settings_rule_list)
+        self._get_headings = get_headings or (lambda f: scan_headings(load_text_view(f).text))
+
+    def _target_headings(self, file_name):
+        headings = self._headings.get(file_name)
+        if headings is None:
+            headings = self._get_headings(file_name)
+            self._headings[file_name] = headings
+        return headings
+
+    def check_file(self, file_name, entry):
+        link_abbrevs = LinkAbbrevs(self._settings_rule_list + [tuple(rule) for rule in entry["abbrevs"]])
+        result = []
+        for line_index_0, reference in entry["links"]:
+            reason = self._check_link(file_name, link_abbrevs, reference)
+            if reason is not None:
+                result.append(BrokenLink(file_name, line_index_0, reference, reason))
+        return result
+
+    def _check_link(self, file_name, link_abbrevs, reference):
+        try:
+            url = link_abbrevs.expand(reference)
+        except LinkExpansionError as e:
+            return str(e)
+
+        scheme = url.split(":", 1)[0]
+        if scheme in EXTERNAL_SCHEME_SET:
+            return None
+        if scheme not in FILE_SCHEME_SET:
+            # same as zorg_follow_link: everything else is a headline title
+            if find_heading(self._headings[file_name], "*" + url) is None:
+                return "heading is not found"
+            return None
+
+        target, _, search_option = url.split(":", 1)[1].partition("::")
+        target = os.path.expanduser(target)
+        if not os.path.isabs(target):
+            target = os.path.join(os.path.dirname(file_name), target)
+        target = os.path.normpath(target)
+        if not os.path.exists(target):
+            return "file `{}' doesn't exist".format(target)
+        if not search_option or search_option.isdigit():
+            return None
+        try:
+            headings = self._target_headings(target)
+        except (IOError, OSError, UnicodeDecodeError) as e:
+            return "cannot read `{}': {}".format(target, e)
+        if find_heading(headings, search_option) is None:
+            return "heading `{}' is not found in `{}'".format(search_option, target)
+        return None
+
+
+def check_links(file_list, cache, jobs=1, settings_rule_list=(), get_headings=None):
+    """
+    Check links of all files.
+
+    Returns (BrokenLink list sorted by file and line, list of (file_name, error message), number of rescanned files).
+    """
+    scanned_files = {}
+    error_list = []
+    stale_file_list = []
+    for file_name in file_list:
+        try:
+            mtime = os.path.getmtime(file_name)
+        except OSError as e:
+            error_list.append((file_name, str(e)))
+            continue
+        entry = cache.get(file_name, mtime)
+        if entry is None:
+            stale_file_list.append(file_name)
+        else:
+            scanned_files[file_name] = entry
+
+    for file_name, entry, error in _iter_scanned_files(stale_file_list, jobs):
+        if error is not None:
+            error_list.append((file_name, error))
+            continue
+        cache.put(file_name, entry)
+        scanned_files[file_name] = entry
+    cache.retain(scanned_files)
+
+    checker = LinkChecker(scanned_files, settings_rule_list, get_headings)
+    broken_list = []
+    for file_name in file_list:
+        if file_name in scanned_files:
+            broken_list += checker.check_file(file_name, scanned_files[file_name])
+    return broken_list, error_list, len(stale_file_list)
+
+
+def get_default_cache_file():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "zorgmode", "link-check.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m zorg_link_check",
+        description="Report broken internal and file links in org files.")
+    parser.add_argument(
+        "file_list", metavar="FILE", nargs="+",
+        help="org file or glob, same as entries of `zorg_agenda_files' setting")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+        help="number of parallel workers (default: number of CPUs)")
+    parser.add_argument(
+        "--cache", default=get_default_cache_file(),
+        help="file with scan results of previous runs (default: %(default)s)")
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="scan all files and don't save scan results")
+    args = parser.parse_args(argv)
+
+    warning_collector = AgendaWarningCollector()
+    file_list = [
+        os.path.abspath(os.path.expanduser(f))
+        for f in args.file_list
+    ]
+    file_list = expand_file_list(file_list, warning_collector)
+    for msg in warning_collector.warnings:
+        sys.stderr.write("warning: {}\n".format(msg))
+
+    cache = LinkCheckCache(None if args.no_cache else args.cache)
+    broken_list, error_list, rescanned = check_links(file_list, cache, jobs=args.jobs)
+    cache.save()
+
+    for file_name, error in error_list:
+        sys.stderr.write("error: cannot read `{}': {}\n".format(file_name, error))
+    for broken_link in broken_list:
+        sys.stdout.write(format_broken_link(broken_link) + "\n")
+    sys.stdout.flush()
+    sys.stderr.write(
+        "{} broken links in {} files, {} files rescanned\n"
+        .format(len(broken_list), len(file_list), rescanned))
+    return 1 if broken_list or error_list else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
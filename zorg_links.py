@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import collections
+import re
+import urllib.parse
+
+# NOTE: this module doesn't import sublime module
+
+OrgLinkInfo = collections.namedtuple("OrgLinkInfo", "start,end,reference,text")
+
+# Trailing punctuation is not a part of bare url.
+BARE_URL_RE = re.compile(r"https?://[^\s\[\]<>\"]*[^\s\[\]<>\".,;:!?']")
+LINK_START_RE = re.compile(r"\[\[|https?://")
+
+
+def iter_links_in_string(text, offset=0):
+    """
+    Yield OrgLinkInfo of bracket links and bare urls, bare url inside of a bracket link is not reported separately.
+
+    Text is scanned once: bracket link ends at the first `]]' of its line, and when a line doesn't have one
+    the rest of the line is searched only for bare urls.
+    """
+    pos = 0
+    unclosed_line_end = -1  # `[[' before this position have no closing `]]'
+    while True:
+        m = LINK_START_RE.search(text, pos)
+        if m is None:
+            return
+        start = m.start()
+        if m.group(0) != "[[":
+            url_match = BARE_URL_RE.match(text, start)
+            if url_match is None:
+                pos = m.end()
+                continue
+            url = url_match.group(0)
+            yield OrgLinkInfo(start=start + offset, end=url_match.end() + offset, reference=url, text=url)
+            pos = url_match.end()
+            continue
+
+        if start < unclosed_line_end:
+            pos = start + 1
+            continue
+        line_end = text.find("\n", start)
+        if line_end == -1:
+            line_end = len(text)
+        # reference is never empty
+        end = text.find("]]", start + 3, line_end)
+        if end == -1:
+            unclosed_line_end = line_end
+            pos = start + 1
+            continue
+        separator = text.find("][", start + 3, end)
+        if separator == -1:
+            reference = text[start + 2:end]
+            link_text = None
+        else:
+            reference = text[start + 2:separator]
+            link_text = text[separator + 2:end]
+        yield OrgLinkInfo(start=start + offset, end=end + 2 + offset, reference=reference, text=link_text)
+        pos = end + 2
+
+
+def find_links_in_string(text):
+    return list(iter_links_in_string(text))
+
+
+class OrgLinkIndex(object):
+    """
+    Links of the document ordered by their position.
+    """
+
+    def __init__(self, link_list):
+        self._link_list = link_list
+        self._start_list = [link.start for link in link_list]
+
+    @staticmethod
+    def from_org_root(org_root):
+        if org_root.region is None:
+            return OrgLinkIndex([])
+        text = org_root.view.substr(org_root.region)
+        return OrgLinkIndex(list(iter_links_in_string(text, org_root.region.a)))
+
+    def __len__(self):
+        return len(self._link_list)
+
+    def __iter__(self):
+        return iter(self._link_list)
+
+    def find_at(self, point):
+        """
+        Return link containing point (point must be strictly inside of the link) or None.
+        """
+        idx = bisect.bisect_left(self._start_list, point) - 1
+        if idx >= 0 and point < self._link_list[idx].end:
+            return self._link_list[idx]
+        return None
+
+    def next_link(self, point):
+        idx = bisect.bisect_right(self._start_list, point)
+        if idx < len(self._link_list):
+            return self._link_list[idx]
+        return None
+
+    def prev_link(self, point):
+        idx = bisect.bisect_left(self._start_list, point) - 1
+        if idx >= 0:
+            return self._link_list[idx]
+        return None
+
+
+class LinkExpansionError(RuntimeError):
+    pass
+
+
+def _apply_link_template(template, tag):
+    # same as org-mode: %s is replaced with the tag, %h with url encoded tag, otherwise tag is appended
+    if "%s" in template or "%h" in template:
+        return template.replace("%s", tag).replace("%h", urllib.parse.quote(tag))
+    return template + tag
+
+
+def _link_template_scheme(template):
+    # scheme of expansion that doesn't depend on the tag, None if there is no such scheme
+    fields = template.split(":", 1)
+    if len(fields) != 2 or "%" in fields[0]:
+        return None
+    return fields[0]
+
+
+class LinkAbbrevs(object):
+    """
+    Link abbreviations compiled into flattened chains.
+
+    Chain of abbreviation is a list of templates that are applied to the tag one after another,
+    templates of the intermediate abbreviations are stored without their scheme. Abbreviations
+    that form a cycle are reported in `errors' and fail to expand.
+    """
+
+    def __init__(self, rule_list):
+        """
+        rule_list is a list of (abbreviation, expansion) pairs, later rules override earlier ones.
+        """
+        self.errors = []
+        rules = {}
+        for abbreviation, expansion in rule_list:
+            rules[abbreviation] = expansion
+
+        self._chains = {}
+        self._cyclic = set()
+        for abbreviation in sorted(rules):
+            chain = []
+            visited = [abbreviation]
+            current = abbreviation
+            while True:
+                template = rules[current]
+                scheme = _link_template_scheme(template)
+                if scheme not in rules:
+                    chain.append(template)
+                    break
+                if scheme in visited:
+                    self._cyclic.add(abbreviation)
+                    self.errors.append(
+                        "Link abbreviations form a cycle: {}".format(" -> ".join(visited + [scheme])))
+                    break
+                chain.append(template[len(scheme) + 1:])
+                visited.append(scheme)
+                current = scheme
+            self._chains[abbreviation] = chain
+
+    def expand(self, url):
+        original_url = url
+        # chains are resolved at compile time, loop continues only if scheme of expansion depends on the tag
+        for _ in range(len(self._chains) + 1):
+            fields = url.split(":", 1)
+            if len(fields) != 2 or fields[0] not in self._chains:
+                return url
+            abbreviation, tag = fields
+            if abbreviation in self._cyclic:
+                raise LinkExpansionError("Cannot expand url with cyclic link abbreviation: {}".format(original_url))
+            for template in self._chains[abbreviation]:
+                tag = _apply_link_template(template, tag)
+            url = tag
+        raise LinkExpansionError("Expansion limit exceeded, while expanding url: {}".format(original_url))
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import os
+import threading
+
+try:
+    import sqlite3
+except ImportError:
+    # Python bundled with Sublime Text 3 doesn't have sqlite3
+    sqlite3 = None
+
+# NOTE: this module doesn't import sublime module
+try:
+    from .mock_sublime import Region as TextViewRegion
+    from .zorg_agenda import load_text_view
+    from .zorg_heading_index import HEADING_PATH_SEPARATOR
+    from .zorg_view_parse import (
+        iter_headline_paths,
+        parse_org_document_new,
+    )
+except (ImportError, SystemError):
+    # loaded as top level module
+    from mock_sublime import Region as TextViewRegion
+    from zorg_agenda import load_text_view
+    from zorg_heading_index import HEADING_PATH_SEPARATOR
+    from zorg_view_parse import (
+        iter_headline_paths,
+        parse_org_document_new,
+    )
+
+# Text of a section without its subsections, heading is the outline path of its headline
+# (empty for the text before the first headline).
+SearchChunk = collections.namedtuple("SearchChunk", "line_index_0,offset,heading,text")
+SearchResult = collections.namedtuple("SearchResult", "file_name,line_index_0,offset,heading,snippet")
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL NOT NULL)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+    " path UNINDEXED, line UNINDEXED, offset UNINDEXED, heading UNINDEXED, body,"
+    " tokenize='trigram')",
+]
+
+# trigram tokenizer can't use index for shorter queries, LIKE is used instead
+MIN_FTS_QUERY_LENGTH = 3
+
+
+class SearchIndexUnavailable(RuntimeError):
+    pass
+
+
+def iter_search_chunks(view, org_root):
+    """
+    Split document into chunks that start at headlines.
+    """
+    # root region covers the whole document, it is None for empty document
+    text = view.substr(org_root.region) if org_root.region is not None else ""
+    begin = 0
+    line_index_0 = 0
+    heading = ""
+    for headline, path in iter_headline_paths(org_root):
+        end = headline.region.a
+        if end > begin:
+            yield SearchChunk(line_index_0, begin, heading, text[begin:end])
+        line_index_0 += text.count("\n", begin, end)
+        begin = end
+        heading = HEADING_PATH_SEPARATOR.join(path)
+    if begin < len(text) or heading:
+        yield SearchChunk(line_index_0, begin, heading, text[begin:])
+
+
+class SearchIndex(object):
+    """
+    Full text index over org files stored in SQLite FTS5 table with trigram tokenizer.
+
+    Every row is a section of some file without its subsections so each result maps to exactly one headline.
+    Files are reindexed only when their mtime changes.
+    """
+
+    def __init__(self, db_path):
+        if sqlite3 is None:
+            raise SearchIndexUnavailable("sqlite3 module is not available")
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.isdir(db_dir):
+            os.makedirs(db_dir)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            with self._connection:
+                for statement in SCHEMA:
+                    self._connection.execute(statement)
+        except sqlite3.OperationalError as e:
+            self._connection.close()
+            raise SearchIndexUnavailable("SQLite doesn't support FTS5 trigram tokenizer: {}".format(e))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _get_mtime(self, file_name):
+        row = self._connection.execute("SELECT mtime FROM files WHERE path = ?", (file_name,)).fetchone()
+        return None if row is None else row[0]
+
+    def has_file(self, file_name):
+        with self._lock:
+            return self._get_mtime(file_name) is not None
+
+    def is_up_to_date(self, file_name, mtime):
+        with self._lock:
+            return self._get_mtime(file_name) == mtime
+
+    def _remove_file(self, file_name):
+        self._connection.execute("DELETE FROM chunks WHERE path = ?", (file_name,))
+        self._connection.execute("DELETE FROM files WHERE path = ?", (file_name,))
+
+    def index_view(self, file_name, mtime, view, org_root=None):
+        if org_root is None:
+            org_root = parse_org_document_new(view, TextViewRegion(0, view.size()))
+        rows = [
+            (file_name, chunk.line_index_0, chunk.offset, chunk.heading, chunk.text)
+            for chunk in iter_search_chunks(view, org_root)
+        ]
+        with self._lock, self._connection:
+            self._remove_file(file_name)
+            self._connection.executemany(
+                "INSERT INTO chunks (path, line, offset, heading, body) VALUES (?, ?, ?, ?, ?)", rows)
+            self._connection.execute("INSERT INTO files (path, mtime) VALUES (?, ?)", (file_name, mtime))
+
+    def update_files(self, file_list):
+        """
+        Bring index in sync with the list of files, only new and modified files are read.
+
+        Returns list of (file_name, error message) for files that can't be read.
+        """
+        error_list = []
+        file_set = set(file_list)
+        with self._lock, self._connection:
+            indexed = [row[0] for row in self._connection.execute("SELECT path FROM files")]
+            for file_name in indexed:
+                if file_name not in file_set:
+                    self._remove_file(file_name)
+
+        for file_name in file_list:
+            try:
+                mtime = os.path.getmtime(file_name)
+                if self.is_up_to_date(file_name, mtime):
+                    continue
+                self.index_view(file_name, mtime, load_text_view(file_name))
+            except (IOError, OSError, UnicodeDecodeError) as e:
+                error_list.append((file_name, str(e)))
+        return error_list
+
+    def search(self, query, limit=200):
+        """
+        Return SearchResult list, there is at most one result per heading.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        if len(query) >= MIN_FTS_QUERY_LENGTH:
+            sql = (
+                "SELECT path, line, offset, heading, snippet(chunks, 4, '', '', '...', 64) FROM chunks"
+                " WHERE chunks MATCH ? ORDER BY rank LIMIT ?"
+            )
+            args = ('"' + query.replace('"', '""') + '"', limit)
+        else:
+            sql = (
+                "SELECT path, line, offset, heading, substr(body, 1, 80) FROM chunks"
+                " WHERE body LIKE ? ESCAPE '\\' LIMIT ?"
+            )
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            args = ("%" + escaped + "%", limit)
+        with self._lock:
+            rows = self._connection.execute(sql, args).fetchall()
+        return [
+            SearchResult(
+                file_name=path,
+                line_index_0=line,
+                offset=offset,
+                heading=heading,
+                snippet=" ".join(snippet.split()),
+            )
+            for path, line, offset, heading, snippet in rows
+        ]
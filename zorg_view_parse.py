@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import collections
 import contextlib
+import datetime
 import re
 import sys
 
@@ -51,8 +53,27 @@ END_EXAMPLE_RE = re.compile(
 COLON_LINE_EXAMPLE_RE = re.compile(
     r"^\s*:.*$"
 )
+PLANNING_LINE_RE = re.compile(
+    r"^\s*(?:(?:SCHEDULED|DEADLINE|CLOSED):\s*[<\[][^>\]\n]*[>\]]\s*)+$"
+)
+PLANNING_ITEM_RE = re.compile(
+    r"(SCHEDULED|DEADLINE|CLOSED):\s*[<\[]"
+    r"(\d{4})-(\d{2})-(\d{2})"  # date groups 2, 3, 4
+    r"([^>\]\n]*)[>\]]"  # rest of timestamp group 5
+)
+ACTIVE_TIMESTAMP_RE = re.compile(
+    r"<(\d{4})-(\d{2})-(\d{2})"  # date groups 1, 2, 3
+    r"([^>\n]*)>"  # rest of timestamp group 4
+)
+REPEATER_RE = re.compile(
+    r"(?:^|\s)[.+]?\+(\d+)([dwmy])\b"
+)
 KEYWORD_SET = frozenset(["TODO", "DONE"])
 
+# kind is one of "scheduled", "deadline", "closed" or "timestamp" (active timestamp in headline or its text),
+# repeater is None or (value, unit) tuple, e.g. (1, "w") for `+1w'
+OrgTimestamp = collections.namedtuple("OrgTimestamp", "kind,date,repeater,offset")
+
 
 def is_point_within_region(point, region):
     return region.a <= point < region.b
@@ -113,10 +134,14 @@ def view_full_lines(view, region):
     # NOTE: line ending might be either '\r\n' or '\n'
     # TODO: test this function
     line_region_list = view.lines(region)
+    if len(line_region_list) > 1 and region.b < view.size() and line_region_list[-1].a >= region.b:
+        # line that starts at the end of region doesn't belong to it
+        line_region_list.pop()
     for i in range(len(line_region_list) - 1):
         line_region_list[i].b = line_region_list[i+1].a
     if line_region_list:
-        line_region_list[-1].b = view.size()
+        # region ends either at line start or at the end of the document
+        line_region_list[-1].b = region.b
     return line_region_list
 
 
@@ -166,11 +191,64 @@ class OrgViewNode(object):
             file.flush()
 
 
+class OrgTitleIndex(object):
+    """
+    Headlines of the document keyed by their title.
+
+    When several headlines share a title the first one in document order wins.
+    Titles that have no exact match are looked up case insensitively.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._folded = {}
+        self._title_by_headline = {}
+
+    def add(self, title, headline):
+        self._exact.setdefault(title, []).append(headline)
+        self._folded.setdefault(title.casefold(), []).append(headline)
+        self._title_by_headline[headline] = title
+
+    def _iter_lists(self, headline):
+        title = self._title_by_headline[headline]
+        yield self._exact, title
+        yield self._folded, title.casefold()
+
+    def remove(self, headline):
+        for index, key in self._iter_lists(headline):
+            headline_list = index[key]
+            headline_list.remove(headline)
+            if not headline_list:
+                del index[key]
+        del self._title_by_headline[headline]
+
+    def restore_order(self, headline_list):
+        """
+        Sort headlines sharing titles with given moved headlines back into document order.
+        """
+        for headline in headline_list:
+            for index, key in self._iter_lists(headline):
+                index[key].sort(key=lambda h: h.region.a)
+
+    def find_all(self, title):
+        headline_list = self._exact.get(title)
+        if headline_list is None:
+            headline_list = self._folded.get(title.casefold(), [])
+        return headline_list
+
+    def find(self, title):
+        headline_list = self.find_all(title)
+        return headline_list[0] if headline_list else None
+
+
 class OrgRoot(OrgViewNode):
     node_type = "root"
 
     def __init__(self, view):
         super(OrgRoot, self).__init__(view, None)
+        self.title_index = OrgTitleIndex()
+        # partial tree covers only some top level sections of the document, see OrgDocumentCache
+        self.is_partial = False
 
 
 class OrgSection(OrgViewNode):
@@ -190,6 +268,8 @@ class OrgHeadline(OrgViewNode):
     def __init__(self, view, parent, level):
         super(OrgHeadline, self).__init__(view, parent)
         self.level = level
+        # OrgTimestamp list from planning line, headline itself and section text
+        self.timestamps = []
 
     def _debug_attrs(self):
         return "level={}".format(self.level)
@@ -198,11 +278,29 @@ class OrgSrcBlock(OrgViewNode):
     node_type = "src_block"
 
 
+class OrgPlanningLine(OrgViewNode):
+    node_type = "planning_line"
+
+
 def org_headline_get_text(headline: OrgHeadline):
-    line = headline.view.substr(headline.region)
+    # headline region includes line ending, HEADLINE_RE must not see it
+    line = headline.view.substr(headline.region).rstrip("\n")
     m = HEADLINE_RE.match(line)
     assert m is not None
+    return _headline_match_get_text(line, m)
 
+
+def org_headline_line_get_text(line):
+    """
+    Return title of headline line or None if line is not a headline.
+    """
+    m = HEADLINE_RE.match(line)
+    if m is None:
+        return None
+    return _headline_match_get_text(line, m)
+
+
+def _headline_match_get_text(line, m):
     keyword = m.group(2)
 
     title_begin = m.start(4)
@@ -212,8 +310,67 @@ def org_headline_get_text(headline: OrgHeadline):
     return line[title_begin:title_end]
 
 
+def iter_headline_paths(org_root):
+    """
+    Yield (headline, path) in document order, path is a tuple of headline titles from the top level headline.
+    """
+    stack = [(child, ()) for child in reversed(org_root.children)]
+    while stack:
+        node, parent_path = stack.pop()
+        path = parent_path
+        if isinstance(node, OrgSection) and node.level > 0:
+            headline = node.children[0]
+            path = parent_path + (org_headline_get_text(headline),)
+            yield headline, path
+        for child in reversed(node.children):
+            if isinstance(child, OrgSection):
+                stack.append((child, path))
+
+
+def org_section_get_level_changes(section: OrgSection, new_level):
+    """
+    Return list of (offset, old_stars_count, new_stars) that give section new_level together with its subsections.
+
+    Only star prefixes of parsed headlines are changed, lines of source blocks that start with stars are kept.
+    """
+    if new_level < 1:
+        raise ValueError("Headline level must be positive")
+    delta = new_level - section.level
+    if delta == 0:
+        return []
+    # headline is the first child of its section, so headlines come in document order
+    return [
+        (node.region.a, node.level, "*" * (node.level + delta))
+        for node in iter_tree_depth_first(section)
+        if isinstance(node, OrgHeadline)
+    ]
+
+
+def org_section_get_text_at_level(section: OrgSection, new_level):
+    """
+    Return text of the section with its level changed to new_level.
+    """
+    text = section.view.substr(section.region)
+    base = section.region.a
+    part_list = []
+    pos = 0
+    for offset, old_count, new_stars in org_section_get_level_changes(section, new_level):
+        part_list.append(text[pos:offset - base])
+        part_list.append(new_stars)
+        pos = offset - base + old_count
+    part_list.append(text[pos:])
+    return "".join(part_list)
+
+
+def org_headline_get_keyword(headline: OrgHeadline):
+    line = headline.view.substr(headline.region).rstrip("\n")
+    m = HEADLINE_RE.match(line)
+    assert m is not None
+    return m.group(2)
+
+
 def org_headline_get_tag_list(headline: OrgHeadline):
-    line = headline.view.substr(headline.region)
+    line = headline.view.substr(headline.region).rstrip("\n")
     m = HEADLINE_RE.match(line)
     assert m is not None
 
@@ -257,6 +414,47 @@ def org_list_entry_get_tick_position(node: OrgListEntry):
     return node.region.a + node.tick_offset
 
 
+def org_headline_get_planning_line(headline: OrgHeadline):
+    section = headline.parent
+    if len(section.children) > 1 and isinstance(section.children[1], OrgPlanningLine):
+        return section.children[1]
+    return None
+
+
+def _make_timestamp(kind, year, month, day, rest, offset):
+    try:
+        date = datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+    repeater = None
+    m = REPEATER_RE.search(rest)
+    if m is not None:
+        repeater = (int(m.group(1)), m.group(2))
+    return OrgTimestamp(kind=kind, date=date, repeater=repeater, offset=offset)
+
+
+def parse_planning_line(line, line_offset):
+    result = []
+    for m in PLANNING_ITEM_RE.finditer(line):
+        timestamp = _make_timestamp(
+            m.group(1).lower(), m.group(2), m.group(3), m.group(4), m.group(5), line_offset + m.start())
+        if timestamp is not None:
+            result.append(timestamp)
+    return result
+
+
+def parse_active_timestamps(line, line_offset):
+    result = []
+    if "<" not in line:
+        return result
+    for m in ACTIVE_TIMESTAMP_RE.finditer(line):
+        timestamp = _make_timestamp(
+            "timestamp", m.group(1), m.group(2), m.group(3), m.group(4), line_offset + m.start())
+        if timestamp is not None:
+            result.append(timestamp)
+    return result
+
+
 def org_control_line_get_key_value(control_line: OrgControlLine):
     line = control_line.view.substr(control_line.region)
     m = CONTROL_LINE_RE.match(line)
@@ -296,6 +494,22 @@ class OrgTreeBuilder:
     def is_context_empty(self):
         return len(self._stack) <= self._context_stack[-1]
 
+    def add_headline(self, headline, title):
+        self._root.title_index.add(title, headline)
+
+    def current_headline(self):
+        for node in reversed(self._stack):
+            if isinstance(node, OrgSection) and node.level > 0:
+                return node.children[0]
+        return None
+
+    def add_active_timestamps(self, line, line_offset):
+        if "<" not in line:
+            return
+        headline = self.current_headline()
+        if headline is not None:
+            headline.timestamps += parse_active_timestamps(line, line_offset)
+
 
 class ParserInput:
     def __init__(self, view, region):
@@ -333,7 +547,19 @@ def parse_global_scope(parser_input: ParserInput, builder: OrgTreeBuilder):
             headline = OrgHeadline(view, new_section, headline_level)
             builder.push(new_section)
             _extend_region(headline, region)
+            builder.add_headline(headline, _headline_match_get_text(line, m))
+            headline.timestamps += parse_active_timestamps(line, region.a)
             parser_input.next_line()
+
+            # planning line is recognized only right after headline
+            region = parser_input.get_current_line_region()
+            if region is not None:
+                line = view.substr(region).rstrip('\n')
+                if PLANNING_LINE_RE.match(line):
+                    planning_line = OrgPlanningLine(view, new_section)
+                    _extend_region(planning_line, region)
+                    headline.timestamps += parse_planning_line(line, region.a)
+                    parser_input.next_line()
             continue
 
         m = LIST_ENTRY_BEGIN_RE.match(line)
@@ -366,6 +592,7 @@ def parse_global_scope(parser_input: ParserInput, builder: OrgTreeBuilder):
             parser_input.next_line()
             continue
 
+        builder.add_active_timestamps(line, region.a)
         _extend_region(builder.top(), region)
         parser_input.next_line()
         continue
@@ -408,6 +635,7 @@ def parse_list(parser_input: ParserInput, builder: OrgTreeBuilder):
 
             builder.push(OrgListEntry(view, builder.top(), indent, m))
             _extend_region(builder.top(), region)
+            builder.add_active_timestamps(line, region.a)
             parser_input.next_line()
             continue
 
@@ -425,6 +653,7 @@ def parse_list(parser_input: ParserInput, builder: OrgTreeBuilder):
 
         assert isinstance(builder.top(), OrgListEntry)
         _extend_region(builder.top(), region)
+        builder.add_active_timestamps(line, region.a)
         parser_input.next_line()
 
 
@@ -459,6 +688,182 @@ def parse_example_block(parser_input: ParserInput, builder: OrgTreeBuilder, begi
                 break
     builder.pop()
 
+#
+# Updating tree after structural edits
+#
+# Commands that move or erase whole sections and list items update parsed tree in place
+# instead of parsing document again. org_tree_can_* functions must be called before the text is changed,
+# they reject edits after which fresh parse would give different tree.
+#
+
+def org_tree_can_swap_siblings(first_list, second_list):
+    """
+    Check if blocks of adjacent siblings (first block goes before second) can be swapped in the tree.
+    """
+    node_list = first_list + second_list
+    if not all(isinstance(node, (OrgSection, OrgListEntry)) for node in node_list):
+        return False
+    if len(set(getattr(node, "level", None) for node in node_list)) != 1:
+        # section might become a child of its sibling with smaller level
+        return False
+    if isinstance(node_list[0], OrgSection) and first_list[-1].region.b != second_list[0].region.a:
+        # sections are separated by empty lines after the list that don't belong to any of them
+        return False
+    view = node_list[0].view
+    end = second_list[-1].region.b
+    region_cls = type(node_list[0].region)
+    if _is_empty_line_at(view, end, region_cls):
+        # empty lines after the list that don't belong to any node would be joined to other node
+        return False
+    if end < view.size():
+        return True
+    if any(isinstance(node, OrgSrcBlock) and node.region.b == end for node in iter_tree_depth_first(second_list[-1])):
+        # block without end line would swallow text that is moved after it
+        return False
+    if _is_empty_line_before(view, end, region_cls):
+        # empty lines at the end of the document are joined to the last section
+        return False
+    # the last line without line ending gets one when it's moved
+    return view.substr(region_cls(end - 1, end)) == "\n"
+
+
+def org_tree_swap_siblings(first_list, second_list):
+    """
+    Update tree after texts of two blocks of adjacent siblings were swapped.
+    """
+    region_cls = type(first_list[0].region)
+    first_begin, first_end = first_list[0].region.a, first_list[-1].region.b
+    second_begin, second_end = second_list[0].region.a, second_list[-1].region.b
+    for node in first_list:
+        _shift_subtree(node, second_end - first_end, region_cls)
+    for node in second_list:
+        _shift_subtree(node, first_begin - second_begin, region_cls)
+
+    if isinstance(first_list[0], OrgListEntry):
+        # timestamps in list items belong to the headline of the section
+        headline = _get_section_headline(first_list[0])
+        if headline is not None:
+            timestamp_list = []
+            for t in headline.timestamps:
+                if first_begin <= t.offset < first_end:
+                    t = t._replace(offset=t.offset + second_end - first_end)
+                elif second_begin <= t.offset < second_end:
+                    t = t._replace(offset=t.offset + first_begin - second_begin)
+                timestamp_list.append(t)
+            headline.timestamps = sorted(timestamp_list, key=lambda t: t.offset)
+
+    parent = first_list[0].parent
+    # sort is stable and children that are not moved keep their places
+    parent.children.sort(key=lambda node: node.region.a)
+    _get_root(parent).title_index.restore_order([
+        headline
+        for node in first_list + second_list
+        for headline in iter_tree_depth_first(node)
+        if isinstance(headline, OrgHeadline)
+    ])
+
+
+def org_tree_can_remove_node(node):
+    """
+    Check if section or list item can be removed from the tree.
+    """
+    if not isinstance(node, (OrgSection, OrgListEntry)) or node.parent is None:
+        return False
+    if node.region.a == node.parent.region.a and node.region.b == node.parent.region.b:
+        # parent would become empty
+        return False
+    if isinstance(node, OrgListEntry):
+        # list items are separated by empty lines that don't belong to any of them,
+        # removed item must not leave such lines at the border of the list or join them
+        prev_entry = prev_sibling(node)
+        next_entry = next_sibling(node)
+        if prev_entry is not None and prev_entry.region.b != node.region.a:
+            return False
+        if next_entry is not None and next_entry.region.a != node.region.b:
+            return False
+    view = node.view
+    region_cls = type(node.region)
+    if _is_empty_line_at(view, node.region.b, region_cls):
+        # empty lines after the list that don't belong to any node would be joined to the node before
+        return False
+    if node.region.b == node.parent.region.b and _is_empty_line_before(view, node.region.a, region_cls):
+        # empty lines after the list belong to the section that continues after them,
+        # without the node they would be left outside of its parent
+        return False
+    return True
+
+
+def org_tree_remove_node(node):
+    """
+    Update tree after text of the node was erased.
+    """
+    region_cls = type(node.region)
+    begin, end = node.region.a, node.region.b
+    org_root = _get_root(node)
+    for removed in iter_tree_depth_first(node):
+        if isinstance(removed, OrgHeadline):
+            org_root.title_index.remove(removed)
+    node.parent.children.remove(node)
+    node.parent = None
+
+    size = end - begin
+    stack = [org_root]
+    while stack:
+        current = stack.pop()
+        if current.region.a >= end:
+            _shift_subtree(current, -size, region_cls)
+            continue
+        if current.region.b <= begin and not isinstance(current, OrgHeadline):
+            continue
+        if current.region.b >= end:
+            # ancestor of removed node or node that starts before it and ends after it
+            current.region = region_cls(current.region.a, current.region.b - size)
+        if isinstance(current, OrgHeadline):
+            current.timestamps = [
+                t if t.offset < begin else t._replace(offset=t.offset - size)
+                for t in current.timestamps
+                if not begin <= t.offset < end
+            ]
+        stack.extend(current.children)
+
+
+def _is_empty_line_before(view, point, region_cls):
+    # point is at line start, long line that has only spaces within the window is considered empty
+    text = view.substr(region_cls(max(0, point - 256), point))
+    if not text:
+        return False
+    return not text[:-1].rsplit("\n", 1)[-1].strip()
+
+
+def _is_empty_line_at(view, point, region_cls):
+    # point is at line start, long line that has only spaces within the window is considered empty
+    text = view.substr(region_cls(point, min(point + 256, view.size())))
+    if not text:
+        return False
+    return not text.split("\n", 1)[0].strip()
+
+
+def _get_root(node):
+    while node.parent is not None:
+        node = node.parent
+    return node
+
+
+def _get_section_headline(node):
+    while node is not None:
+        if isinstance(node, OrgSection) and node.level > 0:
+            return node.children[0]
+        node = node.parent
+    return None
+
+
+def _shift_subtree(node, delta, region_cls):
+    for current in iter_tree_depth_first(node):
+        current.region = region_cls(current.region.a + delta, current.region.b + delta)
+        if isinstance(current, OrgHeadline):
+            current.timestamps = [t._replace(offset=t.offset + delta) for t in current.timestamps]
+
+
 #
 # Details
 #
@@ -620,4 +1025,204 @@ if __name__ == '__main__':
                 ("GG", "once upon a time..."),
             ])
 
+        def test_title_index(self):
+            view = mock_sublime.View(
+                "* Project\n"
+                "** TODO Review :work:\n"
+                "* Other\n"
+                "** review\n"
+                "** Review\n"
+            )
+            root = parse_org_document_new(view, mock_sublime.Region(0, view.size()))
+
+            def find_line(title):
+                headline = root.title_index.find(title)
+                return None if headline is None else view.rowcol(headline.region.a)[0]
+
+            self.assertEqual(find_line("Review"), 1)
+            self.assertEqual(find_line("review"), 3)
+            self.assertEqual(find_line("REVIEW"), 1)
+            self.assertEqual(find_line("Project"), 0)
+            self.assertEqual(find_line("Missing"), None)
+            self.assertEqual(len(root.title_index.find_all("Review")), 2)
+
+        def test_timestamp_parsing(self):
+            view = mock_sublime.View(
+                "* TODO Meeting <2020-03-02 Mon>\n"
+                "  SCHEDULED: <2020-03-04 Wed +1w> DEADLINE: <2020-03-06 Fri>\n"
+                "  text <2020-03-10 Tue 10:00> and [2020-03-11 Wed]\n"
+                "  - item <2020-03-12 Thu .+2m>\n"
+                "** DONE Subheadline\n"
+                "   CLOSED: [2020-03-01 Sun 12:00]\n"
+                "   SCHEDULED: <2020-03-20 Fri> is not a planning line\n"
+            )
+            root = parse_org_document_new(view, mock_sublime.Region(0, view.size()))
+
+            timestamp_list = []
+            for item in iter_tree_depth_first(root):
+                if isinstance(item, OrgHeadline):
+                    timestamp_list.append((
+                        org_headline_get_text(item),
+                        [(t.kind, t.date.isoformat(), t.repeater) for t in item.timestamps],
+                        org_headline_get_planning_line(item) is not None,
+                    ))
+
+            self.assertEqual(timestamp_list, [
+                ("Meeting <2020-03-02 Mon>", [
+                    ("timestamp", "2020-03-02", None),
+                    ("scheduled", "2020-03-04", (1, "w")),
+                    ("deadline", "2020-03-06", None),
+                    ("timestamp", "2020-03-10", None),
+                    ("timestamp", "2020-03-12", (2, "m")),
+                ], True),
+                ("Subheadline", [
+                    ("closed", "2020-03-01", None),
+                    ("timestamp", "2020-03-20", None),
+                ], True),
+            ])
+
+    class DocumentEndParsing(unittest.TestCase):
+        def test_last_line(self):
+            for text in ["* A\ntext\n", "* A\ntext"]:
+                view = mock_sublime.View(text)
+                root = parse_org_document_new(view, mock_sublime.Region(0, view.size()))
+                section, = root.children[0].children
+                self.assertEqual((root.region.a, root.region.b), (0, len(text)))
+                self.assertEqual((section.region.a, section.region.b), (0, len(text)))
+                self.assertEqual(_node_text(section.children[0]), "* A\n")
+
+        def test_partial_region(self):
+            view = mock_sublime.View("* A\ntext\n* B\n")
+            root = parse_org_document_new(view, mock_sublime.Region(0, 9))
+            section, = root.children[0].children
+            self.assertEqual(_node_text(root), "* A\ntext\n")
+            self.assertEqual(_node_text(section), "* A\ntext\n")
+
+    class TreeUpdating(unittest.TestCase):
+        DOCUMENT = (
+            "#+TITLE: doc\n"
+            "* A <2020-01-01 Wed>\n"
+            "  SCHEDULED: <2020-01-02 Thu>\n"
+            "  - item 1 <2020-01-03 Fri>\n"
+            "    - subitem\n"
+            "\n"
+            "  - [ ] item 2\n"
+            "  - item 3 <2020-01-04 Sat>\n"
+            "  text\n"
+            "** Same\n"
+            "* B\n"
+            "** Same\n"
+            "text <2020-01-05 Sun>\n"
+            "*** C\n"
+            "* D\n"
+            "text\n"
+            "* E\n"
+        )
+
+        def assert_tree_equal(self, org_root, text):
+            view = mock_sublime.View(text)
+            expected_root = parse_org_document_new(view, mock_sublime.Region(0, view.size()))
+            self.assertEqual(self._signature(org_root), self._signature(expected_root))
+            for headline in iter_tree_depth_first(expected_root):
+                if isinstance(headline, OrgHeadline):
+                    title = org_headline_get_text(headline)
+                    self.assertEqual(
+                        [h.region.a for h in org_root.title_index.find_all(title)],
+                        [h.region.a for h in expected_root.title_index.find_all(title)])
+
+        def _signature(self, node):
+            return (
+                type(node).__name__,
+                node.region.a,
+                node.region.b,
+                getattr(node, "level", None),
+                getattr(node, "indent", None),
+                getattr(node, "tick_offset", None),
+                getattr(node, "timestamps", None),
+                [self._signature(child) for child in node.children],
+            )
+
+        def parse(self, text):
+            view = mock_sublime.View(text)
+            return parse_org_document_new(view, mock_sublime.Region(0, view.size()))
+
+        def find_nodes(self, org_root, text, node_type, text_prefix):
+            # views of the patched nodes keep the old text
+            return [
+                node for node in iter_tree_depth_first(org_root)
+                if isinstance(node, node_type) and text[node.region.a:node.region.b].lstrip().startswith(text_prefix)
+            ]
+
+        def swap(self, text, first_list, second_list):
+            self.assertTrue(org_tree_can_swap_siblings(first_list, second_list))
+            a1, b1 = first_list[0].region.a, first_list[-1].region.b
+            a2, b2 = second_list[0].region.a, second_list[-1].region.b
+            org_tree_swap_siblings(first_list, second_list)
+            return text[:a1] + text[a2:b2] + text[b1:a2] + text[a1:b1] + text[b2:]
+
+        def remove(self, text, node):
+            self.assertTrue(org_tree_can_remove_node(node))
+            a, b = node.region.a, node.region.b
+            org_tree_remove_node(node)
+            return text[:a] + text[b:]
+
+        def test_swap_sections(self):
+            org_root = self.parse(self.DOCUMENT)
+            a, = self.find_nodes(org_root, self.DOCUMENT, OrgSection, "* A")
+            b, = self.find_nodes(org_root, self.DOCUMENT, OrgSection, "* B")
+            d, = self.find_nodes(org_root, self.DOCUMENT, OrgSection, "* D")
+            text = self.swap(self.DOCUMENT, [a], [b, d])
+            self.assertTrue(text.startswith("#+TITLE: doc\n* B\n"))
+            self.assert_tree_equal(org_root, text)
+
+            text = self.swap(text, [b], [d])
+            self.assert_tree_equal(org_root, text)
+
+        def test_swap_list_entries(self):
+            org_root = self.parse(self.DOCUMENT)
+            item1, = self.find_nodes(org_root, self.DOCUMENT, OrgListEntry, "- item 1")
+            item2, = self.find_nodes(org_root, self.DOCUMENT, OrgListEntry, "- [ ] item 2")
+            item3, = self.find_nodes(org_root, self.DOCUMENT, OrgListEntry, "- item 3")
+            text = self.swap(self.DOCUMENT, [item1], [item2, item3])
+            self.assert_tree_equal(org_root, text)
+
+            text = self.swap(text, [item2], [item3])
+            self.assert_tree_equal(org_root, text)
+
+        def test_remove_nodes(self):
+            org_root = self.parse(self.DOCUMENT)
+            text = self.DOCUMENT
+            for node_type, prefix in [
+                    (OrgListEntry, "- item 3"),
+                    (OrgSection, "** Same"),
+                    (OrgSection, "*** C"),
+                    (OrgSection, "* B"),
+                    (OrgSection, "* D"),
+            ]:
+                node = self.find_nodes(org_root, text, node_type, prefix)[0]
+                text = self.remove(text, node)
+                self.assert_tree_equal(org_root, text)
+
+        def test_rejected_edits(self):
+            org_root = self.parse(self.DOCUMENT)
+            item1, = self.find_nodes(org_root, self.DOCUMENT, OrgListEntry, "- item 1")
+            item2, = self.find_nodes(org_root, self.DOCUMENT, OrgListEntry, "- [ ] item 2")
+            subitem, = self.find_nodes(org_root, self.DOCUMENT, OrgListEntry, "- subitem")
+            self.assertFalse(org_tree_can_remove_node(item1))
+            self.assertFalse(org_tree_can_remove_node(item2))
+            self.assertFalse(org_tree_can_remove_node(subitem))
+
+            a, = self.find_nodes(org_root, self.DOCUMENT, OrgSection, "* A")
+            same_a = a.children[-1]
+            c, = self.find_nodes(org_root, self.DOCUMENT, OrgSection, "*** C")
+            self.assertFalse(org_tree_can_swap_siblings([c], [same_a]))
+
+            org_root = self.parse("* A\n* B")
+            a, b = org_root.children[0].children
+            self.assertFalse(org_tree_can_swap_siblings([a], [b]))
+
+            org_root = self.parse("* A\n")
+            a, = org_root.children[0].children
+            self.assertFalse(org_tree_can_remove_node(a))
+
     unittest.main()
@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import bisect
 import collections
-import glob
+import datetime
+import html
+import json
 import itertools
 import os
 import re
 import subprocess
+import time
 import webbrowser
 
 import sublime_plugin
@@ -16,6 +20,60 @@ from .mock_sublime import (
     Region as TextViewRegion
 )
 
+from .zorg_agenda import (
+    Agenda,
+    AgendaDateIndex,
+    AgendaFileIndexCache,
+    AgendaTagIndex,
+    AgendaWarningCollector,
+    CalendarAgenda,
+    ZORG_AGENDA_FILES,
+
+    add_months,
+    expand_file_list,
+    headline_text_hash,
+    iter_todo_headlines,
+    load_text_view,
+    save_json_file,
+)
+
+from .zorg_checkbox import (
+    CHECKED_TICK_SET,
+    CheckboxIndex,
+
+    get_statistics_cookie_changes,
+)
+
+from .zorg_heading_index import (
+    HEADING_PATH_SEPARATOR,
+    HeadlinePositionIndex,
+    WorkspaceHeadingIndex,
+
+    build_outline,
+    find_heading,
+    scan_headings,
+)
+
+from .zorg_link_check import (
+    LinkCheckCache,
+
+    check_links,
+    format_broken_link,
+)
+
+from .zorg_links import (
+    LinkAbbrevs,
+    LinkExpansionError,
+    OrgLinkIndex,
+
+    iter_links_in_string,
+)
+
+from .zorg_search import (
+    SearchIndex,
+    SearchIndexUnavailable,
+)
+
 from .zorg_view_parse import (
     OrgControlLine,
     OrgHeadline,
@@ -23,13 +81,19 @@ from .zorg_view_parse import (
     OrgSection,
 
     org_control_line_get_key_value,
+    org_headline_get_keyword,
+    org_headline_get_tag_list,
     org_headline_get_text,
     org_list_entry_get_tick_position,
+    org_section_get_level_changes,
+    org_section_get_text_at_level,
+    org_tree_can_remove_node,
+    org_tree_can_swap_siblings,
+    org_tree_remove_node,
+    org_tree_swap_siblings,
     is_point_within_region,
     iter_tree_depth_first,
-    next_sibling,
     parse_org_document_new,
-    prev_sibling,
 )
 
 try:
@@ -37,13 +101,12 @@ try:
 except ImportError:
     history_list_plugin = None
 
-ZORG_AGENDA_FILES = "zorg_agenda_files"
 ZORGMODE_SUBLIME_SETTINGS = "Zorgmode.sublime-settings"
 ZORGMODE_SUBLIME_SYNTAX = "Zorgmode.sublime-syntax"
-
-OrgLinkInfo = collections.namedtuple("OrgLinkInfo", "start,end,reference,text")
-
-URL_RE = re.compile("http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*(),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+")
+ZORG_LINK_ABBREV_LIST = "zorg_link_abbrev_list"
+ZORG_SHOW_BREADCRUMB = "zorg_show_breadcrumb"
+ZORG_PARTIAL_PARSE_THRESHOLD = "zorg_partial_parse_threshold"
+DEFAULT_PARTIAL_PARSE_THRESHOLD = 100 * 1024 * 1024
 
 
 class ZorgmodeFatalError(RuntimeError):
@@ -70,44 +133,6 @@ def goto(view: sublime.View, point):
     view.show(point)
 
 
-def find_links_in_string(text):
-    processed_end = 0
-    link_list = []
-    while True:
-        start_marker = text.find("[[", processed_end)
-        if start_marker == -1:
-            break
-        end_marker = text.find("]]", start_marker)
-        if end_marker == -1:
-            break
-        separation_marker = text.find("][", start_marker, end_marker)
-        if separation_marker == -1:
-            link_text = None
-            link_reference = text[start_marker + 2:end_marker]
-        else:
-            link_text = text[separation_marker + 2:end_marker]
-            link_reference = text[start_marker + 2:separation_marker]
-        link_list.append(OrgLinkInfo(
-            start=start_marker,
-            end=end_marker + 2,
-            reference=link_reference,
-            text=link_text))
-        processed_end = end_marker + 2
-
-    for m in URL_RE.finditer(text):
-        start = m.start()
-        end = m.end()
-        url = m.group(0)
-        link_list.append(
-            OrgLinkInfo(
-                start=start,
-                end=end,
-                reference=url,
-                text=url))
-
-    return link_list
-
-
 def view_get_cursor_point(view):
     if len(view.sel()) == 0:
         raise ZorgmodeError("Cannot run this command with no cursor")
@@ -128,6 +153,237 @@ def view_get_full_region(v):
     return cls(0, v.size())
 
 
+PARTIAL_PARSE_SCAN_CHUNK = 64 * 1024
+# block keywords are case sensitive as in parser
+BLOCK_BEGIN_PATTERN = r"^[ \t]*#\+BEGIN_(SRC|EXAMPLE)\b"
+BLOCK_END_PATTERN = r"^[ \t]*#\+END_{}\b"
+TOP_HEADLINE_OR_BLOCK_BEGIN_PATTERN = r"^(\*[ \t]|[ \t]*#\+BEGIN_(SRC|EXAMPLE)\b)"
+
+
+def find_block_end(view, begin_region):
+    """
+    Return end of the block which begin line is matched by begin_region, view size if the block is not closed.
+    """
+    block_type = view.substr(begin_region).rsplit("_", 1)[1]
+    region = view.find(BLOCK_END_PATTERN.format(block_type), begin_region.b)
+    if region is None or region.a == -1:
+        return view.size()
+    return region.b
+
+
+def get_block_regions_before(view, point):
+    """
+    Return regions of source and example blocks that begin before point.
+
+    Blocks are found from the beginning of the document as parser does, so lines inside of them are never
+    taken for block begin.
+    """
+    region_list = []
+    begin = 0
+    while begin < view.size():
+        region = view.find(BLOCK_BEGIN_PATTERN, begin)
+        if region is None or region.a == -1 or region.a >= point:
+            break
+        begin = find_block_end(view, region)
+        region_list.append(sublime.Region(region.a, begin))
+    return region_list
+
+
+def find_top_headline_before(view, point, block_region_list):
+    """
+    Return start of the last level 1 headline that starts at or before point, 0 if there is no such headline.
+
+    Headline-like lines inside of blocks from block_region_list are skipped.
+    """
+    block_begin_list = [r.a for r in block_region_list]
+
+    def is_headline(offset):
+        idx = bisect.bisect(block_begin_list, offset) - 1
+        return offset <= point and (idx < 0 or offset >= block_region_list[idx].b)
+
+    end = min(point + 2, view.size())
+    while end > 0:
+        begin = max(0, end - PARTIAL_PARSE_SCAN_CHUNK)
+        text = view.substr(sublime.Region(begin, end))
+        idx = max(text.rfind("\n* "), text.rfind("\n*\t"))
+        while idx != -1 and not is_headline(begin + idx + 1):
+            idx = max(text.rfind("\n* ", 0, idx), text.rfind("\n*\t", 0, idx))
+        if idx != -1:
+            return begin + idx + 1
+        if begin == 0:
+            break
+        # keep a couple of characters so headline on the chunk border is not missed
+        end = begin + 2
+    return 0
+
+
+def find_top_headline_after(view, begin, point):
+    """
+    Return start of the first level 1 headline after the line containing point, view size if there is no such headline.
+
+    Scan starts at begin that must be outside of blocks, headline-like lines inside of blocks are skipped.
+    """
+    point_line_end = view.line(point).b
+    while begin < view.size():
+        region = view.find(TOP_HEADLINE_OR_BLOCK_BEGIN_PATTERN, begin)
+        if region is None or region.a == -1:
+            break
+        if view.substr(region).startswith("*"):
+            if region.a > point_line_end:
+                return region.a
+            begin = region.b
+        else:
+            begin = find_block_end(view, region)
+    return view.size()
+
+
+def get_partial_parse_region(view, point):
+    """
+    Region of top level sections containing point and visible region, together with one top level section
+    on each side so the sections have their siblings.
+    """
+    visible_region = view.visible_region()
+    low = min(point, visible_region.begin())
+    high = max(point, visible_region.end())
+    block_region_list = get_block_regions_before(view, low)
+    begin = find_top_headline_before(view, low, block_region_list)
+    if begin > 0:
+        begin = find_top_headline_before(view, begin - 1, block_region_list)
+    end = find_top_headline_after(view, begin, high)
+    if end < view.size():
+        end = find_top_headline_after(view, end, end)
+    return sublime.Region(begin, end)
+
+
+class OrgDocumentCache:
+    """
+    Parse trees of open views keyed by view id.
+
+    Tree is reused while change count of the view stays the same, values derived from the tree
+    (see get_derived) are dropped together with it. Entries are removed by ZorgDocumentCacheListener
+    when view is closed. Views that are not backed by Sublime Text (TextView) are parsed every time.
+
+    Callers that only need the neighbourhood of some point pass that point. If the document is larger
+    than `zorg_partial_parse_threshold' they might get partial tree (org_root.is_partial is True),
+    that covers top level sections around the point and the visible region, while the full tree is parsed
+    in background. Callers without point always get full tree.
+
+    Commands that move or erase whole sections and list items update cached tree in place
+    (see update_org_root) so the next command doesn't parse document again.
+    """
+
+    class Entry:
+        def __init__(self, change_count, org_root):
+            self.change_count = change_count
+            self.org_root = org_root
+            self.derived = {}
+
+    def __init__(self):
+        self._cache = {}
+        self._partial_cache = {}
+
+    def _get_entry(self, view):
+        if isinstance(view, TextView):
+            return OrgDocumentCache.Entry(None, parse_org_document_new(view, view_get_full_region(view)))
+        change_count = view.change_count()
+        entry = self._cache.get(view.id())
+        if entry is None or entry.change_count != change_count:
+            entry = OrgDocumentCache.Entry(change_count, parse_org_document_new(view, view_get_full_region(view)))
+            self._cache[view.id()] = entry
+            self._partial_cache.pop(view.id(), None)
+        return entry
+
+    def _get_entry_around(self, view, point):
+        if point is None or isinstance(view, TextView):
+            return self._get_entry(view)
+        settings = sublime.load_settings(ZORGMODE_SUBLIME_SETTINGS)
+        threshold = settings.get(ZORG_PARTIAL_PARSE_THRESHOLD, DEFAULT_PARTIAL_PARSE_THRESHOLD)
+        change_count = view.change_count()
+        entry = self._cache.get(view.id())
+        if (entry is not None and entry.change_count == change_count) or not threshold or view.size() < threshold:
+            return self._get_entry(view)
+
+        entry = self._partial_cache.get(view.id())
+        if entry is not None and entry.change_count == change_count:
+            region = entry.org_root.region
+            visible_region = view.visible_region()
+            if (
+                    region is not None
+                    and region.a <= min(point, visible_region.begin())
+                    and max(point, visible_region.end()) <= region.b
+            ):
+                return entry
+
+        org_root = parse_org_document_new(view, get_partial_parse_region(view, point))
+        org_root.is_partial = True
+        entry = OrgDocumentCache.Entry(change_count, org_root)
+        self._partial_cache[view.id()] = entry
+        sublime.set_timeout_async(lambda: self._parse_in_background(view, change_count), 0)
+        return entry
+
+    def _parse_in_background(self, view, change_count):
+        if view.is_valid() and view.change_count() == change_count:
+            self._get_entry(view)
+
+    def get_org_root(self, view, point=None):
+        return self._get_entry_around(view, point).org_root
+
+    def has_org_root(self, view):
+        """
+        Return True if tree of the whole current document is parsed, otherwise start parsing it in background.
+        """
+        if isinstance(view, TextView):
+            return True
+        change_count = view.change_count()
+        entry = self._cache.get(view.id())
+        if entry is not None and entry.change_count == change_count:
+            return True
+        sublime.set_timeout_async(lambda: self._parse_in_background(view, change_count), 0)
+        return False
+
+    def get_derived(self, view, key, build, point=None):
+        """
+        Return build(org_root) cached until the next change of the view.
+        """
+        entry = self._get_entry_around(view, point)
+        if key not in entry.derived:
+            entry.derived[key] = build(entry.org_root)
+        return entry.derived[key]
+
+    def update_org_root(self, view, change_count, node, update):
+        """
+        Keep tree of the view after structural edit instead of parsing document again.
+
+        change_count is change count of the view before the edit, node is a node of the edited tree
+        and update() brings the tree in sync with the text. Derived values are dropped.
+        """
+        if isinstance(view, TextView):
+            return
+        entry = self._cache.pop(view.id(), None)
+        self._partial_cache.pop(view.id(), None)
+        if entry is None or entry.change_count != change_count:
+            return
+        while node.parent is not None:
+            node = node.parent
+        if node is not entry.org_root:
+            # node comes from partial tree
+            return
+        update()
+        self._cache[view.id()] = OrgDocumentCache.Entry(view.change_count(), entry.org_root)
+
+    def on_view_closed(self, view_id):
+        self._cache.pop(view_id, None)
+        self._partial_cache.pop(view_id, None)
+
+
+ORG_DOCUMENT_CACHE = OrgDocumentCache()
+
+
+class ZorgDocumentCacheListener(sublime_plugin.EventListener):
+    def on_close(self, view):
+        ORG_DOCUMENT_CACHE.on_view_closed(view.id())
+
+
 def find_view_by_id(view_id):
     for window in sublime.windows():
         for view in window.views():
@@ -198,12 +454,60 @@ class ZorgCycleTodoStateBackwardCommand(sublime_plugin.TextCommand):
         return cycle_todo_state(self.view, edit, forward=False)
 
 
-def is_straight_region(region_to_fold):
-    return region_to_fold.a < region_to_fold.b
+def get_section_fold_end(view, section):
+    # section region includes line ending of its last line, the last section of the document is folded up to its end
+    if section.region.b >= view.size():
+        return view.size()
+    return section.region.b - 1
+
+
+def get_subtree_fold_region(view, section):
+    headline = section.children[0]
+    size = view.size()
+    fold_begin = headline.region.b
+    # headline on the last line of the document might have no line ending
+    if fold_begin < size or (size > 0 and view.substr(size - 1) == "\n"):
+        fold_begin -= 1
+    fold_end = get_section_fold_end(view, section)
+    if fold_end < view.size() and fold_end - 1 >= fold_begin and view.substr(fold_end - 1) == "\n":
+        # keep empty line before the next headline visible
+        fold_end -= 1
+    return sublime.Region(fold_begin, max(fold_begin, fold_end))
+
+
+def get_subtree_cycle_folding(view, section):
+    """
+    Return (children folding, contents folding) of the subtree.
+
+    Children folding shows direct child headlines, contents folding shows all headlines of the subtree.
+    Text of the section headline itself is visible in both.
+    """
+    children_folding = []
+    descendant_headline_list = []
+    for child in section.children:
+        if not isinstance(child, OrgSection):
+            continue
+        fold_region = get_subtree_fold_region(view, child)
+        if not fold_region.empty():
+            children_folding.append(fold_region)
+        descendant_headline_list += [
+            n
+            for n in iter_tree_depth_first(child)
+            if isinstance(n, OrgHeadline)
+        ]
+    end = get_section_fold_end(view, section)
+    contents_folding = get_folding_for_headers(view, (h.region for h in descendant_headline_list), end)
+    return children_folding, contents_folding
 
 
 class ZorgCycleCommand(sublime_plugin.TextCommand):
-    def run(self, edit):
+    """
+    Fold or unfold subtree of the headline at the cursor.
+
+    With mode="cycle" subtree is cycled through folded -> children -> contents -> all states.
+    """
+
+    def run(self, edit, mode="toggle"):
         view = self.view
         if len(view.sel()) != 1:
             return
@@ -211,50 +515,67 @@ class ZorgCycleCommand(sublime_plugin.TextCommand):
         if not sel.empty():
             return
 
-        # - получить строку в которой мы находимся
         current_line_region = view.line(sel)
-        current_line_index, _ = view.rowcol(current_line_region.a)
-        current_line = view.substr(current_line_region)
-
-        # убедиться, что это headline
-        match = re.search(r'^([*]+)\s', current_line)
-        if not match:
+        headline = view_get_headline_position_index(view, current_line_region.a).find_headline_starting_at(
+            current_line_region.a)
+        if headline is None:
             return
-        current_headline_level = len(match.group(1))
-        next_headline_re = '^[*]{{1,{}}}\s'.format(current_headline_level)
-
-        # найти следующий headline того же типа или высшего
-        next_headline_region = view.find(next_headline_re, current_line_region.b)
-        if view.classify(next_headline_region.a - 1) & sublime.CLASS_EMPTY_LINE:
-            region_to_fold = sublime.Region(current_line_region.b, next_headline_region.a - 2)
-        else:
-            region_to_fold = sublime.Region(current_line_region.b, next_headline_region.a - 1)
+        section = headline.parent
+        region_to_fold = get_subtree_fold_region(view, section)
         if region_to_fold.empty():
             return
-        if not is_straight_region(region_to_fold):
-            region_to_fold = sublime.Region(current_line_region.b, view.size())
-        # свернуть
-        folded = view.fold(region_to_fold)
-        if not folded:
-            view.unfold(region_to_fold)
-
-
-def before_line_end(view, pos):
-    if (
-        0 < pos <= view.size()
-        and bool(view.classify(pos - 1) & sublime.CLASS_LINE_END)
-    ):
-        return pos - 1
-    else:
-        return pos
 
+        if mode == "toggle":
+            folded = view.fold(region_to_fold)
+            if not folded:
+                view.unfold(region_to_fold)
+        elif mode == "cycle":
+            self.cycle_subtree(view, section, region_to_fold)
+        else:
+            raise ValueError("Unknown mode: {}".format(mode))
 
-def get_folding_for_headers(view, header_region_iter):
+    @staticmethod
+    def cycle_subtree(view, section, region_to_fold):
+        children_folding, contents_folding = get_subtree_cycle_folding(view, section)
+        section_end = get_section_fold_end(view, section)
+        folded_regions = [
+            r
+            for r in view.folded_regions()
+            if region_to_fold.a <= r.a and r.b <= section_end
+        ]
+
+        if folded_regions == [region_to_fold]:
+            # folded -> children
+            view.unfold(region_to_fold)
+            view.fold(children_folding)
+        elif folded_regions == children_folding and children_folding != contents_folding:
+            # children -> contents
+            view.unfold(children_folding)
+            view.fold(contents_folding)
+        elif folded_regions and folded_regions in (children_folding, contents_folding):
+            # contents -> all
+            view.unfold(folded_regions)
+        else:
+            # all -> folded
+            if folded_regions:
+                view.unfold(folded_regions)
+            view.fold(region_to_fold)
+
+
+def get_folding_for_headers(view, header_region_iter, end=None):
+    # headline regions include line ending, except the last line of the document without trailing newline
+    size = view.size()
+    if end is None:
+        end = size
+    ends_with_new_line = size > 0 and view.substr(sublime.Region(size - 1, size)) == "\n"
     prev_header_end = None
     result = []
-    for header_region in itertools.chain(header_region_iter, [sublime.Region(view.size() + 1, view.size() + 1)]):
+    for header_region in itertools.chain(header_region_iter, [sublime.Region(end + 1, end + 1)]):
         if prev_header_end is not None:
-            fold_region = sublime.Region(before_line_end(view, prev_header_end), header_region.a - 1)
+            fold_begin = prev_header_end
+            if prev_header_end > 0 and (prev_header_end < size or ends_with_new_line):
+                fold_begin -= 1
+            fold_region = sublime.Region(fold_begin, header_region.a - 1)
             assert fold_region.a <= fold_region.b
             if not fold_region.empty():
                 result.append(fold_region)
@@ -262,6 +583,89 @@ def get_folding_for_headers(view, header_region_iter):
     return result
 
 
+class FoldCycle:
+    """
+    Fold sets of zorg_cycle_all for one version of the document and its current state.
+
+    Fold sets are computed once per parse tree. While the state is known the next state is reached by
+    folding and unfolding only the regions that differ between fold sets. Contents state is skipped
+    when it has the same fold set as overview.
+    """
+    OVERVIEW = "overview"  # only top headlines are visible
+    CONTENTS = "contents"  # all headlines are visible
+    SHOW_ALL = "show_all"
+
+    def __init__(self, org_root):
+        view = org_root.view
+        headline_list = [
+            n
+            for n in iter_tree_depth_first(org_root)
+            if isinstance(n, OrgHeadline)
+        ]
+        self.state = None
+        self.is_empty = not headline_list
+        if self.is_empty:
+            return
+
+        # The first header we see is top header.
+        # NOTE: if first header has level > 1 we will show all headers that satisfy condition:
+        #   1 <= header_level <= first_header_level
+        # Such behaviour complies to Emacs.
+        top_headline_max_level = headline_list[0].level
+        self.folding = {
+            FoldCycle.OVERVIEW: get_folding_for_headers(
+                view,
+                (h.region for h in headline_list if h.level <= top_headline_max_level)
+            ),
+            FoldCycle.CONTENTS: get_folding_for_headers(view, (h.region for h in headline_list)),
+            FoldCycle.SHOW_ALL: [],
+        }
+
+        # top level folds are unions of the folds of contents, the ones that are in both sets
+        # (headlines without children) are kept
+        overview_set = set((r.a, r.b) for r in self.folding[FoldCycle.OVERVIEW])
+        contents_set = set((r.a, r.b) for r in self.folding[FoldCycle.CONTENTS])
+        if overview_set == contents_set:
+            # all headlines are top headlines, contents would look the same as overview
+            self._transitions = {
+                FoldCycle.OVERVIEW: (FoldCycle.SHOW_ALL, self.folding[FoldCycle.OVERVIEW], []),
+                FoldCycle.SHOW_ALL: (FoldCycle.OVERVIEW, [], self.folding[FoldCycle.OVERVIEW]),
+            }
+        else:
+            self._transitions = {
+                FoldCycle.OVERVIEW: (
+                    FoldCycle.CONTENTS,
+                    [r for r in self.folding[FoldCycle.OVERVIEW] if (r.a, r.b) not in contents_set],
+                    [r for r in self.folding[FoldCycle.CONTENTS] if (r.a, r.b) not in overview_set],
+                ),
+                FoldCycle.CONTENTS: (FoldCycle.SHOW_ALL, self.folding[FoldCycle.CONTENTS], []),
+                FoldCycle.SHOW_ALL: (FoldCycle.OVERVIEW, [], self.folding[FoldCycle.OVERVIEW]),
+            }
+
+    def _detect_state(self, folded_regions):
+        # overview is checked first, for flat documents it is the same fold set as contents
+        if folded_regions == self.folding[FoldCycle.OVERVIEW]:
+            return FoldCycle.OVERVIEW
+        elif folded_regions == self.folding[FoldCycle.CONTENTS]:
+            return FoldCycle.CONTENTS
+        return None
+
+    def cycle(self, view):
+        folded_regions = view.folded_regions()
+        if self.state is None or folded_regions != self.folding[self.state]:
+            # folds were changed by something else, find out where we are
+            self.state = self._detect_state(folded_regions)
+            if self.state is None:
+                view.unfold(folded_regions)
+                self.state = FoldCycle.SHOW_ALL
+
+        self.state, unfold_list, fold_list = self._transitions[self.state]
+        if unfold_list:
+            view.unfold(unfold_list)
+        if fold_list:
+            view.fold(fold_list)
+
+
 def is_line_start(view, point):
     return bool(view.classify(point) & sublime.CLASS_LINE_START)
 
@@ -296,6 +700,21 @@ def project_point_after_swapping(region1, region2, point):
         return point
 
 
+def bisect_region_list(region_list, point):
+    """
+    Return index of the first region starting at point or after it, region_list must be sorted by region starts.
+    """
+    lo = 0
+    hi = len(region_list)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if region_list[mid].a < point:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
 def swap_regions(view, edit, region1, region2):
     if len(view.sel()) != 1 or not view.sel()[0].empty():
         raise ValueError
@@ -314,39 +733,48 @@ def swap_regions(view, edit, region1, region2):
     if not is_line_start(view, region2.b) and region2.b != view.size():
         raise ValueError("Second region must end at line start")
 
-    added_new_line = False
-    if not is_line_start(view, region2.b):
+    text1 = view.substr(region1)
+    middle_text = view.substr(sublime.Region(region1.b, region2.a))
+    text2 = view.substr(region2)
+    replaced_region = sublime.Region(region1.a, region2.b)
+
+    missing_new_line = not text2.endswith("\n")
+    if missing_new_line:
+        # the last line of the document doesn't have line ending, it moves to the second region
+        # so we pretend it has one and strip line ending from the end of the new text
         assert region2.b == view.size()
-        view.insert(edit, view.size(), '\n')
+        text2 += "\n"
         region2 = sublime.Region(region2.a, region2.b + 1)
-        added_new_line = True
 
     # find out new cursor position
     current_cursor_position = view.sel()[0].a
     new_cursor_position = project_point_after_swapping(region1, region2, current_cursor_position)
 
-    # make a list of folds to refold
+    # single replace destroys folds inside of the replaced region, they are projected and restored
+    folded_region_list = view.folded_regions()
+    idx = bisect_region_list(folded_region_list, region1.a)
     region_to_refold_list = []
-    for folded_region in view.folded_regions():
-        if strictly_within(folded_region, region1) or strictly_within(folded_region, region2):
+    for folded_region in folded_region_list[idx:]:
+        if folded_region.a >= region2.b:
+            break
+        if (
+                strictly_within(folded_region, region1)
+                or strictly_within(folded_region, region2)
+                or region1.b <= folded_region.a <= folded_region.b < region2.a
+        ):
             region_to_refold_list.append(
                 sublime.Region(
                     project_point_after_swapping(region1, region2, folded_region.a),
                     project_point_after_swapping(region1, region2, folded_region.b)))
 
-    text1 = view.substr(region1)
-    text2 = view.substr(region2)
-    view.erase(edit, region2)
-    view.insert(edit, region2.a, text1)
-    view.erase(edit, region1)
-    view.insert(edit, region1.a, text2)
+    new_text = text2 + middle_text + text1
+    if missing_new_line:
+        new_text = new_text[:-1]
+    view.replace(edit, replaced_region, new_text)
 
     view.sel().clear()
     view.sel().add(sublime.Region(new_cursor_position))
 
-    if added_new_line:
-        view.erase(edit, sublime.Region(view.size() - 1, view.size()))
-
     view.fold(region_to_refold_list)
 
 
@@ -356,45 +784,21 @@ class ZorgCycleAllCommand(sublime_plugin.TextCommand):
             view = self.view
             view_get_cursor_point(view)
 
-            org_root = parse_org_document_new(view, view_get_full_region(view))
-
-            headline_list = [
-                n
-                for n in iter_tree_depth_first(org_root)
-                if isinstance(n, OrgHeadline)
-            ]
-            if not headline_list:
+            fold_cycle = ORG_DOCUMENT_CACHE.get_derived(view, "fold_cycle", FoldCycle)
+            if fold_cycle.is_empty:
                 return
-
-            # The first header we see is top header.
-            # NOTE: if first header has level > 1 we will show all headers that satisfy condition:
-            #   1 <= header_level <= first_header_level
-            # Such behaviour complies to Emacs.
-            top_headline_max_level = headline_list[0].level
-            top_headers_folding = get_folding_for_headers(
-                view,
-                (h.region for h in headline_list if h.level <= top_headline_max_level)
-            )
-            all_headers_folding = get_folding_for_headers(view, (h.region for h in headline_list))
-
-            folded_regions = view.folded_regions()
-
-            view.unfold(folded_regions)
-            if folded_regions == all_headers_folding:
-                # unfolded region
-                pass
-            elif folded_regions == top_headers_folding:
-                view.fold(all_headers_folding)
-            else:
-                view.fold(top_headers_folding)
+            fold_cycle.cycle(view)
         except ZorgmodeError as e:
             sublime.status_message(str(e))
 
 
-def find_node_starting_at_line(view, type_list, line_pos=None):
+def find_node_starting_at_line(view, type_list, line_pos=None, full_tree=False):
     cur_line_region = view_get_line_region(view, line_pos)
 
-    org_root = parse_org_document_new(view, sublime.Region(0, view.size()))
+    # partial tree has only the closest siblings of the top level sections,
+    # callers that need all siblings of the node ask for full tree
+    point = None if full_tree else cur_line_region.a
+    org_root = ORG_DOCUMENT_CACHE.get_org_root(view, point)
     for node in iter_tree_depth_first(org_root):
         if not isinstance(node, type_list):
             continue
@@ -403,15 +807,25 @@ def find_node_starting_at_line(view, type_list, line_pos=None):
     return None
 
 
+def erase_node(view, node, command):
+    # command is "cut" or "right_delete", both erase selected text
+    can_update_tree = org_tree_can_remove_node(node)
+    change_count = view.change_count()
+    expected_size = view.size() - node.region.size()
+    selection = view.sel()
+    selection.clear()
+    selection.add(node.region)
+    view.run_command(command)
+    if can_update_tree and view.size() == expected_size:
+        ORG_DOCUMENT_CACHE.update_org_root(view, change_count, node, lambda: org_tree_remove_node(node))
+
+
 class ZorgCutNodeCommand(sublime_plugin.TextCommand):
     def run(self, edit):
         node = find_node_starting_at_line(self.view, (OrgSection, OrgListEntry))
         if node is None:
             return
-        selection = self.view.sel()
-        selection.clear()
-        selection.add(node.region)
-        self.view.run_command("cut")
+        erase_node(self.view, node, "cut")
 
 
 class ZorgDeleteNodeCommand(sublime_plugin.TextCommand):
@@ -419,10 +833,7 @@ class ZorgDeleteNodeCommand(sublime_plugin.TextCommand):
         node = find_node_starting_at_line(self.view, (OrgSection, OrgListEntry))
         if node is None:
             return
-        selection = self.view.sel()
-        selection.clear()
-        selection.add(node.region)
-        self.view.run_command("right_delete")
+        erase_node(self.view, node, "right_delete")
 
 
 class ZorgCopyNodeCommand(sublime_plugin.TextCommand):
@@ -439,20 +850,90 @@ class ZorgCopyNodeCommand(sublime_plugin.TextCommand):
         selection.add_all(old)
 
 
+def get_node_sibling_list(node):
+    # siblings of the same type always follow each other in parent's children
+    return [c for c in node.parent.children if isinstance(c, type(node))]
+
+
+def move_node_to_index(view, edit, node, sibling_list, index):
+    """
+    Move node to given position among its siblings with one swap of node and the block of siblings it passes.
+    """
+    current_index = sibling_list.index(node)
+    index = max(0, min(index, len(sibling_list) - 1))
+    if index == current_index:
+        return False
+    if index > current_index:
+        first_list, second_list = [node], sibling_list[current_index + 1:index + 1]
+    else:
+        first_list, second_list = sibling_list[index:current_index], [node]
+    can_update_tree = org_tree_can_swap_siblings(first_list, second_list)
+    change_count = view.change_count()
+    swap_regions(
+        view, edit,
+        sublime.Region(first_list[0].region.a, first_list[-1].region.b),
+        sublime.Region(second_list[0].region.a, second_list[-1].region.b))
+    if can_update_tree:
+        ORG_DOCUMENT_CACHE.update_org_root(
+            view, change_count, node, lambda: org_tree_swap_siblings(first_list, second_list))
+    view.show(view.sel()[0].a)
+    return True
+
+
 def move_current_node(view, edit, up=True):
     node = find_node_starting_at_line(view, (OrgSection, OrgListEntry))
     if not node:
         return
-    if up:
-        sibling = prev_sibling(node, type(node))
-    else:
-        sibling = next_sibling(node, type(node))
+    sibling_list = get_node_sibling_list(node)
+    index = sibling_list.index(node) + (-1 if up else 1)
+    if 0 <= index < len(sibling_list):
+        move_node_to_index(view, edit, node, sibling_list, index)
 
-    if sibling is None:
-        return
 
-    swap_regions(view, edit, node.region, sibling.region)
-    view.show(view.sel()[0].a)
+class ZorgMoveNodeCommand(sublime_plugin.TextCommand):
+    """
+    Move section or list item at the cursor among its siblings in one edit.
+
+    count moves node by given number of positions (negative count moves it up),
+    to is "top", "bottom" or index of the position among siblings,
+    after is a title of the sibling headline that node is placed after.
+    """
+
+    def run(self, edit, count=None, to=None, after=None):
+        try:
+            self.run_impl(edit, count, to, after)
+        except ZorgmodeError as e:
+            sublime.status_message(str(e))
+
+    def run_impl(self, edit, count, to, after):
+        view = self.view
+        node = find_node_starting_at_line(view, (OrgSection, OrgListEntry), full_tree=True)
+        if node is None:
+            raise ZorgmodeError("Cursor is not on a headline or list item")
+        sibling_list = get_node_sibling_list(node)
+        current_index = sibling_list.index(node)
+
+        if count is not None:
+            index = current_index + count
+        elif to == "top":
+            index = 0
+        elif to == "bottom":
+            index = len(sibling_list) - 1
+        elif isinstance(to, int):
+            index = to
+        elif after is not None:
+            if not isinstance(node, OrgSection):
+                raise ZorgmodeError("`after' can be used only for headlines")
+            for after_index, sibling in enumerate(sibling_list):
+                if sibling is not node and org_headline_get_text(sibling.children[0]) == after:
+                    break
+            else:
+                raise ZorgmodeError("There is no sibling headline `{}'".format(after))
+            index = after_index if after_index > current_index else after_index + 1
+        else:
+            raise ZorgmodeError("One of `count', `to' or `after' must be specified")
+
+        move_node_to_index(view, edit, node, sibling_list, index)
 
 
 class ZorgMoveNodeUpCommand(sublime_plugin.TextCommand):
@@ -484,35 +965,69 @@ class ZorgToggleCheckboxCommand(sublime_plugin.TextCommand):
         if not region_list:
             # TODO: message
             return
-        org_root = parse_org_document_new(view, sublime.Region(0, view.size()))
-        replace_region_list = []
-        all_ticks_are_currently_x = True
-        for node in iter_tree_depth_first(org_root):
-            if not isinstance(node, OrgListEntry):
-                continue
-            tick_pos = org_list_entry_get_tick_position(node)
-            if tick_pos is None:
-                continue
-            if not any(r.contains(tick_pos) for r in region_list):
-                continue
-            tick_region = sublime.Region(
-                tick_pos,
-                tick_pos + 1
-            )
-            replace_region_list.append(tick_region)
-            tick_mark = view.substr(tick_region)
-            assert tick_mark in " -X"
-            if tick_mark != "X":
-                assert tick_mark in " -"
-                all_ticks_are_currently_x = False
-
-        if all_ticks_are_currently_x:
+        # partial tree is enough if the only region lies within it, otherwise ticks and cookies
+        # outside of the parsed part would be missed
+        point = None
+        if len(region_list) == 1:
+            region = region_list[0]
+            org_root = ORG_DOCUMENT_CACHE.get_org_root(view, region.begin())
+            root_region = org_root.region
+            if root_region is not None and root_region.a <= region.begin() and region.end() <= root_region.b:
+                point = region.begin()
+        checkbox_index = ORG_DOCUMENT_CACHE.get_derived(view, "checkbox_index", CheckboxIndex, point)
+        entry_list = checkbox_index.find_in_regions(region_list)
+        if not entry_list:
+            return
+
+        tick_region_list = []
+        for entry in entry_list:
+            tick_pos = org_list_entry_get_tick_position(entry)
+            tick_region_list.append(sublime.Region(tick_pos, tick_pos + 1))
+
+        if all(view.substr(tick_region) in CHECKED_TICK_SET for tick_region in tick_region_list):
             next_tick = " "
         else:
             next_tick = "X"
 
-        for tick_region in replace_region_list:
-            view.replace(edit, tick_region, next_tick)
+        replace_list = [(tick_region, next_tick) for tick_region in tick_region_list]
+        replace_list += get_statistics_cookie_changes(view, entry_list, next_tick)
+        # cookies might change their length, replacing from the end keeps regions before them valid
+        replace_list.sort(key=lambda item: item[0].a, reverse=True)
+        for region, text in replace_list:
+            view.replace(edit, region, text)
+
+
+def get_archive_filename(view, org_root):
+    archive_template = None
+    for item in iter_tree_depth_first(org_root):
+        if isinstance(item, OrgControlLine):
+            key, value = org_control_line_get_key_value(item)
+            if key == "ARCHIVE":
+                archive_template = value
+
+    if archive_template is None:
+        archive_template = '%s_archive'
+
+    if '%s' in archive_template:
+        current_filename = view.file_name()
+        if current_filename is None:
+            raise ZorgmodeError("Don't know where to put archive because file doesn't have a name")
+        return archive_template.replace('%s', current_filename)
+    return archive_template
+
+
+def get_archive_text(section):
+    # Привести её к уровню 1
+    level1_section_text = org_section_get_text_at_level(section, 1)
+    return '\n' + level1_section_text.strip('\n') + '\n'
+
+
+def write_archive(archive_filename, text):
+    try:
+        with open(archive_filename, 'a') as outf:
+            outf.write(text)
+    except IOError as e:
+        raise ZorgmodeFatalError("can not use `{}' as archive file: {}".format(archive_filename, e))
 
 
 class ZorgMoveToArchiveCommand(sublime_plugin.TextCommand):
@@ -529,61 +1044,133 @@ class ZorgMoveToArchiveCommand(sublime_plugin.TextCommand):
 
     def run_impl(self, edit):
         view = self.view
-        current_filename = view.file_name()
 
-        org_root = parse_org_document_new(view, sublime.Region(0, view.size()))
+        org_root = ORG_DOCUMENT_CACHE.get_org_root(view)
+        archive_filename = get_archive_filename(view, org_root)
 
-        archive_template = None
         cursor = view_get_cursor_point(view)
         headline_under_cursor = None
         for item in iter_tree_depth_first(org_root):
-            if isinstance(item, OrgControlLine):
-                key, value = org_control_line_get_key_value(item)
-                if key == "ARCHIVE":
-                    archive_template = value
-            elif isinstance(item, OrgHeadline):
-                if is_point_within_region(cursor, item.region):
-                    assert headline_under_cursor is None
-                    headline_under_cursor = item
-
-        if archive_template is None:
-            archive_template = '%s_archive'
-
-        if '%s' in archive_template:
-            if current_filename is None:
-                raise ZorgmodeError("Don't know where to put archive because file doesn't have a name")
-            archive_filename = archive_template.replace('%s', current_filename)
-        else:
-            archive_filename = archive_template
+            if isinstance(item, OrgHeadline) and is_point_within_region(cursor, item.region):
+                headline_under_cursor = item
+                break
+        if headline_under_cursor is None:
+            raise ZorgmodeError("Cursor is not on a headline")
 
-        # Привести её к уровню 1
-        # TODO: это упячечный способ приводить секцию к уровню 1 (из-за #+BEGIN_SRC)
         section = headline_under_cursor.parent
         assert isinstance(section, OrgSection)
-        section_text = view.substr(section.region)
-        if section.level == 1:
-            level1_section_text = section_text
-        else:
-            level1_section_text = re.sub(
-                '^[*]{{{}}}'.format(section.level - 1),
-                '',
-                section_text)
-        level1_section_text = '\n' + level1_section_text.strip('\n') + '\n'
-
-        # Записать в архивный файл
-        try:
-            with open(archive_filename, 'a') as outf:
-                outf.write(level1_section_text)
-        except IOError as e:
-            # Если не ок, жалуемся
-            raise ZorgmodeFatalError("can not use `{}' as archive file: {}".format(archive_filename, e))
-        # Если ok, удаляем секцию
+        # Записать в архивный файл, если ok, удаляем секцию
+        write_archive(archive_filename, get_archive_text(section))
         view.erase(edit, section.region)
         sublime.status_message("Entry is archived to `{}'".format(archive_filename))
 
 
+def iter_matching_sections(org_root, keyword=None, tag=None):
+    """
+    Yield sections whose headlines have given keyword and tag in document order.
+
+    Sections inside of the yielded sections are not visited, they are archived together with them.
+    """
+    stack = list(reversed(org_root.children))
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, OrgSection):
+            continue
+        if node.level > 0:
+            headline = node.children[0]
+            if (
+                    (keyword is None or org_headline_get_keyword(headline) == keyword)
+                    and (tag is None or tag in org_headline_get_tag_list(headline))
+            ):
+                yield node
+                continue
+        stack.extend(reversed(node.children))
+
+
+class ZorgArchiveMatchingCommand(sublime_plugin.TextCommand):
+    """
+    Move all sections with given keyword (and tag) into archive.
+
+    Sections are written to the archive file at once and erased in one edit.
+    Pass keyword=None to archive sections by tag only.
+    """
+
+    def run(self, edit, keyword="DONE", tag=None, silent=False):
+        try:
+            self.run_impl(edit, keyword, tag)
+        except ZorgmodeError as e:
+            sublime.status_message(str(e))
+        except ZorgmodeFatalError as e:
+            if silent:
+                sublime.status_message(str(e))
+            else:
+                sublime.error_message(str(e))
+
+    def run_impl(self, edit, keyword, tag):
+        if keyword is None and tag is None:
+            raise ZorgmodeError("Either keyword or tag must be specified")
+        view = self.view
+
+        org_root = ORG_DOCUMENT_CACHE.get_org_root(view)
+        section_list = list(iter_matching_sections(org_root, keyword, tag))
+        if not section_list:
+            sublime.status_message("There are no entries to archive")
+            return
+        archive_filename = get_archive_filename(view, org_root)
+
+        write_archive(archive_filename, "".join(get_archive_text(section) for section in section_list))
+        # erasing from the end keeps regions of the sections before valid
+        for section in reversed(section_list):
+            view.erase(edit, section.region)
+        sublime.status_message("{} entries are archived to `{}'".format(len(section_list), archive_filename))
+
+
+def change_section_level(view, edit, section, new_level):
+    change_list = org_section_get_level_changes(section, new_level)
+    # replacing from the end keeps offsets of the headlines before valid
+    for offset, old_count, new_stars in reversed(change_list):
+        view.replace(edit, sublime.Region(offset, offset + old_count), new_stars)
+
+
+class ZorgPromoteSubtreeCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        section = find_node_starting_at_line(self.view, (OrgSection,))
+        if section is None or section.level == 0:
+            sublime.status_message("Cursor is not on a headline")
+            return
+        if section.level == 1:
+            sublime.status_message("Can't promote top level headline")
+            return
+        change_section_level(self.view, edit, section, section.level - 1)
+
+
+class ZorgDemoteSubtreeCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        section = find_node_starting_at_line(self.view, (OrgSection,))
+        if section is None or section.level == 0:
+            sublime.status_message("Cursor is not on a headline")
+            return
+        change_section_level(self.view, edit, section, section.level + 1)
+
+
+def get_settings_link_abbrev_rules():
+    settings = sublime.load_settings(ZORGMODE_SUBLIME_SETTINGS)
+    rule_list = []
+    for item in settings.get(ZORG_LINK_ABBREV_LIST, []):
+        scheme = item.get("scheme", "")
+        if scheme.endswith(":"):
+            scheme = scheme[:-1]
+        if not scheme or "expansion" not in item:
+            sublime.status_message("Bad item of `{}' setting: {}".format(ZORG_LINK_ABBREV_LIST, item))
+            continue
+        rule_list.append((scheme, item["expansion"]))
+    return tuple(rule_list)
+
+
 def build_link_expansion_rules(org_root):
-    link_expansion_rules = {}
+    link_expansion_rules = []
+    error_list = []
+    seen = set()
     for item in iter_tree_depth_first(org_root):
         if not isinstance(item, OrgControlLine):
             continue
@@ -591,13 +1178,42 @@ def build_link_expansion_rules(org_root):
         if key == "LINK":
             fields = value.split(None, 1)
             if len(fields) != 2:
-                sublime.status_message("Bad link line: {}".format(item.text()))
+                error_list.append("Bad link line: {}".format(item.text()))
                 continue
             abbreviation, replacement = fields
-            if abbreviation in link_expansion_rules:
-                sublime.status_message("Link abbreviation `{}' is used multiple times".format(abbreviation))
-            link_expansion_rules[abbreviation] = replacement
-    return link_expansion_rules
+            if abbreviation in seen:
+                error_list.append("Link abbreviation `{}' is used multiple times".format(abbreviation))
+            seen.add(abbreviation)
+            link_expansion_rules.append((abbreviation, replacement))
+    return link_expansion_rules, error_list
+
+
+def view_get_link_abbrevs(view) -> LinkAbbrevs:
+    """
+    Abbreviations from settings merged with #+LINK lines of the document, compiled once per view change.
+    """
+    settings_rule_list = get_settings_link_abbrev_rules()
+
+    def build(org_root):
+        document_rule_list, error_list = build_link_expansion_rules(org_root)
+        # per document abbreviations override global ones
+        link_abbrevs = LinkAbbrevs(list(settings_rule_list) + document_rule_list)
+        error_list += link_abbrevs.errors
+        if error_list:
+            sublime.status_message("; ".join(error_list))
+        return link_abbrevs
+
+    return ORG_DOCUMENT_CACHE.get_derived(view, ("link_abbrevs", settings_rule_list), build)
+
+
+def view_get_link_index(view) -> OrgLinkIndex:
+    return ORG_DOCUMENT_CACHE.get_derived(view, "link_index", OrgLinkIndex.from_org_root)
+
+
+def view_find_link_at(view, point):
+    # links don't span lines, so only the line of the point is scanned
+    line_region = view.line(point)
+    return OrgLinkIndex(list(iter_links_in_string(view.substr(line_region), line_region.a))).find_at(point)
 
 
 class ZorgFollowLinkCommand(sublime_plugin.TextCommand):
@@ -605,17 +1221,8 @@ class ZorgFollowLinkCommand(sublime_plugin.TextCommand):
         view = self.view
 
         # нужно найти ссылку, внутри которой мы находимся
-        line_region = view_get_line_region(view)
-        line = view.substr(line_region)
-        link_list = find_links_in_string(line)
-        cursor_point = view_get_cursor_point(view)
-        cursor_in_line = cursor_point - line_region.a
-
-        for link_info in link_list:
-            if link_info.start < cursor_in_line < link_info.end:
-                current_link = link_info
-                break
-        else:
+        current_link = view_get_link_index(view).find_at(view_get_cursor_point(view))
+        if current_link is None:
             sublime.status_message("cursor is not on the link")
             return
 
@@ -626,47 +1233,36 @@ class ZorgFollowLinkCommand(sublime_plugin.TextCommand):
             'file+sys': self.open_sys_file,
         }
 
-        # Find all link expansion rules in current file
-        org_root = parse_org_document_new(view, sublime.Region(0, view.size()))
-        link_expansion_rules = build_link_expansion_rules(org_root)
+        # link abbreviations from settings and from current file
+        org_root = ORG_DOCUMENT_CACHE.get_org_root(view)
+        link_abbrevs = view_get_link_abbrevs(view)
 
         try:
-            url = self.expand_url(link_expansion_rules, current_link.reference)
-        except RuntimeError as e:
+            url = link_abbrevs.expand(current_link.reference)
+        except LinkExpansionError as e:
             sublime.status_message(str(e))
             return
         schema = url.split(":", 1)[0]
-        if schema in ref_handlers:
-            ref_handlers[schema](view, org_root, url)
-        else:
-            self.follow_header_link(view, org_root, url)
+        try:
+            if schema in ref_handlers:
+                ref_handlers[schema](view, org_root, url)
+            else:
+                self.follow_header_link(view, org_root, url)
+        except ZorgmodeError as e:
+            sublime.status_message(str(e))
 
     @staticmethod
     def open_in_browser(_view, _org_root, url):
         webbrowser.open_new(url)
 
-    @staticmethod
-    def expand_url(link_expansion_rules, url):
-        original_url = url
-
-        for i in range(30):
-            fields = url.split(":", 1)
-            if len(fields) != 2:
-                return url
-            schema, rest = fields
-            if schema in link_expansion_rules:
-                url = link_expansion_rules[schema] % rest
-            else:
-                return url
-        else:
-            raise RuntimeError("Expansion limit exceeded, while expanding url: {}".format(original_url))
-
     @staticmethod
     def open_file(view, _org_root, url):
-        file_path = url.split(':', 1)[-1]  # strip scheme
-        file_path = os.path.expanduser(file_path)
+        file_path, line = get_file_link_position(view, url)
         window = view.window()
-        window.open_file(file_path)
+        if line is None:
+            window.open_file(file_path)
+        else:
+            window.open_file("{}:{}".format(file_path, line), sublime.ENCODED_POSITION)
 
     @staticmethod
     def open_sys_file(_view, _org_root, url):
@@ -677,99 +1273,136 @@ class ZorgFollowLinkCommand(sublime_plugin.TextCommand):
 
     @staticmethod
     def follow_header_link(view, org_root, caption):
-        offset = None
-        for item in iter_tree_depth_first(org_root):
-            if not isinstance(item, OrgHeadline):
-                continue
-            text = org_headline_get_text(item)
-            if text == caption:
-                offset = item.region.a
-
-        if offset is None:
+        # first headline in document order is chosen among headlines with the same title
+        if caption.startswith("*"):
+            caption = caption[1:]
+        headline = org_root.title_index.find(caption)
+        if headline is None:
             sublime.status_message("can't follow link, text is not found: `{}'".format(caption))
             return
-        goto(view, offset)
+        goto(view, headline.region.a)
 
 
-class Agenda(object):
-    AgendaLine = collections.namedtuple("AgendaLine", ["text", "meta_info"])
-    AgendaItemMetaInfo = collections.namedtuple("AgendaItemMetaInfo", [
-        "file_name",
-        "view_id",
-        "line_index_0",
-        "original_text",
-    ])
+class ZorgNextLinkCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        link = view_get_link_index(self.view).next_link(view_get_cursor_point(self.view))
+        if link is None:
+            sublime.status_message("No more links below")
+            return
+        goto(self.view, link.start)
 
-    def __init__(self):
-        self._todos = []
-        self._warnings = []
-        self._final_lines = None
 
-    @staticmethod
-    def _check_line(text):
-        if "\n" in text:
-            raise ValueError("It's not a single line")
-
-    def get_line_meta_info(self, line_index_0: int) -> AgendaItemMetaInfo:
-        return self._final_lines[line_index_0].meta_info
-
-    def add_warning(self, msg):
-        self._check_line(msg)
-        self._warnings.append(self.AgendaLine("#+WARNING: " + msg, None))
-
-    def add_todo_item(self, headline_node):
-        view = headline_node.view
-        region = headline_node.region
-        original_text = headline_node.view.substr(region)
-        _, stripped_text = original_text.split(None, 1)
-        stripped_text = stripped_text.rstrip("\n")
-
-        row, _ = view.rowcol(region.a)
-        meta_info = self.AgendaItemMetaInfo(
-            file_name=view.file_name(),
-            view_id=view.id(),
-            line_index_0=row,
-            original_text=original_text,
-        )
-        self._check_line(stripped_text)
-        self._todos.append(self.AgendaLine("  TODO:    " + stripped_text, meta_info))
+class ZorgPrevLinkCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        link = view_get_link_index(self.view).prev_link(view_get_cursor_point(self.view))
+        if link is None:
+            sublime.status_message("No more links above")
+            return
+        goto(self.view, link.start)
+
+
+class ZorgListLinksCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        view = self.view
+        link_list = list(view_get_link_index(view))
+        if not link_list:
+            sublime.status_message("There are no links in this document")
+            return
+        item_list = [
+            [link.text or link.reference, "{}: {}".format(view.rowcol(link.start)[0] + 1, link.reference)]
+            for link in link_list
+        ]
+
+        def on_done(idx):
+            if idx >= 0:
+                goto(view, link_list[idx].start)
+
+        view.window().show_quick_panel(item_list, on_done)
 
-    def finalize(self):
-        self._final_lines = []
-        self._final_lines.append(self.AgendaLine("#+BEGIN_AGENDA", None))
-        self._final_lines += self._warnings
-        self._final_lines += self._todos
-        self._final_lines.append(self.AgendaLine("#+END_AGENDA", None))
-        iter_lines = (line.text for line in self._final_lines)
-        return "\n".join(iter_lines) + "\n"
+
+class ZorgLinkHoverListener(sublime_plugin.EventListener):
+    def on_hover(self, view, point, hover_zone):
+        if hover_zone != sublime.HOVER_TEXT or not view.match_selector(point, "text.org"):
+            return
+        link = view_find_link_at(view, point)
+        if link is None or link.reference == link.text:
+            return
+        url = link.reference
+        if ":" in url:
+            if not ORG_DOCUMENT_CACHE.has_org_root(view):
+                # abbreviations need #+LINK lines of the whole document, they are ready after background parsing
+                return
+            try:
+                url = view_get_link_abbrevs(view).expand(url)
+            except LinkExpansionError as e:
+                url = str(e)
+            if url == link.text:
+                return
+        view.show_popup(
+            html.escape(url),
+            sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+            location=point,
+            max_width=800)
 
 
 class AgendaRegistry:
-    def __init__(self):
-        self._agenda_registry = {}
+    """
+    Agendas of open agenda views, keyed by view id.
+
+    Entries are dropped by ZorgAgendaRegistryListener when agenda view is closed.
+    Registry size is capped, least recently used agenda is evicted when cap is exceeded.
+    """
+    DEFAULT_MAX_SIZE = 32
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self._agenda_registry = collections.OrderedDict()
+        self._max_size = max_size
+        self._eviction_count = 0
+        self._close_count = 0
 
     def save_agenda(self, view, agenda):
-        self._run_gc()
-        self._agenda_registry[view.id()] = agenda
+        view_id = view.id()
+        self._agenda_registry.pop(view_id, None)
+        self._agenda_registry[view_id] = agenda
+        while len(self._agenda_registry) > self._max_size:
+            self._agenda_registry.popitem(last=False)
+            self._eviction_count += 1
 
     def get_agenda(self, view) -> Agenda:
-        return self._agenda_registry.get(view.id(), None)
+        view_id = view.id()
+        agenda = self._agenda_registry.get(view_id, None)
+        if agenda is not None:
+            self._agenda_registry.move_to_end(view_id)
+        return agenda
+
+    def on_view_closed(self, view_id):
+        if self._agenda_registry.pop(view_id, None) is not None:
+            self._close_count += 1
+
+    def get_stats(self):
+        return {
+            "size": len(self._agenda_registry),
+            "max_size": self._max_size,
+            "evictions": self._eviction_count,
+            "closed": self._close_count,
+        }
 
-    def _run_gc(self):
-        active_view_ids = set()
-        for window in sublime.windows():
-            for view in window.views():
-                active_view_ids.add(view.id())
-        for_gc = []
-        for id_ in self._agenda_registry:
-            if id_ not in active_view_ids:
-                for_gc.append(id_)
 
-        for id_ in for_gc:
-            del self._agenda_registry[id_]
+AGENDA_REGISTRY = AgendaRegistry()
 
 
-AGENDA_REGISTRY = AgendaRegistry()
+class ZorgAgendaRegistryListener(sublime_plugin.EventListener):
+    def on_close(self, view):
+        AGENDA_REGISTRY.on_view_closed(view.id())
+
+
+class ZorgAgendaRegistryStatsCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        stats = AGENDA_REGISTRY.get_stats()
+        sublime.status_message(
+            "Agenda registry: {size}/{max_size} agendas, {evictions} evicted, {closed} released on close"
+            .format(**stats)
+        )
 
 
 def get_zorgmode_syntax():
@@ -804,123 +1437,201 @@ class NewTabAgenda(object):
         self._window.focus_view(self.view)
 
 
-def expand_file_list(file_list, agenda_output):
-    result = []
-    unique = set()
-    for file_name in file_list:
-        file_name = os.path.expanduser(file_name)
-        if not os.path.isabs(file_name):
-            agenda_output.add_warning(
-                "Path `{file_name} in `{settings}' is not absolute."
-                .format(
-                    file_name=file_name,
-                    settings=ZORG_AGENDA_FILES
-                )
-            )
-            continue
+def agenda_file_get_open_view(window, file_name):
+    if file_name.startswith("/dev/sublimetext_view/"):
+        # Special case useful for tests when we get text from already opened view
+        m = re.match("/dev/sublimetext_view/(\d+)$", file_name)
+        if not m:
+            raise ZorgmodeError("Bad file: {}".format(file_name))
+        view_id = int(m.group(1))
+        v = find_view_by_id(view_id)
+        if v is None:
+            raise ZorgmodeError("Cannot find the view with index {} for file {}".format(view_id, file_name))
+        return v
+    return window.find_open_file(file_name)
+
 
-        match_found = False
-        for match_file_name in glob.iglob(file_name):
-            if match_file_name not in unique:
-                result.append(match_file_name)
-                unique.add(match_file_name)
-            match_found = True
-
-        if not match_found:
-            agenda_output.add_warning(
-                "Cannot find `{file_name}' from `{setting}'"
-                .format(file_name=file_name, setting=ZORG_AGENDA_FILES)
+def agenda_file_get_view(window, file_name, agenda_output):
+    try:
+        v = agenda_file_get_open_view(window, file_name)
+        if v is not None:
+            return v
+        return load_text_view(file_name)
+    except ZorgmodeError as e:
+        agenda_output.add_warning(str(e))
+    except Exception as e:
+        agenda_output.add_warning(
+            "Error occurred while reading file `{file_name}': {error}"
+            .format(
+                file_name=file_name,
+                error=str(e)
             )
-    return result
+        )
+    return None
 
 
-class ZorgTodoListCommand(sublime_plugin.TextCommand):
-    def run(self, edit, show_in="quick_panel", zorg_agenda_files=None):
-        view = self.view
+def agenda_file_get_version(window, file_name):
+    # Version of the file for AgendaFileIndexCache: change count of the open view or mtime of the file on disk.
+    try:
+        v = agenda_file_get_open_view(window, file_name)
+        if v is not None:
+            return "view", v.id(), v.change_count()
+        return "mtime", os.path.getmtime(file_name)
+    except (ZorgmodeError, OSError):
+        return None
 
-        zorg_syntax = get_zorgmode_syntax()
-        if zorg_syntax is None:
-            sublime.status_message("Cannot find Zorgmode syntax file. Probably Zorgmode is not installed correctly")
-            return
 
-        output_cls = {
-            "quick_panel": QuickPanelAgenda,
-            "new_tab": NewTabAgenda,
-        }[show_in]
+def get_agenda_file_list(zorg_agenda_files, agenda_output):
+    if zorg_agenda_files is None:
+        settings = sublime.load_settings(ZORGMODE_SUBLIME_SETTINGS)
+        zorg_agenda_files = settings.get(ZORG_AGENDA_FILES, [])
+        zorg_agenda_files = expand_file_list(zorg_agenda_files, agenda_output)
 
-        window = view.window()
+    if not zorg_agenda_files:
+        # TODO: documentation reference
+        agenda_output.add_warning(
+            "Cannot find nonempty `{option_name}' in settings."
+            .format(option_name=ZORG_AGENDA_FILES)
+        )
+    return zorg_agenda_files
 
-        agenda_output = Agenda()
 
-        if zorg_agenda_files is None:
-            settings = sublime.load_settings(ZORGMODE_SUBLIME_SETTINGS)
-            zorg_agenda_files = settings.get(ZORG_AGENDA_FILES, [])
-            zorg_agenda_files = expand_file_list(zorg_agenda_files, agenda_output)
+def show_agenda(window, agenda_output, show_in):
+    zorg_syntax = get_zorgmode_syntax()
+    if zorg_syntax is None:
+        sublime.status_message("Cannot find Zorgmode syntax file. Probably Zorgmode is not installed correctly")
+        return
 
-        if not zorg_agenda_files:
-            # TODO: documentation reference
-            agenda_output.add_warning(
-                "Cannot find nonempty `{option_name}' in settings."
-                .format(option_name=ZORG_AGENDA_FILES)
-            )
+    output_cls = {
+        "quick_panel": QuickPanelAgenda,
+        "new_tab": NewTabAgenda,
+    }[show_in]
+    output = output_cls(window)
 
-        def get_view_for_system_file(file_name):
-            try:
-                v = window.find_open_file(file_name)
-                if v is not None:
-                    return v
-                with open(file_name) as inf:
-                    t = inf.read()
-                return TextView(t, file_name)
-            except Exception as e:
-                agenda_output.add_warning(
-                    "Error occurred while reading file `{file_name}': {error}"
-                    .format(
-                        file_name=file_name,
-                        error=str(e)
-                    )
-                )
-                return None
-
-        def get_view_for_special_file(file_name):
-            m = re.match("/dev/sublimetext_view/(\d+)$", file_name)
-            if not m:
-                agenda_output.add_warning("Bad file: {}".format(file_name))
-                return None
-            view_id = int(m.group(1))
-            v = find_view_by_id(view_id)
-            if v is None:
-                agenda_output.add_warning("Cannot find the view with index {} for file {}".format(view_id, file_name))
-                return None
-            return v
+    output.view.set_syntax_file(zorg_syntax)
+    output.view.run_command("append", {"characters": agenda_output.finalize(), "force": True})
+    output.view.set_read_only(True)
+
+    AGENDA_REGISTRY.save_agenda(output.view, agenda_output)
+
+    output.focus()
+
+
+class ZorgTodoListCommand(sublime_plugin.TextCommand):
+    def run(self, edit, show_in="quick_panel", zorg_agenda_files=None, limit=None):
+        window = self.view.window()
+
+        agenda_output = Agenda(limit=limit)
+        zorg_agenda_files = get_agenda_file_list(zorg_agenda_files, agenda_output)
 
         for file_name in zorg_agenda_files:
-            if file_name.startswith("/dev/sublimetext_view/"):
-                # Special case useful for tests when we get text from already opened view
-                file_view = get_view_for_special_file(file_name)
-            else:
-                file_view = get_view_for_system_file(file_name)
+            file_view = agenda_file_get_view(window, file_name, agenda_output)
             if file_view is None:
                 continue
 
             org_root = parse_org_document_new(file_view, view_get_full_region(file_view))
-            for headline in iter_tree_depth_first(org_root):
-                if not isinstance(headline, OrgHeadline):
-                    continue
-                text = headline.text().rstrip('\n')
-                m = re.match("^[*]+\s(TODO\s.*)$", text)
-                if m:
-                    agenda_output.add_todo_item(headline)
+            for headline in iter_todo_headlines(org_root):
+                agenda_output.add_todo_item(headline)
+
+        show_agenda(window, agenda_output, show_in)
+
+
+CALENDAR_INDEX_CACHE = AgendaFileIndexCache()
+
+
+def parse_agenda_date(date_str):
+    m = re.match(r"^(\d{4})-(\d{2})-(\d{2})$", date_str)
+    if not m:
+        raise ZorgmodeError("Bad date `{}', expected YYYY-MM-DD".format(date_str))
+    try:
+        return datetime.date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    except ValueError as e:
+        raise ZorgmodeError("Bad date `{}': {}".format(date_str, e))
+
+
+class ZorgCalendarAgendaCommand(sublime_plugin.TextCommand):
+    """
+    Show deadlines, scheduled items and active timestamps of agenda files.
+
+    `span' is either number of days or "month", `start' is the first day in YYYY-MM-DD format (default is today).
+    """
+
+    def run(self, edit, show_in="quick_panel", zorg_agenda_files=None, span=7, start=None):
+        try:
+            window = self.view.window()
+
+            first_date = datetime.date.today() if start is None else parse_agenda_date(start)
+            if span == "month":
+                first_date = first_date.replace(day=1)
+                last_date = add_months(first_date, 1) - datetime.timedelta(days=1)
+            else:
+                last_date = first_date + datetime.timedelta(days=int(span) - 1)
+            agenda_output = CalendarAgenda(first_date, last_date)
+
+            zorg_agenda_files = get_agenda_file_list(zorg_agenda_files, agenda_output)
+            for file_name in zorg_agenda_files:
+                version = agenda_file_get_version(window, file_name)
+                date_index = CALENDAR_INDEX_CACHE.get(file_name, version)
+                if date_index is None:
+                    file_view = agenda_file_get_view(window, file_name, agenda_output)
+                    if file_view is None:
+                        continue
+                    date_index = AgendaDateIndex()
+                    date_index.add_org_root(parse_org_document_new(file_view, view_get_full_region(file_view)))
+                    CALENDAR_INDEX_CACHE.put(file_name, version, date_index)
+                agenda_output.add_date_index(date_index)
+
+            show_agenda(window, agenda_output, show_in)
+        except (ZorgmodeError, ValueError) as e:
+            sublime.status_message(str(e))
+
+
+AGENDA_TAG_INDEX = AgendaTagIndex()
+
+
+class ZorgTagsAgendaCommand(sublime_plugin.TextCommand):
+    """
+    Show headlines of agenda files matching org-mode tag match string, e.g. `+work-someday|urgent'.
 
-        output = output_cls(window)
+    Tags are inherited from parent headlines and #+FILETAGS.
+    """
 
-        output.view.set_syntax_file(zorg_syntax)
-        output.view.run_command("append", {"characters": agenda_output.finalize(), "force": True})
-        output.view.set_read_only(True)
+    def run(self, edit, match=None, show_in="quick_panel", zorg_agenda_files=None):
+        window = self.view.window()
+        if match is None:
+            window.show_input_panel(
+                "Tags match:", "",
+                lambda m: self.view.run_command("zorg_tags_agenda", {
+                    "match": m,
+                    "show_in": show_in,
+                    "zorg_agenda_files": zorg_agenda_files,
+                }),
+                None, None)
+            return
 
-        AGENDA_REGISTRY.save_agenda(output.view, agenda_output)
+        try:
+            agenda_output = Agenda(caption="Match")
+            zorg_agenda_files = get_agenda_file_list(zorg_agenda_files, agenda_output)
+
+            # Only files that changed since previous query are parsed again.
+            for file_name in set(AGENDA_TAG_INDEX.file_keys()) - set(zorg_agenda_files):
+                AGENDA_TAG_INDEX.remove_file(file_name)
+            for file_name in zorg_agenda_files:
+                version = agenda_file_get_version(window, file_name)
+                if version is not None and AGENDA_TAG_INDEX.get_file_version(file_name) == version:
+                    continue
+                file_view = agenda_file_get_view(window, file_name, agenda_output)
+                if file_view is None:
+                    AGENDA_TAG_INDEX.remove_file(file_name)
+                    continue
+                org_root = parse_org_document_new(file_view, view_get_full_region(file_view))
+                AGENDA_TAG_INDEX.update_file(file_name, version, org_root)
 
-        output.focus()
+            for entry in AGENDA_TAG_INDEX.query(match, zorg_agenda_files):
+                agenda_output.add_entry(entry)
+            show_agenda(window, agenda_output, show_in)
+        except ValueError as e:
+            sublime.status_message(str(e))
 
 
 def agenda_meta_info_get_or_create_view(window: sublime.Window, meta_info: Agenda.AgendaItemMetaInfo):
@@ -937,39 +1648,90 @@ def agenda_meta_info_get_or_create_view(window: sublime.Window, meta_info: Agend
     raise ZorgmodeError("Cannot find file for this item")
 
 
+AGENDA_GOTO_SEARCH_RADIUS_LIST = (64, 1024, 16384)  # in lines around the recorded position
+HEADLINE_LINE_RE = re.compile(r"^[*]+[ \t].*$", re.MULTILINE)
+
+
+def find_closest_headline_by_hash(text, text_begin, text_begin_row, target_row, text_hash):
+    # Returns (point, distance in lines) of the headline with given hash closest to target_row.
+    best = None
+    row = text_begin_row
+    prev_pos = 0
+    for m in HEADLINE_LINE_RE.finditer(text):
+        row += text.count("\n", prev_pos, m.start())
+        prev_pos = m.start()
+        if headline_text_hash(m.group(0)) != text_hash:
+            continue
+        distance = abs(row - target_row)
+        if best is None or best[1] > distance:
+            best = (text_begin + m.start(), distance)
+    return best
+
+
+def agenda_meta_info_find_point(file_view, meta_info: Agenda.AgendaItemMetaInfo):
+    def check_line(point):
+        line_region = file_view.line(point)
+        if headline_text_hash(file_view.substr(line_region)) == meta_info.text_hash:
+            return line_region.a
+        return None
+
+    # 1. Check the offset and the line where the item was found when agenda was built.
+    if meta_info.offset <= file_view.size():
+        point = check_line(meta_info.offset)
+        if point == meta_info.offset:
+            return point
+    point = check_line(file_view.text_point(meta_info.line_index_0, 0))
+    if point is not None:
+        return point
+
+    # 2. File was changed, look around the old position in expanding windows.
+    # Everything closer than the radius is inside the window so the first match is the closest one.
+    last_row, _ = file_view.rowcol(file_view.size())
+    for radius in AGENDA_GOTO_SEARCH_RADIUS_LIST:
+        begin_row = max(0, meta_info.line_index_0 - radius)
+        end_row = meta_info.line_index_0 + radius + 1
+        window_region = sublime.Region(
+            file_view.text_point(begin_row, 0),
+            file_view.text_point(end_row, 0) if end_row <= last_row else file_view.size())
+        found = find_closest_headline_by_hash(
+            file_view.substr(window_region), window_region.a, begin_row, meta_info.line_index_0, meta_info.text_hash)
+        if found is not None:
+            return found[0]
+        if begin_row == 0 and end_row > last_row:
+            # window covers the whole buffer already
+            return None
+
+    # 3. Last resort: search the whole buffer.
+    found = find_closest_headline_by_hash(
+        file_view.substr(view_get_full_region(file_view)), 0, 0, meta_info.line_index_0, meta_info.text_hash)
+    if found is not None:
+        return found[0]
+    return None
+
+
 class ZorgAgendaGotoCommand(sublime_plugin.TextCommand):
     def run(self, edit):
         try:
             agenda_view = self.view
             window = agenda_view.window()
             agenda = AGENDA_REGISTRY.get_agenda(agenda_view)
+            if agenda is None:
+                raise ZorgmodeError("This view is not an agenda")
 
             # 1. Получить номер текущей строки.
             agenda_line_index_0, _ = agenda_view.rowcol(view_get_cursor_point(agenda_view))
 
             # 2. Получить meta_info
             meta_info = agenda.get_line_meta_info(agenda_line_index_0)
+            if meta_info is None:
+                raise ZorgmodeError("Cursor is not on the agenda item")
 
             # 3. По meta_info надо найти подходящий view и активировать его.
             file_view = agenda_meta_info_get_or_create_view(window, meta_info)
 
-            match_list = file_view.find_all(meta_info.original_text, sublime.LITERAL)
-
             # 4. Найти нужную позицию во view,
-            best_region = None
-            best_distance = None
-
-            for m in match_list:
-                cur_line_index_0, _ = file_view.rowcol(m.a)
-                cur_distance = abs(cur_line_index_0 - meta_info.line_index_0)
-                if (
-                        best_region is None
-                        or best_distance > cur_distance
-                ):
-                    best_region = m
-                    best_distance = cur_distance
-
-            if best_region is None:
+            target_point = agenda_meta_info_find_point(file_view, meta_info)
+            if target_point is None:
                 raise ZorgmodeError("Cannot find this item anymore")
 
             # Перейти на начало соответствующей строки
@@ -977,7 +1739,7 @@ class ZorgAgendaGotoCommand(sublime_plugin.TextCommand):
             window.focus_view(file_view)
             window.focus_group(group_idx)
 
-            goto(file_view, best_region.a)
+            goto(file_view, target_point)
 
         except ZorgmodeError as e:
             sublime.status_message(str(e))
@@ -1049,3 +1811,573 @@ class ZorgAgendaListRemoveFileCommand(sublime_plugin.TextCommand):
             sublime.status_message(str(e))
         except ZorgmodeFatalError as e:
             sublime.error_message(str(e))
+
+
+SEARCH_INDEX = None
+# index is synced with workspace files of one window at a time
+SEARCH_INDEX_WINDOW_ID = None
+
+
+def get_search_index():
+    global SEARCH_INDEX
+    if SEARCH_INDEX is None:
+        SEARCH_INDEX = SearchIndex(os.path.join(sublime.cache_path(), "Zorgmode", "search.sqlite3"))
+    return SEARCH_INDEX
+
+
+def get_workspace_file_list(window):
+    """
+    Agenda files and org files inside folders of the window.
+    """
+    settings = sublime.load_settings(ZORGMODE_SUBLIME_SETTINGS)
+    file_list = expand_file_list(settings.get(ZORG_AGENDA_FILES, []), AgendaWarningCollector())
+    unique = set(file_list)
+    for folder in window.folders():
+        for dir_path, dir_name_list, file_name_list in os.walk(folder):
+            dir_name_list[:] = [d for d in dir_name_list if not d.startswith(".")]
+            for file_name in file_name_list:
+                if not file_name.endswith(".org"):
+                    continue
+                file_name = os.path.join(dir_path, file_name)
+                if file_name not in unique:
+                    unique.add(file_name)
+                    file_list.append(file_name)
+    return file_list
+
+
+def sync_search_index(window):
+    """
+    Scan workspace files of the window and bring search index in sync with them,
+    files that can't be read are reported in status bar.
+    """
+    global SEARCH_INDEX_WINDOW_ID
+    error_list = get_search_index().update_files(get_workspace_file_list(window))
+    SEARCH_INDEX_WINDOW_ID = window.id()
+    if error_list:
+        file_name, error = error_list[0]
+        message = "Cannot index `{}': {}".format(file_name, error)
+        if len(error_list) > 1:
+            message += " (and {} more files)".format(len(error_list) - 1)
+        sublime.status_message(message)
+
+
+class ZorgSearchCommand(sublime_plugin.WindowCommand):
+    """
+    Full text search over workspace org files, results are grouped by heading.
+
+    Workspace is scanned by the first search in a window, after that index is updated by
+    ZorgSearchIndexListener when org files are opened or saved.
+    """
+
+    def run(self, query=None):
+        if query is None:
+            self.window.show_input_panel(
+                "Search org files:", "",
+                lambda q: self.window.run_command("zorg_search", {"query": q}),
+                None, None)
+            return
+        sublime.set_timeout_async(lambda: self._search(query), 0)
+
+    def _search(self, query):
+        try:
+            search_index = get_search_index()
+        except SearchIndexUnavailable as e:
+            sublime.status_message("Search is not available: {}".format(e))
+            return
+
+        if SEARCH_INDEX_WINDOW_ID != self.window.id():
+            sync_search_index(self.window)
+        result_list = search_index.search(query)
+        if not result_list:
+            sublime.status_message("Nothing is found: `{}'".format(query))
+            return
+
+        item_list = [
+            [
+                r.heading or os.path.basename(r.file_name),
+                "{}:{}: {}".format(r.file_name, r.line_index_0 + 1, r.snippet),
+            ]
+            for r in result_list
+        ]
+
+        def on_done(idx):
+            if idx < 0:
+                return
+            r = result_list[idx]
+            self.window.open_file("{}:{}".format(r.file_name, r.line_index_0 + 1), sublime.ENCODED_POSITION)
+
+        sublime.set_timeout(lambda: self.window.show_quick_panel(item_list, on_done), 0)
+
+
+def is_workspace_org_file(window, file_name):
+    return file_name.endswith(".org") and any(
+        file_name.startswith(os.path.join(folder, "")) for folder in window.folders())
+
+
+class ZorgSearchIndexListener(sublime_plugin.EventListener):
+    def on_load_async(self, view):
+        self._index_view(view)
+
+    def on_post_save_async(self, view):
+        self._index_view(view)
+
+    def _index_view(self, view):
+        file_name = view.file_name()
+        window = view.window()
+        if SEARCH_INDEX is None or file_name is None or window is None or window.id() != SEARCH_INDEX_WINDOW_ID:
+            return
+        if not SEARCH_INDEX.has_file(file_name) and not is_workspace_org_file(window, file_name):
+            return
+        try:
+            mtime = os.path.getmtime(file_name)
+        except OSError:
+            return
+        if SEARCH_INDEX.is_up_to_date(file_name, mtime):
+            return
+        org_root = parse_org_document_new(view, view_get_full_region(view))
+        SEARCH_INDEX.index_view(file_name, mtime, view, org_root)
+
+
+HEADING_INDEX = None
+
+
+def get_heading_index():
+    global HEADING_INDEX
+    if HEADING_INDEX is None:
+        HEADING_INDEX = WorkspaceHeadingIndex(os.path.join(sublime.cache_path(), "Zorgmode", "headings.json"))
+    return HEADING_INDEX
+
+
+def save_cache(cache):
+    """
+    Save cache file of heading index, link check or folds, failure is reported in status bar.
+    """
+    try:
+        cache.save()
+    except (IOError, OSError) as e:
+        sublime.status_message("Cannot save Zorgmode cache: {}".format(e))
+
+
+def get_file_link_position(view, url):
+    """
+    Return (file path, line number) of `file:' link, line number is None if link doesn't point to a line.
+    """
+    file_path = url.split(':', 1)[-1]  # strip scheme
+    file_path, _, search_option = file_path.partition("::")
+    file_path = os.path.expanduser(file_path)
+    if not os.path.isabs(file_path) and view.file_name() is not None:
+        file_path = os.path.join(os.path.dirname(view.file_name()), file_path)
+    if not search_option:
+        return file_path, None
+
+    if search_option.isdigit():
+        return file_path, int(search_option)
+    heading = find_file_heading(view.window(), file_path, search_option)
+    if heading is None:
+        sublime.status_message("can't follow link, heading is not found: `{}'".format(search_option))
+        return file_path, None
+    return file_path, heading.line_index_0 + 1
+
+
+def find_file_heading(window, file_name, search_option):
+    """
+    Resolve search option of `file:' link, open views are scanned, other files are looked up in heading index.
+    """
+    file_view = window.find_open_file(file_name)
+    if file_view is not None and not file_view.is_loading():
+        return find_heading(scan_headings(file_view.substr(view_get_full_region(file_view))), search_option)
+
+    heading_index = get_heading_index()
+    try:
+        heading = heading_index.find(file_name, search_option)
+    except (IOError, OSError, UnicodeDecodeError) as e:
+        raise ZorgmodeError("Cannot read file `{}': {}".format(file_name, e))
+    save_cache(heading_index)
+    return heading
+
+
+class ZorgHeadingIndexListener(sublime_plugin.EventListener):
+    def on_post_save_async(self, view):
+        file_name = view.file_name()
+        if file_name is None or not file_name.endswith(".org"):
+            return
+        heading_index = get_heading_index()
+        heading_index.update_text(file_name, os.path.getmtime(file_name), view.substr(view_get_full_region(view)))
+        save_cache(heading_index)
+
+
+LINK_CHECK_PANEL = "zorg_link_check"
+
+
+class ZorgCheckLinksCommand(sublime_plugin.WindowCommand):
+    """
+    Report broken internal and `file:' links of workspace org files in output panel.
+    """
+
+    def run(self):
+        sublime.status_message("Checking links...")
+        sublime.set_timeout_async(self._check, 0)
+
+    def _check(self):
+        file_list = get_workspace_file_list(self.window)
+        cache = LinkCheckCache(os.path.join(sublime.cache_path(), "Zorgmode", "link-check.json"))
+        # plugin host can't start worker processes, files are scanned in this thread
+        broken_list, error_list, rescanned = check_links(
+            file_list, cache,
+            settings_rule_list=get_settings_link_abbrev_rules(),
+            get_headings=get_heading_index().get_headings)
+        save_cache(cache)
+        save_cache(get_heading_index())
+
+        line_list = [format_broken_link(broken_link) for broken_link in broken_list]
+        line_list += ["{}:1: cannot read file: {}".format(file_name, error) for file_name, error in error_list]
+        summary = "{} broken links in {} files, {} files rescanned".format(
+            len(broken_list), len(file_list), rescanned)
+        sublime.set_timeout(lambda: self._show_report(line_list, summary), 0)
+
+    def _show_report(self, line_list, summary):
+        panel = self.window.create_output_panel(LINK_CHECK_PANEL)
+        panel.settings().set("result_file_regex", r"^(.+?):(\d+): ")
+        panel.run_command("append", {"characters": "\n".join(line_list + [summary]) + "\n"})
+        self.window.run_command("show_panel", {"panel": "output." + LINK_CHECK_PANEL})
+        sublime.status_message(summary)
+
+
+def view_get_outline(view):
+    # outline is rebuilt from the whole tree on first use after every change, not when quick panel is filtered;
+    # after structural edits the patched tree is reused, so rebuilding doesn't parse the document
+    return ORG_DOCUMENT_CACHE.get_derived(view, "outline", build_outline)
+
+
+class ZorgGotoHeadingCommand(sublime_plugin.TextCommand):
+    """
+    Choose headline by its outline path in quick panel.
+
+    With scope="agenda" headlines of all agenda files are listed, headlines of closed files
+    are taken from heading index.
+    """
+
+    def run(self, edit, scope="file", zorg_agenda_files=None):
+        if scope == "file":
+            self._goto_in_file()
+        elif scope == "agenda":
+            self._goto_in_agenda_files(zorg_agenda_files)
+        else:
+            raise ValueError("Unknown scope: {}".format(scope))
+
+    def _goto_in_file(self):
+        view = self.view
+        outline = view_get_outline(view)
+        if not outline:
+            sublime.status_message("There are no headlines in this document")
+            return
+
+        def on_done(idx):
+            if idx >= 0:
+                goto(view, outline[idx][1])
+
+        view.window().show_quick_panel([path for path, _ in outline], on_done)
+
+    def _goto_in_agenda_files(self, zorg_agenda_files):
+        window = self.view.window()
+        warning_collector = AgendaWarningCollector()
+        file_list = get_agenda_file_list(zorg_agenda_files, warning_collector)
+        heading_index = get_heading_index()
+
+        # (file_name, view or None, offset or line index)
+        target_list = []
+        item_list = []
+        for file_name in file_list:
+            file_view = agenda_file_get_open_view(window, file_name)
+            if file_view is not None:
+                for path, offset in view_get_outline(file_view):
+                    target_list.append((file_name, file_view, offset))
+                    item_list.append([path, file_name])
+                continue
+            try:
+                heading_list = heading_index.get_headings(file_name)
+            except (IOError, OSError, UnicodeDecodeError) as e:
+                warning_collector.add_warning("Cannot read file `{}': {}".format(file_name, e))
+                continue
+            for heading in heading_list:
+                target_list.append((file_name, None, heading.line_index_0))
+                item_list.append([HEADING_PATH_SEPARATOR.join(heading.path), file_name])
+        save_cache(heading_index)
+
+        if warning_collector.warnings:
+            sublime.status_message("; ".join(warning_collector.warnings))
+        if not item_list:
+            sublime.status_message("There are no headlines in agenda files")
+            return
+
+        def on_done(idx):
+            if idx < 0:
+                return
+            file_name, file_view, position = target_list[idx]
+            if file_view is not None:
+                window.focus_view(file_view)
+                goto(file_view, position)
+            else:
+                window.open_file("{}:{}".format(file_name, position + 1), sublime.ENCODED_POSITION)
+
+        window.show_quick_panel(item_list, on_done)
+
+
+BREADCRUMB_STATUS_KEY = "zorg_breadcrumb"
+BREADCRUMB_DELAY_MS = 150
+BREADCRUMB_MAX_WAIT_MS = 500
+
+
+class BreadcrumbStats:
+    """
+    Timing of breadcrumb lookups (not including parsing), in seconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.last = duration
+
+
+BREADCRUMB_STATS = BreadcrumbStats()
+
+
+def view_get_headline_position_index(view, point=None) -> HeadlinePositionIndex:
+    return ORG_DOCUMENT_CACHE.get_derived(view, "headline_position_index", HeadlinePositionIndex, point)
+
+
+class ZorgBreadcrumbListener(sublime_plugin.EventListener):
+    """
+    Shows outline path of the cursor in status bar.
+
+    Update is delayed until cursor stops moving, so neither lookup nor parsing after an edit
+    happens on every keystroke. While cursor keeps moving status bar is still updated every
+    BREADCRUMB_MAX_WAIT_MS. Headline index is reused while the document is not changed.
+    """
+
+    def __init__(self):
+        self._pending = {}  # view id -> (generation, time of the first postponed update)
+        self._position_index = {}  # view id -> (change count, HeadlinePositionIndex)
+
+    def on_selection_modified(self, view):
+        if not view.match_selector(0, "text.org"):
+            return
+        view_id = view.id()
+        now = time.perf_counter()
+        generation, since = self._pending.get(view_id, (0, now))
+        generation += 1
+        self._pending[view_id] = (generation, since)
+        if (now - since) * 1000 >= BREADCRUMB_MAX_WAIT_MS:
+            self._update(view, generation)
+            return
+        sublime.set_timeout(lambda: self._update(view, generation), BREADCRUMB_DELAY_MS)
+
+    def on_close(self, view):
+        self._pending.pop(view.id(), None)
+        self._position_index.pop(view.id(), None)
+
+    def _update(self, view, generation):
+        pending = self._pending.get(view.id())
+        if pending is None or pending[0] != generation:
+            # cursor moved again, newer update is scheduled
+            return
+        del self._pending[view.id()]
+        if not view.is_valid() or len(view.sel()) == 0:
+            return
+        settings = sublime.load_settings(ZORGMODE_SUBLIME_SETTINGS)
+        if not settings.get(ZORG_SHOW_BREADCRUMB, True):
+            view.erase_status(BREADCRUMB_STATUS_KEY)
+            return
+
+        point = view.sel()[0].b
+        change_count = view.change_count()
+        cached = self._position_index.get(view.id())
+        if cached is not None and cached[0] == change_count and cached[1].covers(point):
+            position_index = cached[1]
+        else:
+            position_index = view_get_headline_position_index(view, point)
+            self._position_index[view.id()] = (change_count, position_index)
+        start = time.perf_counter()
+        path = position_index.find_path(point)
+        BREADCRUMB_STATS.add(time.perf_counter() - start)
+
+        if path:
+            view.set_status(BREADCRUMB_STATUS_KEY, HEADING_PATH_SEPARATOR.join(path))
+        else:
+            view.erase_status(BREADCRUMB_STATUS_KEY)
+
+
+class ZorgBreadcrumbStatsCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        stats = BREADCRUMB_STATS
+        average = stats.total / stats.count if stats.count else 0.0
+        sublime.status_message(
+            "Breadcrumb lookups: {count}, last {last:.1f}us, average {average:.1f}us, max {max:.1f}us".format(
+                count=stats.count,
+                last=stats.last * 1e6,
+                average=average * 1e6,
+                max=stats.max * 1e6))
+
+
+FOLD_EXTENT_SUBTREE = "subtree"  # fold of zorg_cycle, hides all descendants
+FOLD_EXTENT_BODY = "body"  # fold of zorg_cycle_all, hides text up to the next headline
+
+
+def get_anchor_fold_region(view, line_region, level, extent):
+    """
+    Fold region of the headline at line_region, computed the same way as zorg_cycle and zorg_cycle_all do.
+
+    Large documents are parsed only around the headline.
+    """
+    headline = view_get_headline_position_index(view, line_region.a).find_headline_starting_at(line_region.a)
+    if headline is None or headline.level != level:
+        return sublime.Region(line_region.b, line_region.b)
+    section = headline.parent
+    subtree_fold_region = get_subtree_fold_region(view, section)
+    if extent == FOLD_EXTENT_SUBTREE:
+        return subtree_fold_region
+    fold_end = get_section_fold_end(view, section)
+    for child in section.children:
+        if isinstance(child, OrgSection):
+            fold_end = child.region.a - 1
+            break
+    return sublime.Region(subtree_fold_region.a, max(subtree_fold_region.a, fold_end))
+
+
+class FoldStateStore:
+    """
+    Folds of closed files stored as headline anchors in json file.
+
+    Anchor is [line index, headline line hash, headline level, extent], fold region is recomputed from the headline,
+    so restore time depends on the number of folds and not on the size of the file.
+    """
+    MAX_FILE_COUNT = 256
+
+    def __init__(self, cache_file):
+        self._cache_file = cache_file
+        self._files = None
+        self._dirty = False
+
+    def _load(self):
+        if self._files is not None:
+            return
+        self._files = collections.OrderedDict()
+        if not os.path.exists(self._cache_file):
+            return
+        try:
+            with open(self._cache_file, encoding="utf-8") as inf:
+                data = json.load(inf, object_pairs_hook=collections.OrderedDict)
+        except (IOError, OSError, ValueError):
+            return
+        self._files = data
+
+    def save(self):
+        if not self._dirty:
+            return
+        save_json_file(self._cache_file, self._files)
+        self._dirty = False
+
+    def get(self, file_name):
+        self._load()
+        return self._files.get(file_name)
+
+    def put(self, file_name, anchor_list):
+        self._load()
+        if not anchor_list and file_name not in self._files:
+            return
+        self._files.pop(file_name, None)
+        if anchor_list:
+            self._files[file_name] = anchor_list
+            while len(self._files) > self.MAX_FILE_COUNT:
+                self._files.popitem(last=False)
+        self._dirty = True
+
+
+FOLD_STATE_STORE = None
+
+
+def get_fold_state_store():
+    global FOLD_STATE_STORE
+    if FOLD_STATE_STORE is None:
+        FOLD_STATE_STORE = FoldStateStore(os.path.join(sublime.cache_path(), "Zorgmode", "folds.json"))
+    return FOLD_STATE_STORE
+
+
+def view_get_fold_anchors(view):
+    anchor_list = []
+    for folded_region in view.folded_regions():
+        line_region = view.line(folded_region.a)
+        if line_region.b != folded_region.a:
+            continue
+        m = HEADLINE_LINE_RE.match(view.substr(line_region))
+        if m is None:
+            continue
+        line = m.group(0)
+        level = len(line) - len(line.lstrip("*"))
+        for extent in (FOLD_EXTENT_SUBTREE, FOLD_EXTENT_BODY):
+            if get_anchor_fold_region(view, line_region, level, extent) == folded_region:
+                anchor_list.append([view.rowcol(line_region.a)[0], headline_text_hash(line), level, extent])
+                break
+    return anchor_list
+
+
+def view_restore_fold_anchors(view, anchor_list):
+    """
+    Fold regions of anchors in one view.fold call, return number of restored folds.
+
+    Anchors are checked at their recorded line first, anchors that moved are looked up in parse tree,
+    anchors whose headline doesn't exist anymore are skipped.
+    """
+    region_list = []
+    moved_anchor_list = []
+    for line_index_0, text_hash, level, extent in anchor_list:
+        line_region = view.line(view.text_point(line_index_0, 0))
+        if view.rowcol(line_region.a)[0] == line_index_0 and headline_text_hash(view.substr(line_region)) == text_hash:
+            region_list.append(get_anchor_fold_region(view, line_region, level, extent))
+        else:
+            moved_anchor_list.append((text_hash, level, extent))
+
+    if moved_anchor_list:
+        headline_starts = {}
+        for node in iter_tree_depth_first(ORG_DOCUMENT_CACHE.get_org_root(view)):
+            if isinstance(node, OrgHeadline):
+                line_region = view.line(node.region.a)
+                key = (headline_text_hash(view.substr(line_region)), node.level)
+                headline_starts.setdefault(key, []).append(line_region)
+        for text_hash, level, extent in moved_anchor_list:
+            line_region_list = headline_starts.get((text_hash, level))
+            if line_region_list:
+                region_list.append(get_anchor_fold_region(view, line_region_list.pop(0), level, extent))
+
+    region_list = [r for r in region_list if not r.empty()]
+    if region_list:
+        view.fold(region_list)
+    return len(region_list)
+
+
+def is_org_file_view(view):
+    file_name = view.file_name()
+    return file_name is not None and (file_name.endswith(".org") or view.match_selector(0, "text.org"))
+
+
+class ZorgFoldStateListener(sublime_plugin.EventListener):
+    def on_pre_close(self, view):
+        if not is_org_file_view(view):
+            return
+        fold_state_store = get_fold_state_store()
+        fold_state_store.put(view.file_name(), view_get_fold_anchors(view))
+        save_cache(fold_state_store)
+
+    def on_load(self, view):
+        if not is_org_file_view(view):
+            return
+        anchor_list = get_fold_state_store().get(view.file_name())
+        if anchor_list:
+            view_restore_fold_anchors(view, anchor_list)